@@ -0,0 +1,45 @@
+"""
+Benchmark of the import of gym_billiard.
+Measures, in fresh interpreters, the time needed to import the envs and to create and step one of them, and the peak
+memory of the process before rendering. It also checks that pygame is imported only once something is rendered with it.
+
+Usage: python benchmarks/bench_import.py [--runs N]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+SCRIPT = '''
+import json, resource, sys, timeit
+start = timeit.default_timer()
+import gym_billiard.envs
+imported = timeit.default_timer()
+env = gym_billiard.envs.BilliardEnv()
+env.reset()
+env.step([0., 0.])
+stepped = timeit.default_timer()
+pygame_loaded = 'pygame' in sys.modules
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+env.render('rgb_array')
+print(json.dumps({'import': imported - start, 'first_step': stepped - start,
+                  'pygame_before_render': pygame_loaded, 'pygame_after_render': 'pygame' in sys.modules,
+                  'max_rss_mb': max_rss}))
+'''
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--runs', type=int, default=10)
+  args = parser.parse_args()
+
+  results = []
+  for _ in range(args.runs):
+    output = subprocess.run([sys.executable, '-c', SCRIPT], check=True, capture_output=True, text=True).stdout
+    results.append(json.loads(output.strip().splitlines()[-1]))
+
+  print('import: {:.0f} ms - import + first step: {:.0f} ms - max RSS: {:.0f} MB'.format(
+    1000 * min(r['import'] for r in results), 1000 * min(r['first_step'] for r in results),
+    min(r['max_rss_mb'] for r in results)))
+  print('pygame imported before rendering: {} - after rendering: {}'.format(
+    results[0]['pygame_before_render'], results[0]['pygame_after_render']))
@@ -0,0 +1,47 @@
+"""
+Benchmark of the step cost versus the number of balls, with BilliardCrowdEnv.
+For every ball count it reports the time of an env step and the time needed to read the state of all the balls, both
+with PhysicsSim.balls_state and ball by ball through the Box2D Python proxies.
+
+Usage: python benchmarks/bench_many_balls.py [--steps N] [--radius R]
+"""
+import argparse
+import timeit
+import numpy as np
+from gym_billiard.envs import BilliardCrowdEnv
+
+
+def read_proxies(sim):
+  """
+  Reads the balls state one by one, as done before PhysicsSim.balls_state
+  :param sim: PhysicsSim
+  :return: Array of shape (n_balls, 4)
+  """
+  return np.array([[ball.position[0] + sim.wt_transform[0], ball.position[1] + sim.wt_transform[1],
+                    ball.linearVelocity[0], ball.linearVelocity[1]] for ball in sim.balls])
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--steps', type=int, default=300)
+  parser.add_argument('--radius', type=float, default=.05)
+  args = parser.parse_args()
+
+  actions = np.random.RandomState(0).uniform(-1, 1, (args.steps, 2))
+  for num_balls in [1, 10, 25, 50, 100, 200]:
+    env = BilliardCrowdEnv(num_balls=num_balls, ball_radius=args.radius, seed=0, max_steps=args.steps + 1)
+    env.reset()
+    start = timeit.default_timer()
+    for action in actions:
+      done = env.step(action)[2]
+      if done:
+        env.reset()
+    step_time = (timeit.default_timer() - start) / args.steps
+
+    sim = env.physics_eng
+    out = np.empty((num_balls, 4))
+    assert np.allclose(sim.balls_state(out), read_proxies(sim))
+    bulk_time = min(timeit.repeat(lambda: sim.balls_state(out), number=100, repeat=3)) / 100
+    proxies_time = min(timeit.repeat(lambda: read_proxies(sim), number=100, repeat=3)) / 100
+    print('{:>4} balls - step: {:7.1f} us ({:5.2f} us/ball) - balls_state: {:6.1f} us - proxies: {:6.1f} us'.format(
+      num_balls, step_time * 1e6, step_time * 1e6 / num_balls, bulk_time * 1e6, proxies_time * 1e6))
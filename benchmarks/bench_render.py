@@ -0,0 +1,35 @@
+"""
+Benchmark of the rgb_array rendering.
+Compares the frames per second of the pygame rendering with the ones of the numpy rasterizer, at full size and at
+64x64 grayscale.
+
+Usage: python benchmarks/bench_render.py [--frames N]
+"""
+import argparse
+import timeit
+import numpy as np
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--frames', type=int, default=400)
+  args = parser.parse_args()
+
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    fps = {}
+    for numpy_render in [False, True, 'small']:
+      env = env_class(seed=0)
+      env.params.NUMPY_RENDER = numpy_render is True
+      kwargs = {'size': (64, 64), 'grayscale': True} if numpy_render == 'small' else {}
+      env.reset()
+      elapsed = 0.
+      ## The arm moves for half of the frames and then stays still
+      for t in range(args.frames):
+        env.step([0.5, 1.] if t < args.frames // 2 else [0., 0.])
+        start = timeit.default_timer()
+        env.render('rgb_array', **kwargs)
+        elapsed += timeit.default_timer() - start
+      fps[numpy_render] = args.frames / elapsed
+    print('{:<16} pygame: {:.0f} fps - numpy: {:.0f} fps - speedup: {:.1f}x - numpy 64x64 gray: {:.0f} fps'.format(
+      env_class.__name__, fps[False], fps[True], fps[True] / fps[False], fps['small']))
@@ -0,0 +1,50 @@
+"""
+Benchmark of PhysicsSim.reset.
+Compares the in-place reset, that moves the existing bodies, with the old one, that destroys and rebuilds them.
+
+Usage: python benchmarks/bench_reset.py [--resets N]
+"""
+import argparse
+import timeit
+import numpy as np
+from gym_billiard.utils import physics
+
+
+def bench(reset, num_balls, resets, steps):
+  """
+  Measures the resets per second of the given reset function
+  :param reset: Function with the signature of PhysicsSim.reset
+  :param num_balls: Number of balls on the table
+  :param resets: Number of resets
+  :param steps: Number of simulation steps between two resets, so that the bodies are moving and touching
+  :return: resets/sec
+  """
+  rng = np.random.RandomState(0)
+  poses = rng.uniform(-1.2, 1.2, size=(resets, num_balls, 2))
+  arm_poses = rng.uniform([-.2 * np.pi, -.9 * np.pi], [.2 * np.pi, .9 * np.pi], size=(resets, 2))
+  sim = reset.__self__
+  elapsed = 0.
+  for idx in range(resets):
+    for _ in range(steps):
+      sim.move_joint('jointW0', 1.)
+      sim.step()
+    start = timeit.default_timer()
+    reset(list(poses[idx]), arm_poses[idx])
+    elapsed += timeit.default_timer() - start
+  return resets / elapsed
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--resets', type=int, default=2000)
+  parser.add_argument('--steps', type=int, default=5)
+  args = parser.parse_args()
+
+  for num_balls in [1, 2]:
+    balls_pose = [[0, 0]] * num_balls
+    rebuild = physics.PhysicsSim(balls_pose=balls_pose)._rebuild
+    in_place = physics.PhysicsSim(balls_pose=balls_pose).reset
+    before = bench(rebuild, num_balls, args.resets, args.steps)
+    after = bench(in_place, num_balls, args.resets, args.steps)
+    print('{} balls - rebuild: {:.0f} resets/sec - in place: {:.0f} resets/sec - speedup: {:.2f}x'.format(
+      num_balls, before, after, after / before))
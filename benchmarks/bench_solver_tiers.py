@@ -0,0 +1,58 @@
+"""
+Benchmark of the solver fidelity tiers.
+For every tier it reports the steps/sec and the error of the final ball position with respect to the reference tier,
+over a fixed set of seeded episodes.
+
+Usage: python benchmarks/bench_solver_tiers.py [--episodes N] [--steps T]
+"""
+import argparse
+import timeit
+import numpy as np
+from gym_billiard.envs import BilliardEnv
+from gym_billiard.utils import parameters
+
+
+def run_episodes(solver_tier, episodes, steps):
+  """
+  Runs the seeded episodes with the given tier. The ball and arm start in random poses and the arm follows random
+  commands held for 10 steps, so that the ball gets hit in most episodes.
+  :param solver_tier: Solver tier
+  :param episodes: Number of episodes
+  :param steps: Steps per episode
+  :return: final ball poses (episodes, 2), steps/sec
+  """
+  final_poses = np.zeros((episodes, 2))
+  elapsed = 0.
+  total_steps = 0
+  for seed in range(episodes):
+    env = BilliardEnv(seed=seed, max_steps=steps, solver_tier=solver_tier)
+    env.params.RANDOM_BALL_INIT_POSE = True
+    env.params.RANDOM_ARM_INIT_POSE = True
+    obs = env.reset()
+    actions = np.repeat(np.random.RandomState(seed).uniform(-1, 1, size=(steps // 10 + 1, 2)), 10, axis=0)
+    start = timeit.default_timer()
+    for t in range(steps):
+      obs, reward, done, info = env.step(actions[t])
+      total_steps += 1
+      if done:
+        break
+    elapsed += timeit.default_timer() - start
+    final_poses[seed] = obs[:2]
+  return final_poses, total_steps / elapsed
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--episodes', type=int, default=20)
+  parser.add_argument('--steps', type=int, default=300)
+  args = parser.parse_args()
+
+  results = {tier: run_episodes(tier, args.episodes, args.steps) for tier in parameters.SOLVER_TIERS}
+  reference_poses, _ = results['reference']
+  print('{:<10} {:>8} {:>8} {:>10} {:>14} {:>14}'.format('tier', 'vel_iter', 'pos_iter', 'steps/sec',
+                                                           'mean err [m]', 'max err [m]'))
+  for tier, (poses, steps_sec) in results.items():
+    error = np.linalg.norm(poses - reference_poses, axis=1)
+    vel_iter, pos_iter = parameters.SOLVER_TIERS[tier]
+    print('{:<10} {:>8} {:>8} {:>10.0f} {:>14.4f} {:>14.4f}'.format(tier, vel_iter, pos_iter, steps_sec,
+                                                                    error.mean(), error.max()))
@@ -0,0 +1,219 @@
+"""
+Benchmark suite of the registered envs: Billiard-v0, BilliardHard-v0 and Curling-v0.
+For every env it measures:
+- steps/sec with random actions, sampled from the seeded action space at every step;
+- steps/sec with a fixed seeded action sequence, computed beforehand;
+- resets/sec;
+- rgb_array render fps, with pygame and with the numpy rasterizer;
+- memory per env, as growth of the RSS of a fresh process creating many of them.
+
+Every timing is the best of --repeats runs, to reduce the noise.
+
+The results are saved as JSON. If a baseline is given, every metric is compared with it and the script exits with
+an error if any of them is worse than the baseline by more than the tolerance. The baseline in this folder was
+measured on a single core machine: regenerate it with --save-baseline on the machine used for the comparisons.
+
+Usage: python benchmarks/bench_suite.py [--output results.json] [--baseline benchmarks/baseline.json]
+                                        [--tolerance 0.3] [--save-baseline] [--steps N] [--repeats R]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import numpy as np
+from gym_billiard.envs.subproc_vec_env import ENV_CLASSES
+
+## Metrics for which the higher the better. For the others the lower the better
+HIGHER_IS_BETTER = ['steps_per_sec_random', 'steps_per_sec_fixed', 'resets_per_sec', 'render_fps_pygame',
+                    'render_fps_numpy']
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _run_steps(env, actions):
+  """
+  Steps the env with the given actions, resetting it at the end of the episodes
+  :param env: Env
+  :param actions: iterable of actions
+  :return: elapsed time
+  """
+  env.reset()
+  start = timeit.default_timer()
+  for action in actions:
+    done = env.step(action)[2]
+    if done:
+      env.reset()
+  return timeit.default_timer() - start
+
+
+def _random_actions(env, steps, seed):
+  """
+  Samples the actions from the action space while stepping
+  :param env: Env
+  :param steps: Number of actions
+  :param seed: Seed of the action space
+  :return: generator of actions
+  """
+  env.action_space.seed(seed)
+  for _ in range(steps):
+    yield env.action_space.sample()
+
+
+## Run in a fresh interpreter, so that the memory freed by the other benchmarks is not reused by the envs
+MEMORY_SCRIPT = '''
+import resource, sys
+from gym_billiard.envs.subproc_vec_env import ENV_CLASSES
+
+def rss_kb():
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * resource.getpagesize() / 1024.
+  except OSError:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+env_class = ENV_CLASSES[sys.argv[1]]
+env_class(seed=0).reset()
+before = rss_kb()
+envs = [env_class(seed=0) for _ in range(200)]
+for env in envs:
+  env.reset()
+print((rss_kb() - before) / len(envs))
+'''
+
+
+def _memory_per_env_kb(env_id):
+  """
+  Measures the memory taken by an env, as growth of the RSS of a fresh process creating 200 of them
+  :param env_id: Id of the env
+  :return: KB per env
+  """
+  output = subprocess.run([sys.executable, '-c', MEMORY_SCRIPT, env_id], check=True, capture_output=True, text=True)
+  return float(output.stdout.strip().splitlines()[-1])
+
+
+def _best_rate(function, count, repeats):
+  """
+  Runs a timed function several times
+  :param function: function returning the elapsed time
+  :param count: number of operations done by a call of the function
+  :param repeats: number of runs
+  :return: best rate, in operations per second
+  """
+  return max(count / function() for _ in range(repeats))
+
+
+def _time_resets(env, resets):
+  """
+  Times the resets of the env
+  :param env: Env
+  :param resets: Number of resets
+  :return: elapsed time
+  """
+  start = timeit.default_timer()
+  for _ in range(resets):
+    env.reset()
+  return timeit.default_timer() - start
+
+
+def _time_render(env, actions):
+  """
+  Times the rgb_array rendering while stepping the env
+  :param env: Env
+  :param actions: Actions performed before every frame
+  :return: elapsed time
+  """
+  env.reset()
+  elapsed = 0.
+  for action in actions:
+    env.step(action)
+    start = timeit.default_timer()
+    env.render('rgb_array')
+    elapsed += timeit.default_timer() - start
+  return elapsed
+
+
+def bench_env(env_id, steps, repeats=3, seed=0):
+  """
+  Measures the metrics of an env
+  :param env_id: Id of the env
+  :param steps: Number of steps of the step benchmarks. Resets and frames are a fraction of them
+  :param repeats: Number of runs of every timing
+  :param seed: Seed of envs and actions
+  :return: dict of metrics
+  """
+  env_class = ENV_CLASSES[env_id]
+  results = {}
+  env = env_class(seed=seed)
+  results['steps_per_sec_random'] = _best_rate(lambda: _run_steps(env, _random_actions(env, steps, seed)), steps,
+                                               repeats)
+  fixed_actions = np.random.RandomState(seed).uniform(-1, 1, (steps, 2))
+  results['steps_per_sec_fixed'] = _best_rate(lambda: _run_steps(env, fixed_actions), steps, repeats)
+  resets = max(steps // 10, 1)
+  results['resets_per_sec'] = _best_rate(lambda: _time_resets(env, resets), resets, repeats)
+
+  frames = max(steps // 5, 1)
+  for name, numpy_render in [('pygame', False), ('numpy', True)]:
+    env.params.NUMPY_RENDER = numpy_render
+    results['render_fps_{}'.format(name)] = _best_rate(lambda: _time_render(env, fixed_actions[:frames]), frames,
+                                                       repeats)
+  env.close()
+
+  results['memory_per_env_kb'] = _memory_per_env_kb(env_id)
+  return results
+
+
+def compare(results, baseline, tolerance):
+  """
+  Compares the results with the baseline
+  :param results: dict {env_id: {metric: value}}
+  :param baseline: dict with the same structure
+  :param tolerance: Relative worsening allowed
+  :return: list of regressions, as strings
+  """
+  regressions = []
+  for env_id, metrics in baseline.items():
+    for metric, reference in metrics.items():
+      value = results.get(env_id, {}).get(metric)
+      if value is None or reference <= 0:
+        continue
+      change = value / reference - 1.
+      if metric not in HIGHER_IS_BETTER:
+        change = -change
+      if change < -tolerance:
+        regressions.append('{} {}: {:.1f} - baseline {:.1f} ({:+.0%})'.format(env_id, metric, value, reference, change))
+  return regressions
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--output', default='bench_results.json')
+  parser.add_argument('--baseline', default=BASELINE)
+  parser.add_argument('--tolerance', type=float, default=.3)
+  parser.add_argument('--save-baseline', action='store_true')
+  parser.add_argument('--steps', type=int, default=3000)
+  parser.add_argument('--repeats', type=int, default=3)
+  args = parser.parse_args()
+
+  results = {}
+  for env_id in ENV_CLASSES:
+    results[env_id] = bench_env(env_id, args.steps, args.repeats)
+    print(env_id, ' - '.join('{}: {:.1f}'.format(metric, value) for metric, value in results[env_id].items()))
+
+  with open(args.output, 'w') as f:
+    json.dump({'machine': platform.platform(), 'python': sys.version.split()[0], 'steps': args.steps,
+               'results': results}, f, indent=2)
+
+  if args.save_baseline:
+    with open(args.baseline, 'w') as f:
+      json.dump(results, f, indent=2)
+    print('Baseline saved in {}'.format(args.baseline))
+  elif os.path.exists(args.baseline):
+    with open(args.baseline, 'r') as f:
+      regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+      print('Performance regressions:')
+      print('\n'.join(regressions))
+      sys.exit(1)
+    print('No regressions with respect to {}'.format(args.baseline))
@@ -1,5 +1,8 @@
 from gym.envs.registration import register
 
+## Keep in sync with setup.py. It is part of the keys of the persistent outcome caches
+__version__ = '1'
+
 register(
     id='Billiard-v0',
     entry_point='gym_billiard.envs:BilliardEnv',
@@ -15,4 +18,10 @@ register(
     id='Curling-v0',
     entry_point='gym_billiard.envs:Curling',
     # timestep_limit=1000,
+)
+
+register(
+    id='BilliardCrowd-v0',
+    entry_point='gym_billiard.envs:BilliardCrowdEnv',
+    # timestep_limit=1000,
 )
\ No newline at end of file
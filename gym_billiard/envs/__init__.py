@@ -1,3 +1,8 @@
 from gym_billiard.envs.billiard_env import BilliardEnv
 from gym_billiard.envs.billiard_hard_env import BilliardHardEnv
 from gym_billiard.envs.curling import Curling
+from gym_billiard.envs.billiard_crowd_env import BilliardCrowdEnv
+from gym_billiard.envs.billiard_vec_env import BilliardVecEnv
+from gym_billiard.envs.subproc_vec_env import SubprocVecEnv
+from gym_billiard.envs.batch_evaluator import BatchEvaluator
+from gym_billiard.envs.outcome_cache import OutcomeCache
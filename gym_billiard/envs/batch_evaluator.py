@@ -0,0 +1,178 @@
+import multiprocessing as mp
+import numpy as np
+from gym_billiard.envs.subproc_vec_env import ENV_CLASSES, _flatten_obs
+import logging
+logger = logging.getLogger(__name__)
+
+## Outcome of an episode.
+# ball_pose: final pose of ball 0 in table RF
+# reward: sum of the rewards of the episode
+# rew_area: index of the reward area reached, -1 if none
+# steps: number of env steps performed
+OUTCOME_DTYPE = np.dtype([('ball_pose', np.float64, (2,)),
+                          ('reward', np.float64),
+                          ('rew_area', np.int32),
+                          ('steps', np.int32)])
+
+## Env of the worker. Created once by _init_worker and reused for all the batches
+_env = None
+
+
+def _init_worker(env_class, env_kwargs):
+  """
+  Creates the env of the worker
+  :param env_class: Class of the env
+  :param env_kwargs: Arguments of the env constructor
+  :return:
+  """
+  global _env
+  _env = env_class(**env_kwargs)
+
+
+def _run_episode(env, individual):
+  """
+  Runs an episode from a fresh reset
+  :param env: Env
+  :param individual: either an array of actions of shape (T, 2), run open-loop, or a controller: a callable that
+  gives the action given the flat observation
+  :return: final flat observation, total reward, info of the last step, number of steps
+  """
+  obs = _flatten_obs(env.reset())
+  if not callable(individual):
+    observations, rewards, dones, steps, info = env.rollout(individual)
+    return observations[steps], rewards[:steps].sum(), info, steps
+
+  total_reward, info, steps, done = 0, {}, 0, False
+  while not done:
+    obs, reward, done, info = env.step(individual(obs))
+    obs = _flatten_obs(obs)
+    total_reward += reward
+    steps += 1
+  return obs, total_reward, info, steps
+
+
+def _evaluate_chunk(population, env=None):
+  """
+  Evaluates a chunk of the population
+  :param population: list of individuals
+  :param env: Env. If None, the one of the worker is used
+  :return: outcomes. Array of OUTCOME_DTYPE
+  """
+  env = _env if env is None else env
+  outcomes = np.zeros(len(population), dtype=OUTCOME_DTYPE)
+  for idx, individual in enumerate(population):
+    obs, reward, info, steps = _run_episode(env, individual)
+    outcomes[idx] = (obs[:2], reward, info.get('rew_area', -1), steps)
+  return outcomes
+
+
+class BatchEvaluator(object):
+  """
+  Evaluates populations of action sequences or controllers on a pool of worker processes, as needed by novelty search
+  or MAP-Elites. Every episode starts from a reset, and only its outcome is sent back, as a structured array of
+  OUTCOME_DTYPE.
+
+  The workers keep their env between batches, so only the first evaluation pays for their startup.
+  Open-loop action sequences are run with env.rollout. Building the evaluator with fast_forward=True stops simulating
+  the tail of the episodes once the table is still.
+
+  NB: with RANDOM_BALL_INIT_POSE and RANDOM_ARM_INIT_POSE off (the default), the outcomes do not depend on which worker
+  evaluates an individual. This also allows to memoize them with an OutcomeCache: action sequences already in the cache
+  are not simulated again. Controllers are never cached.
+  """
+  def __init__(self, env_id='Billiard-v0', num_workers=None, start_method=None, cache=None, **env_kwargs):
+    """ Constructor
+    :param env_id: Id of the env to run. One of subproc_vec_env.ENV_CLASSES
+    :param num_workers: Number of subprocesses. If None, it is cpu_count. If 0, the episodes are run in this process
+    :param start_method: multiprocessing start method. If None, the platform default is used
+    :param cache: OutcomeCache used to memoize the outcomes of action sequences. If None, nothing is cached
+    :param env_kwargs: Arguments of the env constructor, like max_steps, solver_tier or fast_forward
+    :return:
+    """
+    assert env_id in ENV_CLASSES, 'Env {} not supported. Available: {}'.format(env_id, list(ENV_CLASSES))
+    if num_workers is None:
+      num_workers = mp.cpu_count()
+    self.env_id = env_id
+    self.num_workers = num_workers
+    self.closed = False
+    self.cache = cache
+    env_class = ENV_CLASSES[env_id]
+    if cache is not None:
+      from gym_billiard.envs.outcome_cache import episode_context
+      env = env_class(**env_kwargs)
+      self._context = episode_context(env_id, env.params, env_kwargs, _flatten_obs(env.reset()))
+      env.close()
+    if num_workers == 0:
+      self.env = env_class(**env_kwargs)
+      self.pool = None
+    else:
+      self.env = None
+      self.pool = mp.get_context(start_method).Pool(num_workers, initializer=_init_worker,
+                                                    initargs=(env_class, env_kwargs))
+
+  def evaluate(self, population, chunks_per_worker=4):
+    """
+    Evaluates the population
+    :param population: Array of action sequences of shape (P, T, 2), or list of individuals. Each individual is either
+    an array of actions of shape (T, 2) or a picklable callable giving the action from the flat observation
+    :param chunks_per_worker: Number of chunks sent to each worker. More chunks balance better episodes of different length
+    :return: outcomes. Array of OUTCOME_DTYPE of shape (P,)
+    """
+    assert not self.closed, 'Evaluator closed'
+    population = list(population)
+    if self.cache is None:
+      return self._evaluate(population, chunks_per_worker)
+
+    outcomes = np.zeros(len(population), dtype=OUTCOME_DTYPE)
+    keys = [None if callable(individual) else self.cache.key(self._context, individual) for individual in population]
+    missing = []
+    for idx, key in enumerate(keys):
+      outcome = None if key is None else self.cache.get(key)
+      if outcome is None:
+        missing.append(idx)
+      else:
+        outcomes[idx] = outcome
+    if missing:
+      outcomes[missing] = self._evaluate([population[idx] for idx in missing], chunks_per_worker)
+      stored = [idx for idx in missing if keys[idx] is not None]
+      self.cache.put_many([keys[idx] for idx in stored], outcomes[stored])
+    return outcomes
+
+  def _evaluate(self, population, chunks_per_worker):
+    """
+    Evaluates the population on the workers
+    :param population: list of individuals
+    :param chunks_per_worker: Number of chunks sent to each worker
+    :return: outcomes. Array of OUTCOME_DTYPE of shape (P,)
+    """
+    if self.pool is None:
+      return _evaluate_chunk(population, self.env)
+
+    num_chunks = max(1, min(len(population), self.num_workers * chunks_per_worker))
+    bounds = np.linspace(0, len(population), num_chunks + 1).astype(int)
+    chunks = [population[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    return np.concatenate(self.pool.map(_evaluate_chunk, chunks, chunksize=1))
+
+  def close(self):
+    """
+    Stops the workers
+    :return:
+    """
+    if self.closed:
+      return
+    if self.pool is not None:
+      self.pool.close()
+      self.pool.join()
+    if self.env is not None:
+      self.env.close()
+    self.closed = True
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def __del__(self):
+    if not getattr(self, 'closed', True):
+      self.close()
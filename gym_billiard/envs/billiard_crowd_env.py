@@ -0,0 +1,221 @@
+from gym import spaces
+import numpy as np
+from gym_billiard.utils import physics, profiling
+from gym_billiard.envs import billiard_env
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BilliardCrowdEnv(billiard_env.BilliardEnv):
+  """
+  Billiard table crowded with many balls. Every ball sent in a hole gives a reward of 1 and is removed from the table.
+  The episode ends when all the balls are in the holes or when the maximum number of steps is reached.
+
+  State is composed of:
+  s = ([ball0_x, ball0_y, ..., ballN_x, ballN_y, joint0_angle, joint1_angle, joint0_speed, joint1_speed])
+  The balls removed from the table keep the pose they had when they entered the hole.
+
+  The balls state is read in bulk with PhysicsSim.balls_state, and the holes are checked for all the balls with a
+  single PhysicsSim.holes_reached call, so the cost of a step grows with the number of balls mostly in Box2D.
+  """
+  def __init__(self, num_balls=20, ball_radius=None, seed=None, max_steps=500, solver_tier='default', frame_skip=1,
+               fast_forward=False, obs_buffer=None):
+    """ Constructor
+    :param num_balls: the number of balls on the table
+    :param ball_radius: the radius of the balls. If None, it is params.BALL_RADIUS. Use smaller balls to fit many of them
+    :param seed: the random seed for the environment
+    :param max_steps: the maximum number of steps the episode lasts
+    :param solver_tier: fidelity of the physics solver. One of parameters.SOLVER_TIERS
+    :param frame_skip: number of physics steps performed by each env step with the same action
+    :param fast_forward: if True, once the world is static the episode jumps straight to its last step
+    :param obs_buffer: None, True or a float32 array of shape (2 * num_balls + 4,). See BilliardEnv.set_obs_buffer
+    :return:
+    """
+    ## Used by _build_physics, called by the constructor of BilliardEnv
+    self.num_balls = num_balls
+    self.ball_radius = ball_radius
+    super().__init__(seed, max_steps, solver_tier, frame_skip, fast_forward)
+
+    half_table = self.params.TABLE_SIZE / 2.
+    self.observation_space = spaces.Box(low=np.concatenate([np.tile(-half_table, num_balls), [-np.pi / 2, -np.pi, -50, -50]]),
+                                        high=np.concatenate([np.tile(half_table, num_balls), [np.pi / 2, np.pi, 50, 50]]),
+                                        dtype=np.float32)
+
+    ## Buffers reused at every step
+    self.balls = np.zeros((num_balls, 4))
+    self.potted = np.zeros(num_balls, dtype=bool)
+    self.potted_pose = np.zeros((num_balls, 2))
+    self.set_obs_buffer(obs_buffer)
+
+  def _build_physics(self):
+    """
+    Builds the simulator with num_balls balls, spawned in the same poses of a reset without RANDOM_BALL_INIT_POSE
+    :return: PhysicsSim
+    """
+    if self.ball_radius is not None:
+      self.params.BALL_RADIUS = self.ball_radius
+    ## Radius of the balls and of the holes the spawn poses are computed for
+    self.spawn_radii = (self.params.BALL_RADIUS, self.params.HOLE_RADIUS)
+    self.spawn_poses = self._spawn_candidates(*self.spawn_radii)
+    return physics.PhysicsSim(balls_pose=self._init_balls_pose(np.random.RandomState(0)), params=self.params)
+
+  def _spawn_candidates(self, radius, hole_radius):
+    """
+    Computes the poses where balls can be spawned: a grid of non overlapping poses, away from the holes and from the
+    arm in its initial pose
+    :param radius: Radius of the balls
+    :param hole_radius: Radius of the holes
+    :return: Array of shape (n, 2) in table RF, with n >= num_balls
+    """
+    spacing = 2.2 * radius
+    limit = self.params.TABLE_SIZE / 2. - self.params.WALL_THICKNESS / 2. - spacing / 2.
+    xs = np.arange(-limit[0], limit[0] + 1e-9, spacing)
+    ys = np.arange(-limit[1], limit[1] + 1e-9, spacing)
+    poses = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    ## Away from the holes
+    dist = np.linalg.norm(poses[:, None, :] - physics.holes_pose(self.params)[None], axis=-1)
+    poses = poses[np.all(dist > hole_radius + radius, axis=1)]
+
+    ## Away from the arm, that starts vertical at the center of the lower wall
+    arm_top = self.params.LINK_0_LENGTH + self.params.LINK_1_LENGTH - self.params.TABLE_SIZE[1] / 2.
+    on_arm = (np.abs(poses[:, 0]) < self.params.LINK_THICKNESS + radius + .05) & (poses[:, 1] < arm_top + radius + .05)
+    poses = poses[~on_arm]
+    if len(poses) < self.num_balls:
+      raise ValueError('{} balls of radius {} do not fit on the table with holes of radius {}. Max: {}'.format(
+        self.num_balls, radius, hole_radius, len(poses)))
+    return poses
+
+  def _init_balls_pose(self, rng):
+    """
+    Samples the initial poses of the balls among the spawn poses
+    :param rng: Random generator
+    :return: Array of shape (num_balls, 2)
+    """
+    return self.spawn_poses[rng.choice(len(self.spawn_poses), self.num_balls, replace=False)]
+
+  @profiling.timed('reset')
+  def reset(self):
+    """
+    Function to reset the environment.
+    - If param RANDOM_BALL_INIT_POSE is set, the balls appear in random poses, otherwise they always start in the same ones
+    - If param RANDOM_ARM_INIT_POSE is set, the arm joint positions will be set randomly, otherwise they will have [0, 0]
+    - If param DOMAIN_RANDOMIZATION is set, the physical params of the episode are sampled in its ranges
+    The arm is placed after the balls, so a random arm pose can overlap them.
+    :return: Initial observation
+    """
+    self._randomize_physics()
+    radii = (self.physics_eng.physical_params['BALL_RADIUS'], self.physics_eng.physical_params['HOLE_RADIUS'])
+    if radii != self.spawn_radii:
+      ## The grid depends on the size of balls and holes, so it follows the sampled ones
+      self.spawn_poses = self._spawn_candidates(*radii)
+      self.spawn_radii = radii
+
+    rng = self.np_random if self.params.RANDOM_BALL_INIT_POSE else np.random.RandomState(0)
+    init_balls_pose = self._init_balls_pose(rng)
+
+    if self.params.RANDOM_ARM_INIT_POSE:
+      init_joint_pose = np.array([self.np_random.uniform(low=-np.pi * .2, high=np.pi * .2),  # Joint0
+                                  self.np_random.uniform(low=-np.pi * .9, high=np.pi * .9)])  # Joint1
+    else:
+      init_joint_pose = None
+
+    self.physics_eng.reset(init_balls_pose, init_joint_pose)
+    self.steps = 0
+    self.rew_area = None
+    self.potted[:] = False
+    return self._get_obs()
+
+  def clone_state(self, sync=False):
+    """
+    Saves the state of the environment, so that it can be restored later with restore_state. The env is not changed,
+    unless sync is True. See BilliardEnv.clone_state
+    :param sync: if True, the simulator caches are cleared as done by restore_state
+    :return: state: flat array composed of the simulator state followed by [potted balls poses, potted balls mask, steps]
+    """
+    sim_state = self.physics_eng.get_state()
+    if sync:
+      self.physics_eng.set_state(sim_state)
+      self._remove_potted()
+    return np.concatenate([sim_state, self.potted_pose.ravel(), self.potted, [self.steps]])
+
+  def restore_state(self, state):
+    """
+    Restores a state saved with clone_state.
+    :param state: State array
+    :return: Observation of the restored state
+    """
+    size = 3 * self.num_balls + 1
+    self.physics_eng.set_state(state[:-size])
+    self.potted_pose[:] = np.reshape(state[-size:-size + 2 * self.num_balls], (self.num_balls, 2))
+    self.potted[:] = state[-self.num_balls - 1:-1] > 0
+    self.steps = int(state[-1])
+    self._remove_potted()
+    return self._get_obs()
+
+  def _remove_potted(self):
+    """
+    Takes out of the simulation the balls in the holes
+    :return:
+    """
+    for idx in np.flatnonzero(self.potted):
+      self.physics_eng.balls[idx].active = False
+
+  @profiling.timed('get_obs')
+  def _write_obs(self, out):
+    """
+    Writes the observation in the given array, without allocating a new one
+    :param out: array of shape (2 * num_balls + 4,)
+    :return:
+    """
+    balls = self.physics_eng.balls_state(self.balls)
+    balls[self.potted, :2] = self.potted_pose[self.potted]
+    if np.any(np.abs(balls[:, :2]) > 1.5):
+      idx = np.argmax(np.any(np.abs(balls[:, :2]) > 1.5, axis=1))
+      raise ValueError('Ball {} out of map in position: {}'.format(idx, balls[idx, :2]))
+    out[:2 * self.num_balls] = balls[:, :2].ravel()
+    out[-4] = self.physics_eng.arm['jointW0'].angle
+    out[-3] = self.physics_eng.arm['joint01'].angle
+    out[-2] = self.physics_eng.arm['jointW0'].speed
+    out[-1] = self.physics_eng.arm['joint01'].speed
+
+  @profiling.timed('reward_function')
+  def reward_function(self, info):
+    """
+    Removes from the table the balls that entered a hole in the last step. Each of them gives a reward of 1.
+    :param info:
+    :return: reward, done, info
+    """
+    balls = self.physics_eng.balls_state(self.balls)
+    in_hole = (self.physics_eng.holes_reached(balls[:, :2]) >= 0) & ~self.potted
+    if not in_hole.any():
+      return 0, False, info
+    self.potted |= in_hole
+    self.potted_pose[in_hole] = balls[in_hole, :2]
+    self._remove_potted()
+    info['potted'] = info.get('potted', []) + np.flatnonzero(in_hole).tolist()
+    done = bool(self.potted.all())
+    if done:
+      info['reason'] = 'All balls in holes'
+    return int(in_hole.sum()), done, info
+
+  def _viewer_kwargs(self):
+    """
+    Gives the constructor arguments needed by viewer.AsyncViewer to build a table with the same balls
+    :return: dict of kwargs
+    """
+    return {'num_balls': self.num_balls, 'ball_radius': self.params.BALL_RADIUS}
+
+  def _body_color(self, obj_name, mode='rgb_array'):
+    """
+    Gives the color used to draw a body. Balls in the holes are not drawn
+    :param obj_name: Name of the body
+    :param mode: Render mode
+    :return: color, or None if the body is not drawn
+    """
+    if obj_name.startswith('ball'):
+      idx = int(obj_name[4:])
+      if not self.physics_eng.balls[idx].active:
+        return None
+      return [0, 0, 255] if idx == 0 else [255, 255, 0]
+    return super()._body_color(obj_name, mode)
@@ -5,10 +5,8 @@ import gym
 from gym import error, spaces, utils
 from gym.utils import seeding
 import numpy as np
-from gym_billiard.utils import physics, parameters
-import os
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-import pygame
+from gym_billiard.envs import rollout
+from gym_billiard.utils import physics, parameters, rendering, profiling, viewer
 
 # TODO implement logger
 
@@ -17,7 +15,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class BilliardEnv(gym.Env):
+class BilliardEnv(rollout.RolloutMixin, gym.Env):
   """
   State is composed of:
   s = ([ball_x, ball_y], [joint0_angle, joint1_angle], [joint0_speed, joint1_speed])
@@ -28,20 +26,34 @@ class BilliardEnv(gym.Env):
   joint1_angle -> [-pi, pi]
   joint0_speed, joint1_speed -> [-50, 50]
   """
-  metadata = {'render.modes': ['human'],
+  metadata = {'render.modes': ['human', 'human_async'],
               'video.frames_per_second': 15
               }
 
-  def __init__(self, seed=None, max_steps=500):
+  def __init__(self, seed=None, max_steps=500, solver_tier='default', frame_skip=1, fast_forward=False, obs_buffer=None):
     """ Constructor
     :param seed: the random seed for the environment
     :param max_steps: the maximum number of steps the episode lasts
+    :param solver_tier: fidelity of the physics solver. One of parameters.SOLVER_TIERS
+    :param frame_skip: number of physics steps performed by each env step with the same action
+    :param fast_forward: if True, once the world is static the episode jumps straight to its last step. Use it only if
+    the following actions are going to be zero, like in open-loop evaluations.
+    :param obs_buffer: if None, every observation is a new float64 array. Otherwise the observations are written in a
+    float32 buffer, returned at every step and overwritten by the following one. Either True, for a buffer owned by the
+    env, or a float32 array of shape observation_space.shape given by the caller. See set_obs_buffer
     :return:
     """
+    assert frame_skip >= 1, 'frame_skip must be at least 1. Given: {}'.format(frame_skip)
+    self.frame_skip = frame_skip
+    self.fast_forward = fast_forward
     self.screen = None
+    self.viewer = None
+    self.renderers = {}
+    self.profiler = None
     self.params = parameters.Params()
     self.params.MAX_ENV_STEPS = max_steps
-    self.physics_eng = physics.PhysicsSim()
+    self.params.VEL_ITER, self.params.POS_ITER = parameters.SOLVER_TIERS[solver_tier]
+    self.physics_eng = self._build_physics()
 
     ## Ball XY positions can be between -1.5 and 1.5
     ## Arm joint can have positons:
@@ -63,9 +75,36 @@ class BilliardEnv(gym.Env):
     self.goals = np.array([hole['pose'] for hole in self.physics_eng.holes])
     self.goalRadius = [hole['radius'] for hole in self.physics_eng.holes]
     self.rew_area = None
+    self.set_obs_buffer(obs_buffer)
+
+    ## Physical params sampled for the current episode. See _randomize_physics
+    self.physical_params = {}
 
     self.seed(seed)
 
+  def _build_physics(self):
+    """
+    Builds the simulator of the env, once params is set. Envs with other balls on the table override it
+    :return: PhysicsSim
+    """
+    return physics.PhysicsSim(params=self.params)
+
+  def set_obs_buffer(self, obs_buffer=True):
+    """
+    Sets the array in which the observations are written. With a buffer, reading the observation allocates no array.
+    :param obs_buffer: None to allocate a new float64 array for every observation, True for a float32 buffer owned by
+    the env, or a float32 array of shape observation_space.shape
+    :return: the buffer
+    """
+    if obs_buffer is True:
+      obs_buffer = np.zeros(self.observation_space.shape, dtype=np.float32)
+    elif obs_buffer is not None:
+      assert obs_buffer.shape == self.observation_space.shape and obs_buffer.dtype == np.float32, \
+        'obs_buffer must be a float32 array of shape {}. Given: {} {}'.format(self.observation_space.shape,
+                                                                           obs_buffer.shape, obs_buffer.dtype)
+    self.obs_buffer = obs_buffer
+    return obs_buffer
+
   def seed(self, seed=None):
     """
     Function to seed the environment
@@ -75,11 +114,13 @@ class BilliardEnv(gym.Env):
     self.np_random, seed = seeding.np_random(seed)
     return [seed]
 
+  @profiling.timed('reset')
   def reset(self, desired_ball_pose=None):
     """
     Function to reset the environment.
     - If param RANDOM_BALL_INIT_POSE is set, the ball appears in a random pose, otherwise it will appear at [-0.5, 0.2]
     - If param RANDOM_ARM_INIT_POSE is set, the arm joint positions will be set randomly, otherwise they will have [0, 0]
+    - If param DOMAIN_RANDOMIZATION is set, the physical params of the episode are sampled in its ranges
     :return: Initial observation
     """
     if self.params.RANDOM_BALL_INIT_POSE:
@@ -96,76 +137,237 @@ class BilliardEnv(gym.Env):
     else:
       init_joint_pose = None
 
+    self._randomize_physics()
     self.physics_eng.reset([init_ball_pose], init_joint_pose)
     self.steps = 0
     self.rew_area = None
     return self._get_obs()
 
+  def _randomize_physics(self):
+    """
+    Samples the physical params of the new episode in the ranges of param DOMAIN_RANDOMIZATION and applies them in
+    place to the simulation. Params that are no longer randomized go back to their value in params.
+    :return:
+    """
+    hole_radius = self.physics_eng.physical_params['HOLE_RADIUS']
+    self.physical_params = self.physics_eng.randomize_physical_params(self.params.DOMAIN_RANDOMIZATION, self.np_random)
+    if self.physics_eng.physical_params['HOLE_RADIUS'] != hole_radius:
+      self.goalRadius = self.physics_eng.holes_radius.tolist()
+      ## The holes are in the background of the numpy renderers, so they are created again
+      self.renderers = {}
+
+  def enable_profiling(self, enabled=True):
+    """
+    Enables or disables the timing of the phases of env and simulator. Enabling it clears the previous stats
+    :param enabled: if True, the phases are timed
+    :return:
+    """
+    self.profiler = profiling.Profiler() if enabled else None
+    self.physics_eng.profiler = self.profiler
+
+  def stats(self):
+    """
+    Gives cumulative time and number of calls of every phase: step, reset, render, get_obs, reward_function and
+    world_step, sim_reset of the simulator (plus contacts for BilliardHardEnv)
+    :return: dict {phase: {'calls', 'total', 'mean'}}, times in seconds. Empty if profiling is disabled
+    """
+    return {} if self.profiler is None else self.profiler.stats()
+
+  def clone_state(self, sync=False):
+    """
+    Saves the state of the environment, so that it can be restored later with restore_state. The env is not changed.
+    Restoring clears the simulator caches (contacts warm start and sleep timers), so the restored env can slightly
+    differ from the one that kept going. With sync=True the caches of this env are cleared too, so that it continues
+    exactly as a restored one would.
+    :param sync: if True, the caches are cleared as done by restore_state
+    :return: state: flat array composed of the simulator state followed by [steps, rew_area]
+    """
+    sim_state = self.physics_eng.get_state()
+    if sync:
+      self.physics_eng.set_state(sim_state)
+    rew_area = -1 if self.rew_area is None else self.rew_area
+    return np.concatenate([sim_state, [self.steps, rew_area]])
+
+  def restore_state(self, state):
+    """
+    Restores a state saved with clone_state.
+    :param state: State array
+    :return: Observation of the restored state
+    """
+    self.physics_eng.set_state(state[:-2])
+    self.steps = int(state[-2])
+    self.rew_area = None if state[-1] < 0 else int(state[-1])
+    return self._get_obs()
+
   def _get_obs(self):
     """
     This function returns the state after reading the simulator parameters.
     :return: state: composed of ([ball_pose_x, ball_pose_y], [joint0_angle, joint1_angle], [joint0_speed, joint1_speed])
     """
-    ball_pose = self.physics_eng.balls[0].position + self.physics_eng.wt_transform
-    joint0_a = self.physics_eng.arm['jointW0'].angle
-    joint0_v = self.physics_eng.arm['jointW0'].speed
-    joint1_a = self.physics_eng.arm['joint01'].angle
-    joint1_v = self.physics_eng.arm['joint01'].speed
-    if np.abs(ball_pose[0]) > 1.5 or np.abs(ball_pose[1]) > 1.5:
-      raise ValueError('Ball out of map in position: {}'.format(ball_pose))
-
-    self.state = np.array([ball_pose[0], ball_pose[1], joint0_a, joint1_a, joint0_v, joint1_v])
+    self.state = np.empty(self.observation_space.shape) if self.obs_buffer is None else self.obs_buffer
+    self._write_obs(self.state)
+    return self.state
+
+  def _load_obs(self, flat):
+    """
+    Sets the state to the given observation, copying it in the observation buffer if any
+    :param flat: observation of shape observation_space.shape
+    :return: state
+    """
+    if self.obs_buffer is None:
+      self.state = np.array(flat, dtype=np.float64)
+    else:
+      self.obs_buffer[:] = flat
+      self.state = self.obs_buffer
     return self.state
 
+  @profiling.timed('get_obs')
+  def _write_obs(self, out):
+    """
+    Writes the observation in the given array, without allocating a new one
+    :param out: array of shape (6,)
+    :return:
+    """
+    ## Plain floats, so that no b2Vec2 or numpy array is created
+    wt_x, wt_y = self.physics_eng.wt_transform
+    x, y = self.physics_eng.balls[0].position
+    x, y = x + wt_x, y + wt_y
+    if abs(x) > 1.5 or abs(y) > 1.5:
+      raise ValueError('Ball out of map in position: {}'.format([x, y]))
+    joint0 = self.physics_eng.arm['jointW0']
+    joint1 = self.physics_eng.arm['joint01']
+    out[:] = (x, y, joint0.angle, joint1.angle, joint0.speed, joint1.speed)
+
+  def _ball_pose(self):
+    """
+    Reads the ball pose in table RF straight from the simulator, without building the whole observation
+    :return: ball pose
+    """
+    ball_pose = self.physics_eng.balls[0].position + self.physics_eng.wt_transform
+    return np.array([ball_pose[0], ball_pose[1]])
+
+  @profiling.timed('reward_function')
   def reward_function(self, info):
     """
     This function calculates the reward
     :return:
     """
-    ball_pose = self.state[0:2]
-    for hole_idx, hole in enumerate(self.physics_eng.holes):
-      dist = np.linalg.norm(ball_pose - hole['pose'])
-      if dist <= hole['radius']:
-        done = True
-        reward = 100
-        info['reason'] = 'Ball in hole'
-        info['rew_area'] = hole_idx
-        return reward, done, info
-    return 0, False, None
+    hole_idx = self.physics_eng.holes_reached(self._ball_pose()[None])[0]
+    if hole_idx >= 0:
+      done = True
+      reward = 100
+      info['reason'] = 'Ball in hole'
+      info['rew_area'] = int(hole_idx)
+      return reward, done, info
+    return 0, False, info
 
+  @profiling.timed('step')
   def step(self, action):
     """
     Performs an environment step.
+    The action is repeated for frame_skip physics steps. The termination is checked after each of them, stopping early
+    if the episode ends, and the rewards are summed. steps counts the physics steps.
+    If fast_forward is set and the world is static, the env jumps to the last step of the episode. The ball is still
+    and out of the holes, so the skipped steps would have given no reward.
     :param action: Arm Motor commands. Can be either torques or velocity, according to TORQUE_CONTROL parameter
     :return: state, reward, final, info
     """
-    # action = np.clip(action, -1, 1)
-
-    self.steps += 1
-    ## Pass motor command
-    self.physics_eng.move_joint('jointW0', action[0])
-    self.physics_eng.move_joint('joint01', action[1])
-    ## Simulate timestep
-    self.physics_eng.step()
+    total_reward, done, info = self._advance(action)
     ## Get state
     self._get_obs()
+    return self.state, total_reward, done, info
+
+  def _advance(self, action):
+    """
+    Applies the action to the simulation, for frame_skip physics steps, and checks the termination
+    :param action: Arm Motor commands
+    :return: reward, final, info
+    """
+    # action = np.clip(action, -1, 1)
+    total_reward = 0
     info = {}
+    for _ in range(self.frame_skip):
+      self.steps += 1
+      ## Pass motor command
+      self.physics_eng.move_joint('jointW0', action[0])
+      self.physics_eng.move_joint('joint01', action[1])
+      if self.fast_forward and self.physics_eng.is_static():
+        self.steps = max(self.steps, self.params.MAX_ENV_STEPS)
+      else:
+        ## Simulate timestep
+        self.physics_eng.step()
+
+      # Get reward
+      reward, done, info = self.reward_function(info)
+      total_reward += reward
+
+      if self.steps >= self.params.MAX_ENV_STEPS:  ## Check if max number of steps has been exceeded
+        done = True
+        info['reason'] = 'Max Steps reached: {}'.format(self.steps)
+      if done:
+        break
+    return total_reward, done, info
 
-    # Get reward
-    reward, done, info = self.reward_function(info)
+  def _body_color(self, obj_name, mode='rgb_array'):
+    """
+    Gives the color used to draw a body
+    :param obj_name: Name of the body
+    :param mode: Render mode
+    :return: color, or None if the body is not drawn
+    """
+    color = [0, 0, 0]
+    if obj_name == 'ball0':
+      color = [0, 0, 255]
+    elif obj_name in ['link0', 'link1']:
+      if mode == 'rgb_array' and not self.params.SHOW_ARM_IN_ARRAY: ## If param is set, in the rgb_array the arm will be visible
+        return None
+      color = [100, 100, 100]
+    elif 'wall' in obj_name:
+      color = [150, 150, 150]
+    return color
+
+  def _array_renderer(self, size=None, grayscale=False, dtype=np.uint8):
+    """
+    Gives the numpy renderer for the requested image format. Renderers are created at the first use and then reused
+    :param size: (width, height) of the image. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True, the image is grayscale
+    :param dtype: dtype of the image
+    :return: renderer
+    """
+    key = (None if size is None else tuple(size), grayscale, np.dtype(dtype))
+    if key not in self.renderers:
+      self.renderers[key] = rendering.ArrayRenderer(self.physics_eng, self.params, zip(self.goals, self.goalRadius),
+                                                    self._body_color, size=size, grayscale=grayscale, dtype=dtype)
+    return self.renderers[key]
+
+  @profiling.timed('render')
+  def render(self, mode='rgb_array', size=None, grayscale=False, dtype=np.uint8, out=None, **kwargs):
+    """
+    Rendering function.
+    If size, grayscale, dtype or out are given, or if param NUMPY_RENDER is set, the rgb_array image is drawn with
+    rendering.ArrayRenderer, straight at the requested resolution and format.
+    :param mode: if human, renders on screen. If rgb_array, renders as numpy array. If human_async, sends the state to
+    a viewer.AsyncViewer, that shows it on screen from another process without slowing down the simulation
+    :param size: (width, height) of the rgb_array image. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True, the rgb_array image has shape (height, width) instead of (height, width, 3)
+    :param dtype: dtype of the rgb_array image. Either np.uint8, with values in [0, 255], or np.float32, in [0, 1]
+    :param out: array in which the rgb_array image is drawn, to avoid allocating a new one at every call
+    :return: screen if mode=human, array if mode=rgb_array, None if mode=human_async
+    """
+    if mode == 'human_async':
+      if self.state is None: return None ## If there is no state, exit
+      if self.viewer is None:
+        self.viewer = viewer.AsyncViewer(self)
+      self.viewer.push()
+      return None
 
-    if self.steps >= self.params.MAX_ENV_STEPS:  ## Check if max number of steps has been exceeded
-      done = True
-      info['reason'] = 'Max Steps reached: {}'.format(self.steps)
+    if mode == 'rgb_array' and (self.params.NUMPY_RENDER or size is not None or grayscale or out is not None or
+                                np.dtype(dtype) != np.uint8):
+      if self.state is None: return None ## If there is no state, exit
+      return self._array_renderer(size, grayscale, dtype).render(out)
 
-    return self.state, reward, done, info
+    pygame = physics.enable_drawing()
 
-  def render(self, mode='rgb_array', **kwargs):
-    """
-    Rendering function
-    :param mode: if human, renders on screen. If rgb_array, renders as numpy array
-    :return: screen if mode=human, array if mode=rgb_array
-    """
     # If no screen available create screen
     if self.screen is None and mode == 'human':
       self.screen = pygame.display.set_mode((self.params.DISPLAY_SIZE[0], self.params.DISPLAY_SIZE[1]), 0, 32)
@@ -200,25 +402,15 @@ class BilliardEnv(gym.Env):
 
     ## Draw bodies
     for body in self.physics_eng.world.bodies:
-      color = [0, 0, 0]
-      obj_name = body.userData['name']
-      if obj_name == 'ball0':
-        color = [0, 0, 255]
-      elif obj_name in ['link0', 'link1']:
-        color = [100, 100, 100]
-      elif 'wall' in obj_name:
-        color = [150, 150, 150]
+      color = self._body_color(body.userData['name'], mode)
+      if color is None:
+        continue
 
       for fixture in body.fixtures:
         if mode == 'human':
           fixture.shape.draw(body, self.screen, self.params, color)
         elif mode == 'rgb_array':
-          obj_name = body.userData['name']
-          if self.params.SHOW_ARM_IN_ARRAY: ## If param is set, in the rgb_array the arm will be visible
-            fixture.shape.draw(body, capture, self.params, color)
-          else:
-            if not obj_name in ['link0', 'link1']:
-              fixture.shape.draw(body, capture, self.params, color)
+          fixture.shape.draw(body, capture, self.params, color)
 
     if mode == 'human':
       pygame.display.flip() ## Need to flip cause of drawing reasons
@@ -227,3 +419,12 @@ class BilliardEnv(gym.Env):
     elif mode == 'rgb_array':
       imgdata = pygame.surfarray.array3d(capture)
       return imgdata.swapaxes(0, 1)
+
+  def close(self):
+    """
+    Closes the environment, stopping the async viewer if any
+    :return:
+    """
+    if self.viewer is not None:
+      self.viewer.close()
+      self.viewer = None
@@ -2,13 +2,14 @@ import gym
 from gym import error, spaces, utils
 from gym.utils import seeding
 import numpy as np
-from gym_billiard.utils import physics, parameters
+from gym_billiard.envs import rollout
+from gym_billiard.utils import physics, parameters, rendering, profiling, viewer
 import logging
 logger = logging.getLogger(__name__)
 
 # TODO implement logger
 
-class BilliardHardEnv(gym.Env):
+class BilliardHardEnv(rollout.RolloutMixin, gym.Env):
   """
   The goal is to send first ball 1 and then ball 0 in the holes. If the arm touches ball 1, is considered as failure.
     State is composed of:
@@ -20,19 +21,33 @@ class BilliardHardEnv(gym.Env):
     joint1_angle -> [-pi, pi]
     joint0_speed, joint1_speed -> [-50, 50]
     """
-  metadata = {'render.modes': ['human'],
+  metadata = {'render.modes': ['human', 'human_async'],
               'video.frames_per_second':15
               }
 
-  def __init__(self, seed=None, max_steps=500):
+  def __init__(self, seed=None, max_steps=500, solver_tier='default', frame_skip=1, fast_forward=False, obs_buffer=None):
     """ Constructor
     :param seed: the random seed for the environment
     :param max_steps: the maximum number of steps the episode lasts
+    :param solver_tier: fidelity of the physics solver. One of parameters.SOLVER_TIERS
+    :param frame_skip: number of physics steps performed by each env step with the same action
+    :param fast_forward: if True, once the world is static the episode jumps straight to its last step. Use it only if
+    the following actions are going to be zero, like in open-loop evaluations.
+    :param obs_buffer: if None, every observation is a new tuple of float64 arrays. Otherwise the observations are
+    written in a flat float32 buffer of shape (8,), and the returned tuple holds views on it, overwritten by the
+    following step. Either True, for a buffer owned by the env, or a float32 array given by the caller. See set_obs_buffer
     :return:
     """
+    assert frame_skip >= 1, 'frame_skip must be at least 1. Given: {}'.format(frame_skip)
+    self.frame_skip = frame_skip
+    self.fast_forward = fast_forward
     self.screen = None
+    self.viewer = None
+    self.renderers = {}
+    self.profiler = None
     self.params = parameters.Params()
-    self.physics_eng = physics.PhysicsSim()
+    self.params.VEL_ITER, self.params.POS_ITER = parameters.SOLVER_TIERS[solver_tier]
+    self.physics_eng = physics.PhysicsSim(balls_pose=[[-0.5, 0.2], [0, 1]], params=self.params)
     self.params.MAX_ENV_STEPS = max_steps
 
     ## Ball XY positions can be between -1.5 and 1.5
@@ -52,9 +67,30 @@ class BilliardHardEnv(gym.Env):
 
     ## Joint commands can be between [-1, 1]
     self.action_space = spaces.Box(low=np.array([-1., -1.]), high=np.array([1., 1.]))
+    self.set_obs_buffer(obs_buffer)
+
+    ## Physical params sampled for the current episode. See _randomize_physics
+    self.physical_params = {}
 
     self.seed(seed)
 
+  def set_obs_buffer(self, obs_buffer=True):
+    """
+    Sets the array in which the observations are written. With a buffer, reading the observation allocates no array:
+    the observation tuple is made of views on the buffer.
+    :param obs_buffer: None to allocate new float64 arrays for every observation, True for a float32 buffer owned by
+    the env, or a float32 array of shape (8,), composed as in _write_obs
+    :return: the buffer
+    """
+    if obs_buffer is True:
+      obs_buffer = np.zeros(8, dtype=np.float32)
+    elif obs_buffer is not None:
+      assert obs_buffer.shape == (8,) and obs_buffer.dtype == np.float32, \
+        'obs_buffer must be a float32 array of shape (8,). Given: {} {}'.format(obs_buffer.shape, obs_buffer.dtype)
+    self.obs_buffer = obs_buffer
+    self._obs_views = None if obs_buffer is None else (obs_buffer[0:2], obs_buffer[2:4], obs_buffer[4:6], obs_buffer[6:8])
+    return obs_buffer
+
   def seed(self, seed=None):
     """
     Function to seed the environment
@@ -64,11 +100,13 @@ class BilliardHardEnv(gym.Env):
     self.np_random, seed = seeding.np_random(seed)
     return [seed]
 
+  @profiling.timed('reset')
   def reset(self):
     """
     Function to reset the environment.
     - If param RANDOM_BALL_INIT_POSE is set, the ball appears in a random pose, otherwise ball0 will appear at [-0.5, 0.2] and ball1 at [0, 1]
     - If param RANDOM_ARM_INIT_POSE is set, the arm joint positions will be set randomly, otherwise they will have [0, 0]
+    - If param DOMAIN_RANDOMIZATION is set, the physical params of the episode are sampled in its ranges
     :return: Initial observation
     """
     if self.params.RANDOM_BALL_INIT_POSE:
@@ -86,17 +124,79 @@ class BilliardHardEnv(gym.Env):
     else:
       init_joint_pose = None
 
+    self._randomize_physics()
     self.physics_eng.reset([init_ball0_pose, init_ball1_pose], init_joint_pose)
     self.steps = 0
     self.ball0_in_hole = False
     self.ball1_in_hole = False
     return self._get_obs()
 
+  def _randomize_physics(self):
+    """
+    Samples the physical params of the new episode in the ranges of param DOMAIN_RANDOMIZATION and applies them in
+    place to the simulation. Params that are no longer randomized go back to their value in params.
+    :return:
+    """
+    hole_radius = self.physics_eng.physical_params['HOLE_RADIUS']
+    self.physical_params = self.physics_eng.randomize_physical_params(self.params.DOMAIN_RANDOMIZATION, self.np_random)
+    if self.physics_eng.physical_params['HOLE_RADIUS'] != hole_radius:
+      ## The holes are in the background of the numpy renderers, so they are created again
+      self.renderers = {}
+
+  def enable_profiling(self, enabled=True):
+    """
+    Enables or disables the timing of the phases of env and simulator. Enabling it clears the previous stats
+    :param enabled: if True, the phases are timed
+    :return:
+    """
+    self.profiler = profiling.Profiler() if enabled else None
+    self.physics_eng.profiler = self.profiler
+
+  def stats(self):
+    """
+    Gives cumulative time and number of calls of every phase: step, reset, render, get_obs, reward_function and
+    world_step, sim_reset of the simulator (plus contacts for BilliardHardEnv)
+    :return: dict {phase: {'calls', 'total', 'mean'}}, times in seconds. Empty if profiling is disabled
+    """
+    return {} if self.profiler is None else self.profiler.stats()
+
+  def clone_state(self, sync=False):
+    """
+    Saves the state of the environment, so that it can be restored later with restore_state. The env is not changed.
+    Restoring clears the simulator caches (contacts warm start and sleep timers), so the restored env can slightly
+    differ from the one that kept going. With sync=True the caches of this env are cleared too, so that it continues
+    exactly as a restored one would.
+    :param sync: if True, the caches are cleared as done by restore_state
+    :return: state: flat array composed of the simulator state followed by [steps, ball0_in_hole, ball1_in_hole]
+    """
+    sim_state = self.physics_eng.get_state()
+    if sync:
+      self.physics_eng.set_state(sim_state)
+    return np.concatenate([sim_state, [self.steps, self.ball0_in_hole, self.ball1_in_hole]])
+
+  def restore_state(self, state):
+    """
+    Restores a state saved with clone_state.
+    :param state: State array
+    :return: Observation of the restored state
+    """
+    self.physics_eng.set_state(state[:-3])
+    self.steps = int(state[-3])
+    self.ball0_in_hole = bool(state[-2])
+    self.ball1_in_hole = bool(state[-1])
+    return self._get_obs()
+
+  @profiling.timed('get_obs')
   def _get_obs(self):
     """
     This function returns the state after reading the simulator parameters.
     :return: state: composed of ([ball0_pose_x, ball0_pose_y], [ball1_pose_x, ball1_pose_y], [joint0_angle, joint1_angle], [joint0_speed, joint1_speed])
     """
+    if self.obs_buffer is not None:
+      self._write_obs(self.obs_buffer)
+      self.state = self._obs_views
+      return self.state
+
     ball0_pose = self.physics_eng.balls[0].position + self.physics_eng.wt_transform
     ball1_pose = self.physics_eng.balls[1].position + self.physics_eng.wt_transform
 
@@ -115,83 +215,209 @@ class BilliardHardEnv(gym.Env):
                   np.array([joint0_v, joint1_v]))
     return self.state
 
+  def _load_obs(self, flat):
+    """
+    Sets the state to the given flat observation, copying it in the observation buffer if any
+    :param flat: observation of shape (8,), as written by _write_obs
+    :return: state
+    """
+    if self.obs_buffer is None:
+      flat = np.array(flat, dtype=np.float64)
+      self.state = (flat[0:2], flat[2:4], flat[4:6], flat[6:8])
+    else:
+      self.obs_buffer[:] = flat
+      self.state = self._obs_views
+    return self.state
+
+  @profiling.timed('get_obs')
+  def _write_obs(self, out):
+    """
+    Writes the flat observation in the given array, without allocating a new one
+    :param out: array of shape (8,), composed as [ball0_x, ball0_y, ball1_x, ball1_y, joint0_angle, joint1_angle, joint0_speed, joint1_speed]
+    :return:
+    """
+    ## Plain floats, so that no b2Vec2 or numpy array is created
+    wt_x, wt_y = self.physics_eng.wt_transform
+    x0, y0 = self.physics_eng.balls[0].position
+    x1, y1 = self.physics_eng.balls[1].position
+    x0, y0, x1, y1 = x0 + wt_x, y0 + wt_y, x1 + wt_x, y1 + wt_y
+
+    if abs(x0) > 1.5 or abs(y0) > 1.5:
+      raise ValueError('Ball 0 out of map in position: {}'.format([x0, y0]))
+    if abs(x1) > 1.5 or abs(y1) > 1.5:
+      raise ValueError('Ball 1 out of map in position: {}'.format([x1, y1]))
+
+    joint0 = self.physics_eng.arm['jointW0']
+    joint1 = self.physics_eng.arm['joint01']
+    out[:] = (x0, y0, x1, y1, joint0.angle, joint1.angle, joint0.speed, joint1.speed)
+
+  @profiling.timed('contacts')
   def arm_ball1_contacts(self):
     """
-    This function checks what is having contacts with ball1.
+    This function checks if the arm is touching ball1. The contacts are tracked by the contact listener of the simulator.
     :return: True if arm touches the ball
     """
-    for contact in self.physics_eng.balls[1].contacts:
-      if 'link' in contact.other.userData['name'] and contact.contact.touching:
-        return True
-    return False
+    return self.physics_eng.arm_contacts[1] > 0
 
-  def step(self, action):
+  def _balls_pose(self):
     """
-    Performs an environment step.
-    :param action: Arm Motor commands. Can be either torques or velocity, according to TORQUE_CONTROL parameter
-    :return: state, reward, final, info
+    Reads the balls poses in table RF straight from the simulator, without building the whole observation
+    :return: ball0 pose, ball1 pose
     """
-    # action = np.clip(action, -1, 1)
+    ball0_pose = self.physics_eng.balls[0].position + self.physics_eng.wt_transform
+    ball1_pose = self.physics_eng.balls[1].position + self.physics_eng.wt_transform
+    return np.array([ball0_pose[0], ball0_pose[1]]), np.array([ball1_pose[0], ball1_pose[1]])
 
-    # Pass motor command
-    self.physics_eng.move_joint('jointW0', action[0])
-    self.physics_eng.move_joint('joint01', action[1])
-    # Simulate timestep
-    self.physics_eng.step()
-    # Get state
-    self._get_obs()
+  @profiling.timed('reward_function')
+  def reward_function(self, info):
+    """
+    This function calculates the reward and checks if the episode is over
+    :param info:
+    :return: reward, final, info
+    """
     reward = 0
-
     final = False
     # Check if final state
     # Calculates if distance between the ball's center and the holes' center is smaller than the holes' radius
-    ball0_pose = self.state[0]
-    ball1_pose = self.state[1]
-    info = {}
     # If arm touches ball 1 finish episode
     if self.arm_ball1_contacts():
       reward = -100
       final = True
       info['reason'] = 'Arm touched ball 1'
     else:
-      for hole in self.physics_eng.holes:
-        dist_ball0 = np.linalg.norm(ball0_pose - hole['pose'])
-        dist_ball1 = np.linalg.norm(ball1_pose - hole['pose'])
-
-        if dist_ball0 <= hole['radius']:
-          self.ball0_in_hole = True
-        if dist_ball1 <= hole['radius']:
-          self.ball1_in_hole = True
-
-        ## Only B1 in hole, get reward but keep on playing
-        if self.ball1_in_hole and not self.ball0_in_hole:
-          final = False
-          reward = 50
-        ## Both in hole, get reward and finish the game
-        elif self.ball1_in_hole and self.ball0_in_hole:
-          final = True
-          reward = 50
-          info['reason'] = 'Both balls in holes'
-        ## Only B0 in hole, get negative reward and finish the game
-        elif not self.ball1_in_hole and self.ball0_in_hole:
-          final = True
-          reward = -50
-          info['reason'] = 'Ball 0 in hole before ball 1'
-
-    self.steps += 1
-    if self.steps >= self.params.MAX_ENV_STEPS: ## Check if max number of steps has been exceeded
-      final = True
-      info['Reason'] = 'Max Steps reached: {}'.format(self.steps)
-
-    return self.state, reward, final, info
+      holes = self.physics_eng.holes_reached(np.array(self._balls_pose()))
+      if holes[0] >= 0:
+        self.ball0_in_hole = True
+      if holes[1] >= 0:
+        self.ball1_in_hole = True
+
+      ## Only B1 in hole, get reward but keep on playing
+      if self.ball1_in_hole and not self.ball0_in_hole:
+        final = False
+        reward = 50
+      ## Both in hole, get reward and finish the game
+      elif self.ball1_in_hole and self.ball0_in_hole:
+        final = True
+        reward = 50
+        info['reason'] = 'Both balls in holes'
+      ## Only B0 in hole, get negative reward and finish the game
+      elif not self.ball1_in_hole and self.ball0_in_hole:
+        final = True
+        reward = -50
+        info['reason'] = 'Ball 0 in hole before ball 1'
+    return reward, final, info
+
+  @profiling.timed('step')
+  def step(self, action):
+    """
+    Performs an environment step.
+    The action is repeated for frame_skip physics steps. The termination is checked after each of them, stopping early
+    if the episode ends, and the rewards are summed. steps counts the physics steps.
+    If fast_forward is set and the world is static, the env jumps to the last step of the episode. Every skipped step
+    would have given the same reward, so it is counted once for each of them.
+    :param action: Arm Motor commands. Can be either torques or velocity, according to TORQUE_CONTROL parameter
+    :return: state, reward, final, info
+    """
+    total_reward, final, info = self._advance(action)
+    # Get state
+    self._get_obs()
+    return self.state, total_reward, final, info
 
-  def render(self, mode='human'):
+  def _advance(self, action):
+    """
+    Applies the action to the simulation, for frame_skip physics steps, and checks the termination
+    :param action: Arm Motor commands
+    :return: reward, final, info
+    """
+    # action = np.clip(action, -1, 1)
+    total_reward = 0
+    info = {}
+    for _ in range(self.frame_skip):
+      # Pass motor command
+      self.physics_eng.move_joint('jointW0', action[0])
+      self.physics_eng.move_joint('joint01', action[1])
+      repeat = 1
+      if self.fast_forward and self.physics_eng.is_static():
+        repeat = max(self.params.MAX_ENV_STEPS - self.steps, 1)
+      else:
+        # Simulate timestep
+        self.physics_eng.step()
+
+      reward, final, info = self.reward_function(info)
+      total_reward += reward * repeat
+
+      self.steps += repeat
+      if self.steps >= self.params.MAX_ENV_STEPS: ## Check if max number of steps has been exceeded
+        final = True
+        info['Reason'] = 'Max Steps reached: {}'.format(self.steps)
+      if final:
+        break
+    return total_reward, final, info
+
+  def _body_color(self, obj_name, mode='rgb_array'):
+    """
+    Gives the color used to draw a body
+    :param obj_name: Name of the body
+    :param mode: Render mode
+    :return: color, or None if the body is not drawn
+    """
+    color = [0, 0, 0]
+    if obj_name == 'ball0':
+      color = [0, 0, 180, 255]
+    elif obj_name == 'ball1':
+      color = [0, 180, 0, 255]
+    elif obj_name in ['link0', 'link1']:
+      if mode == 'rgb_array' and not self.params.SHOW_ARM_IN_ARRAY: ## If param is set, in the rgb_array the arm will be visible
+        return None
+      color = [100, 100, 100]
+      if mode == 'rgb_array':
+        color = [0, 0, 0]
+    elif 'wall' in obj_name:
+      color = [150, 150, 150]
+    return color
+
+  def _array_renderer(self, size=None, grayscale=False, dtype=np.uint8):
     """
-    Rendering function
-    :param mode: if human, renders on screen. If rgb_array, renders as numpy array
-    :return: screen if mode=human, array if mode=rgb_array
+    Gives the numpy renderer for the requested image format. Renderers are created at the first use and then reused
+    :param size: (width, height) of the image. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True, the image is grayscale
+    :param dtype: dtype of the image
+    :return: renderer
     """
-    import pygame
+    key = (None if size is None else tuple(size), grayscale, np.dtype(dtype))
+    if key not in self.renderers:
+      self.renderers[key] = rendering.ArrayRenderer(self.physics_eng, self.params,
+                                                    [(hole['pose'], hole['radius']) for hole in self.physics_eng.holes],
+                                                    self._body_color, size=size, grayscale=grayscale, dtype=dtype)
+    return self.renderers[key]
+
+  @profiling.timed('render')
+  def render(self, mode='human', size=None, grayscale=False, dtype=np.uint8, out=None):
+    """
+    Rendering function.
+    If size, grayscale, dtype or out are given, or if param NUMPY_RENDER is set, the rgb_array image is drawn with
+    rendering.ArrayRenderer, straight at the requested resolution and format.
+    :param mode: if human, renders on screen. If rgb_array, renders as numpy array. If human_async, sends the state to
+    a viewer.AsyncViewer, that shows it on screen from another process without slowing down the simulation
+    :param size: (width, height) of the rgb_array image. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True, the rgb_array image has shape (height, width) instead of (height, width, 3)
+    :param dtype: dtype of the rgb_array image. Either np.uint8, with values in [0, 255], or np.float32, in [0, 1]
+    :param out: array in which the rgb_array image is drawn, to avoid allocating a new one at every call
+    :return: screen if mode=human, array if mode=rgb_array, None if mode=human_async
+    """
+    if mode == 'human_async':
+      if self.state is None: return None ## If there is no state, exit
+      if self.viewer is None:
+        self.viewer = viewer.AsyncViewer(self)
+      self.viewer.push()
+      return None
+
+    if mode == 'rgb_array' and (self.params.NUMPY_RENDER or size is not None or grayscale or out is not None or
+                                np.dtype(dtype) != np.uint8):
+      if self.state is None: return None ## If there is no state, exit
+      return self._array_renderer(size, grayscale, dtype).render(out)
+
+    pygame = physics.enable_drawing()
 
     # If no screen available create screen
     if self.screen is None and mode=='human':
@@ -226,29 +452,15 @@ class BilliardHardEnv(gym.Env):
 
     ## Draw bodies
     for body in self.physics_eng.world.bodies:
-      color = [0, 0, 0]
-      obj_name = body.userData['name']
-      if obj_name == 'ball0':
-        color = [0, 0, 180, 255]
-      elif obj_name == 'ball1':
-        color = [0, 180, 0, 255]
-      elif obj_name in ['link0', 'link1']:
-        color = [100, 100, 100]
-        if mode=='rgb_array':
-          color = [0, 0, 0]
-      elif 'wall' in obj_name:
-        color = [150, 150, 150]
+      color = self._body_color(body.userData['name'], mode)
+      if color is None:
+        continue
 
       for fixture in body.fixtures:
         if mode=='human':
           fixture.shape.draw(body, self.screen, self.params, color)
         elif mode=='rgb_array':
-          obj_name = body.userData['name']
-          if self.params.SHOW_ARM_IN_ARRAY:  ## If param is set, in the rgb_array the arm will be visible
-            fixture.shape.draw(body, capture, self.params, color)
-          else:
-            if not obj_name in ['link0', 'link1']:
-              fixture.shape.draw(body, capture, self.params, color)
+          fixture.shape.draw(body, capture, self.params, color)
 
     if mode=='human':
       pygame.display.flip() ## Need to flip cause of drawing reasons
@@ -256,4 +468,13 @@ class BilliardHardEnv(gym.Env):
       return self.screen
     elif mode=='rgb_array':
       imgdata = pygame.surfarray.array3d(capture)
-      return imgdata.swapaxes(0, 1)
\ No newline at end of file
+      return imgdata.swapaxes(0, 1)
+
+  def close(self):
+    """
+    Closes the environment, stopping the async viewer if any
+    :return:
+    """
+    if self.viewer is not None:
+      self.viewer.close()
+      self.viewer = None
@@ -0,0 +1,303 @@
+from gym import spaces
+from gym.utils import seeding
+import numpy as np
+from gym_billiard.utils import physics, parameters, numpy_physics, rendering
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BilliardVecEnv(object):
+  """
+  Vectorized version of the Billiard environment: it owns num_envs independent tables and steps all of them with a
+  single call.
+  Observations, rewards and dones are stacked along the first axis:
+  obs -> (num_envs, 6), composed as in BilliardEnv: [ball_x, ball_y, joint0_angle, joint1_angle, joint0_speed, joint1_speed]
+  rewards -> (num_envs,)
+  dones -> (num_envs,)
+
+  With param DOMAIN_RANDOMIZATION set, every table samples its own physical params at each reset (box2d backends
+  only). The values of the episode a step belongs to are in info['physical_params'].
+
+  Tables whose episode ended are reset in place. The observation returned for them is already the first observation
+  of the new episode, while the last observation of the ended one is stored in info['terminal_observation'].
+
+  Three physics backends are available:
+  - 'box2d': one PhysicsSim per table, stepped one after the other;
+  - 'box2d_shared': all the tables in a single Box2D world (see physics.MultiTableSim), advanced by a single step and
+  read in bulk. Same physics of 'box2d', with less overhead per table;
+  - 'numpy': a single NumpyPhysicsSim integrating all the tables at once. Much faster with many tables, but it only
+  approximates Box2D (see NumpyPhysicsSim for the tolerances).
+
+  NB: The returned arrays and the infos list are buffers owned by the env and are overwritten at every step. Copy them if
+  you need to keep them. The info dict of a table is kept until its episode ends.
+  """
+  metadata = {'render.modes': ['rgb_array'],
+              'video.frames_per_second': 15
+              }
+
+  def __init__(self, num_envs, seed=None, max_steps=500, backend='box2d', solver_tier='default'):
+    """ Constructor
+    :param num_envs: the number of tables simulated in parallel
+    :param seed: the random seed for the environment
+    :param max_steps: the maximum number of steps each episode lasts
+    :param backend: physics backend. One of 'box2d', 'box2d_shared' or 'numpy'
+    :param solver_tier: fidelity of the physics solver. One of parameters.SOLVER_TIERS
+    :return:
+    """
+    assert num_envs > 0, 'num_envs must be positive. Given: {}'.format(num_envs)
+    assert backend in ('box2d', 'box2d_shared', 'numpy'), 'Unknown backend: {}'.format(backend)
+    self.num_envs = num_envs
+    self.backend = backend
+    self.params = parameters.Params()
+    self.params.MAX_ENV_STEPS = max_steps
+    self.params.VEL_ITER, self.params.POS_ITER = parameters.SOLVER_TIERS[solver_tier]
+    self.sim = self.multi = self.sims = None
+    if backend == 'numpy':
+      self.sim = numpy_physics.NumpyPhysicsSim(num_tables=num_envs, params=self.params)
+    elif backend == 'box2d_shared':
+      self.multi = physics.MultiTableSim(num_envs, params=self.params)
+      self.sims = self.multi.tables
+    else:
+      self.sims = [physics.PhysicsSim(params=self.params) for _ in range(num_envs)]
+
+    ## Spaces of the single table. Same as BilliardEnv
+    self.single_observation_space = spaces.Box(low=np.array([
+                                                 -self.params.TABLE_SIZE[0] / 2., -self.params.TABLE_SIZE[1] / 2.,
+                                                 -np.pi / 2, -np.pi,
+                                                 -50, -50]),
+                                               high=np.array([
+                                                 self.params.TABLE_SIZE[0] / 2., self.params.TABLE_SIZE[1] / 2.,
+                                                 np.pi / 2, np.pi,
+                                                 50, 50]), dtype=np.float32)
+    self.single_action_space = spaces.Box(low=np.array([-1., -1.]), high=np.array([1., 1.]), dtype=np.float32)
+
+    ## Batched spaces
+    self.observation_space = spaces.Box(low=np.tile(self.single_observation_space.low, (num_envs, 1)),
+                                        high=np.tile(self.single_observation_space.high, (num_envs, 1)),
+                                        dtype=np.float32)
+    self.action_space = spaces.Box(low=np.tile(self.single_action_space.low, (num_envs, 1)),
+                                   high=np.tile(self.single_action_space.high, (num_envs, 1)),
+                                   dtype=np.float32)
+
+    holes = self.sim.holes if self.sims is None else self.sims[0].holes
+    self.goals = np.array([hole['pose'] for hole in holes])
+    self.goalRadius = np.array([hole['radius'] for hole in holes])
+    ## Radius of the holes of every table, that can differ from goalRadius with DOMAIN_RANDOMIZATION.
+    ## Shape: (num_envs, num_holes)
+    self.tables_goal_radius = np.tile(self.goalRadius, (num_envs, 1))
+    ## Physical params sampled for the current episode of every table
+    self.physical_params = [{} for _ in range(num_envs)]
+
+    ## Preallocated buffers
+    self.obs = np.zeros((num_envs, 6), dtype=np.float32)
+    self.rewards = np.zeros(num_envs, dtype=np.float64)
+    self.dones = np.zeros(num_envs, dtype=bool)
+    self.steps = np.zeros(num_envs, dtype=np.int64)
+    self._handles = [None] * num_envs
+    self.infos = [{} for _ in range(num_envs)]
+    ## Tables whose info has to be replaced at the next step, since their episode ended
+    self._ended = []
+    self._balls_state = np.zeros((num_envs, 1, 4))
+    self._joints_state = np.zeros((num_envs, 4))
+    self.renderers = {}
+
+    self.seed(seed)
+
+  def seed(self, seed=None):
+    """
+    Function to seed the environment
+    :param seed: The random seed
+    :return: [seed]
+    """
+    self.np_random, seed = seeding.np_random(seed)
+    return [seed]
+
+  def _reset_tables(self, tables):
+    """
+    Resets the given tables. Initial poses follow the same rules of BilliardEnv.reset
+    :param tables: Indexes of the tables
+    :return:
+    """
+    ranges = self.params.DOMAIN_RANDOMIZATION
+    assert self.sims is not None or not ranges, \
+      'DOMAIN_RANDOMIZATION is only available with the box2d backends. Backend: {}'.format(self.backend)
+    balls_pose = np.zeros((len(tables), 1, 2))
+    joints_pose = np.zeros((len(tables), 2))
+    for k in range(len(tables)):
+      if self.params.RANDOM_BALL_INIT_POSE:
+        balls_pose[k, 0] = [self.np_random.uniform(low=-1.2, high=1.2),  # x
+                            self.np_random.uniform(low=-1.2, high=1.2)]  # y
+      else:
+        balls_pose[k, 0] = [-0.5, 0.2]
+
+      if self.params.RANDOM_ARM_INIT_POSE:
+        joints_pose[k] = [self.np_random.uniform(low=-np.pi * .2, high=np.pi * .2),  # Joint0
+                          self.np_random.uniform(low=-np.pi * .9, high=np.pi * .9)]  # Joint1
+
+    if self.sims is None:
+      self.sim.reset(balls_pose, joints_pose, tables=tables)
+    else:
+      for k, idx in enumerate(tables):
+        sim = self.sims[idx]
+        self.physical_params[idx] = sim.randomize_physical_params(ranges, self.np_random)
+        self.tables_goal_radius[idx] = sim.holes_radius
+        sim.reset(balls_pose[k], joints_pose[k] if self.params.RANDOM_ARM_INIT_POSE else None)
+        ## The joints are recreated at every reset, so the handles have to be collected again
+        self._handles[idx] = (sim.balls[0], sim.arm['jointW0'], sim.arm['joint01'])
+    self.steps[tables] = 0
+    self._read_obs(tables)
+
+  def _read_obs(self, tables):
+    """
+    Writes the observation of the given tables in the observation buffer
+    :param tables: Indexes of the tables
+    :return:
+    """
+    if self.sims is None:
+      sim = self.sim
+      self.obs[tables, :2] = sim.ball_pos[tables, 0] + sim.wt_transform
+      self.obs[tables, 2:] = sim.joints_state(self._joints_state)[tables]
+      return
+
+    if self.multi is not None:
+      self.obs[tables, :2] = self.multi.balls_state(self._balls_state)[tables, 0, :2]
+      self.obs[tables, 2:] = self.multi.joints_state(self._joints_state)[tables]
+      return
+
+    for idx in tables:
+      ball, joint0, joint1 = self._handles[idx]
+      ball_pose = ball.position
+      wt_transform = self.sims[idx].wt_transform
+      obs = self.obs[idx]
+      obs[0] = ball_pose[0] + wt_transform[0]
+      obs[1] = ball_pose[1] + wt_transform[1]
+      obs[2] = joint0.angle
+      obs[3] = joint1.angle
+      obs[4] = joint0.speed
+      obs[5] = joint1.speed
+
+  def reset(self):
+    """
+    Resets all the tables.
+    :return: Initial observations. Array of shape (num_envs, 6)
+    """
+    self._reset_tables(np.arange(self.num_envs))
+    self.rewards[:] = 0
+    self.dones[:] = False
+    self.infos[:] = [self._new_info(idx) for idx in range(self.num_envs)]
+    self._ended = []
+    return self.obs
+
+  def _new_info(self, idx):
+    """
+    Creates the info of a new episode of a table
+    :param idx: Index of the table
+    :return: info dict
+    """
+    if self.params.DOMAIN_RANDOMIZATION:
+      return {'physical_params': self.physical_params[idx]}
+    return {}
+
+  def step(self, actions):
+    """
+    Performs a step on all the tables.
+    :param actions: Arm motor commands. Array of shape (num_envs, 2)
+    :return: obs, rewards, dones, infos
+    """
+    actions = np.asarray(actions)
+    assert actions.shape == (self.num_envs, 2), 'Wrong actions shape. Expected {} - Given {}'.format((self.num_envs, 2), actions.shape)
+
+    self.steps += 1
+    if self.sims is None:
+      self.sim.move_joint('jointW0', actions[:, 0])
+      self.sim.move_joint('joint01', actions[:, 1])
+      self.sim.step()
+    elif self.multi is not None:
+      self.multi.move_joints(actions)
+      self.multi.step()
+    else:
+      for idx, sim in enumerate(self.sims):
+        ## Pass motor command
+        sim.move_joint('jointW0', actions[idx, 0])
+        sim.move_joint('joint01', actions[idx, 1])
+        ## Simulate timestep
+        sim.step()
+    self._read_obs(np.arange(self.num_envs))
+
+    ball_poses = self.obs[:, :2]
+    if np.any(np.abs(ball_poses) > 1.5):
+      idx = np.argmax(np.any(np.abs(ball_poses) > 1.5, axis=1))
+      raise ValueError('Ball out of map in table {} in position: {}'.format(idx, ball_poses[idx]))
+
+    ## Distance of every ball from every hole. Shape: (num_envs, num_holes)
+    in_hole = np.linalg.norm(ball_poses[:, None, :] - self.goals[None, :, :], axis=-1) <= self.tables_goal_radius
+    hole_reached = np.any(in_hole, axis=1)
+    timeout = self.steps >= self.params.MAX_ENV_STEPS
+
+    self.rewards[:] = 0
+    self.rewards[hole_reached] = 100
+    np.logical_or(hole_reached, timeout, out=self.dones)
+
+    ## Only the tables reset at the last step get a new dict, so the infos returned then keep their content
+    infos = self.infos
+    for idx in self._ended:
+      infos[idx] = self._new_info(idx)
+    finished = np.flatnonzero(self.dones)
+    self._ended = finished
+    for idx in finished:
+      info = infos[idx]
+      if hole_reached[idx]:
+        info['reason'] = 'Ball in hole'
+        info['rew_area'] = int(np.argmax(in_hole[idx]))
+      else:
+        info['reason'] = 'Max Steps reached: {}'.format(self.steps[idx])
+      info['terminal_observation'] = self.obs[idx].copy()
+    if len(finished) > 0:
+      self._reset_tables(finished)
+
+    return self.obs, self.rewards, self.dones, infos
+
+  def _body_color(self, obj_name):
+    """
+    Gives the color used to draw a body. Same colors of the rgb_array rendering of BilliardEnv
+    :param obj_name: Name of the body
+    :return: color, or None if the body is not drawn
+    """
+    if obj_name == 'ball0':
+      return [0, 0, 255]
+    elif obj_name in ['link0', 'link1']:
+      return [100, 100, 100] if self.params.SHOW_ARM_IN_ARRAY else None
+    elif 'wall' in obj_name:
+      return [150, 150, 150]
+    return [0, 0, 0]
+
+  def render(self, mode='rgb_array', size=None, grayscale=False, dtype=np.uint8, out=None):
+    """
+    Draws all the tables in a single array, with rendering.ArrayRenderer. All the tables share the same background,
+    rasterized only once. Only available with the box2d backends.
+    :param mode: Render mode. Only rgb_array is supported
+    :param size: (width, height) of the images. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True, the images have shape (height, width) instead of (height, width, 3)
+    :param dtype: dtype of the images. Either np.uint8, with values in [0, 255], or np.float32, in [0, 1]
+    :param out: array of shape (num_envs, height, width, 3) in which the images are drawn. If None, a new one is allocated
+    :return: array of shape (num_envs, height, width, 3), or (num_envs, height, width) if grayscale
+    """
+    assert self.sims is not None, 'Rendering is only available with the box2d backends. Backend: {}'.format(self.backend)
+    assert mode == 'rgb_array', 'Render mode not supported: {}'.format(mode)
+    key = (None if size is None else tuple(size), grayscale, np.dtype(dtype))
+    if key not in self.renderers:
+      self.renderers[key] = rendering.ArrayRenderer(self.sims[0], self.params,
+                                                    [(goal, self.params.HOLE_RADIUS) for goal in self.goals],
+                                                    self._body_color, size=size, grayscale=grayscale, dtype=dtype)
+    holes = None
+    if np.any(self.tables_goal_radius != self.goalRadius):
+      ## The holes differ between the tables, so they cannot share the background
+      holes = [list(zip(self.goals, radius)) for radius in self.tables_goal_radius]
+    return self.renderers[key].render_batch(self.sims, out, holes)
+
+  def close(self):
+    """
+    Closes the environment
+    :return:
+    """
+    pass
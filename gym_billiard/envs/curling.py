@@ -5,11 +5,8 @@ import gym
 from gym import error, spaces, utils
 from gym.utils import seeding
 import numpy as np
-from gym_billiard.utils import physics, parameters
+from gym_billiard.utils import physics, parameters, profiling
 from gym_billiard.envs import billiard_env
-import os
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-import pygame
 
 # TODO implement logger
 
@@ -28,11 +25,21 @@ class Curling(billiard_env.BilliardEnv):
   joint1_angle -> [-pi, pi]
   joint0_speed, joint1_speed -> [-50, 50]
   """
-  def __init__(self, seed=None, max_steps=500):
-    super().__init__(seed, max_steps)
+  def __init__(self, seed=None, max_steps=500, solver_tier='default', frame_skip=1, fast_forward=False, obs_buffer=None):
+    super().__init__(seed, max_steps, solver_tier, frame_skip, fast_forward, obs_buffer)
     self.goals = np.array([[-0.8, .8]])
     self.goalRadius = [0.4]
 
+  def _randomize_physics(self):
+    """
+    Same as BilliardEnv._randomize_physics. The goal area is not a hole, so it keeps its radius
+    :return:
+    """
+    goal_radius = self.goalRadius
+    super()._randomize_physics()
+    self.goalRadius = goal_radius
+
+  @profiling.timed('reward_function')
   def reward_function(self, info):
     """
     This function calculates the reward based on the final position of the ball.
@@ -41,7 +48,7 @@ class Curling(billiard_env.BilliardEnv):
     :return:
     """
     if self.steps >= self.params.MAX_ENV_STEPS: # If we are at the end of the episode
-      ball_pose = self.state[:2]
+      ball_pose = self._ball_pose()
       for goal_idx, goal in enumerate(self.goals):
         dist = np.linalg.norm(ball_pose - goal)
         if dist <= self.goalRadius[goal_idx]:
@@ -0,0 +1,142 @@
+import collections
+import hashlib
+import sqlite3
+import numpy as np
+import Box2D as b2
+import gym_billiard
+from gym_billiard.envs.batch_evaluator import OUTCOME_DTYPE
+import logging
+logger = logging.getLogger(__name__)
+
+## Params that only affect the rendering, so they are not part of the key
+RENDER_PARAMS = ['DISPLAY_SIZE', 'TO_PIXEL', 'PPM', 'SHOW_ARM_IN_ARRAY', 'NUMPY_RENDER', 'TEST']
+
+## Versions of the code the outcomes depend on. Outcomes stored by other versions are not used
+VERSIONS = (('Box2D', b2.__version__), ('gym_billiard', gym_billiard.__version__))
+
+
+def episode_context(env_id, params, env_kwargs, init_obs):
+  """
+  Describes everything, apart from the actions, an episode outcome depends on, including the versions of Box2D and
+  gym_billiard
+  :param env_id: Id of the env
+  :param params: Params of the env
+  :param env_kwargs: Arguments of the env constructor
+  :param init_obs: Flat observation after the reset, holding the initial pose of balls and arm
+  :return: context bytes, to be given to OutcomeCache.key
+  """
+  assert not params.RANDOM_BALL_INIT_POSE and not params.RANDOM_ARM_INIT_POSE and not params.DOMAIN_RANDOMIZATION, \
+    'Outcomes can be cached only if the initial pose and the physical params are fixed'
+  fields = sorted((name, repr(np.asarray(value).tolist())) for name, value in vars(params).items()
+                  if name not in RENDER_PARAMS)
+  context = repr((VERSIONS, env_id, fields, sorted(env_kwargs.items()), np.asarray(init_obs, dtype=np.float64).tolist()))
+  return context.encode()
+
+
+class OutcomeCache(object):
+  """
+  Memoizes the outcomes of deterministic episodes, so that evaluating again the same action sequence needs no physics.
+  The key is a hash of the episode context (env id, physics params, env arguments and initial pose, as given by
+  episode_context) and of the bytes of the actions.
+
+  The outcomes are kept in a LRU of at most maxsize entries. If path is given, they are also stored in a sqlite
+  database, that can be shared by different processes and runs. Misses of the LRU are looked up in the database.
+  """
+  def __init__(self, maxsize=100000, path=None):
+    """ Constructor
+    :param maxsize: Maximum number of outcomes kept in memory
+    :param path: Path of the sqlite database. If None, the outcomes are kept only in memory
+    :return:
+    """
+    self.maxsize = maxsize
+    self.path = path
+    self.hits = 0
+    self.misses = 0
+    self._lru = collections.OrderedDict()
+    self._db = None
+    if path is not None:
+      self._db = sqlite3.connect(path, timeout=60)
+      self._db.execute('PRAGMA journal_mode=WAL')
+      self._db.execute('CREATE TABLE IF NOT EXISTS outcomes (key BLOB PRIMARY KEY, outcome BLOB)')
+      self._db.commit()
+
+  @staticmethod
+  def key(context, actions):
+    """
+    Computes the key of an episode
+    :param context: Episode context, as given by episode_context
+    :param actions: Action sequence of shape (T, 2)
+    :return: key bytes
+    """
+    actions = np.ascontiguousarray(actions, dtype=np.float64)
+    digest = hashlib.sha256(context)
+    digest.update(repr(actions.shape).encode())
+    digest.update(actions.tobytes())
+    return digest.digest()
+
+  def _remember(self, key, outcome):
+    """
+    Adds the outcome to the LRU, evicting the least recently used one if full
+    :param key: Key
+    :param outcome: Outcome
+    :return:
+    """
+    self._lru[key] = outcome
+    self._lru.move_to_end(key)
+    if len(self._lru) > self.maxsize:
+      self._lru.popitem(last=False)
+
+  def get(self, key):
+    """
+    Looks up an outcome
+    :param key: Key
+    :return: outcome, of OUTCOME_DTYPE, or None if the episode has never been stored
+    """
+    if key in self._lru:
+      self._lru.move_to_end(key)
+      self.hits += 1
+      return self._lru[key]
+    if self._db is not None:
+      row = self._db.execute('SELECT outcome FROM outcomes WHERE key = ?', (key,)).fetchone()
+      if row is not None:
+        outcome = np.frombuffer(row[0], dtype=OUTCOME_DTYPE)[0]
+        self._remember(key, outcome)
+        self.hits += 1
+        return outcome
+    self.misses += 1
+    return None
+
+  def put_many(self, keys, outcomes):
+    """
+    Stores the outcomes of some episodes. The database is written in a single transaction
+    :param keys: Keys
+    :param outcomes: Array of OUTCOME_DTYPE
+    :return:
+    """
+    for key, outcome in zip(keys, outcomes):
+      self._remember(key, outcome.copy())
+    if self._db is not None:
+      self._db.executemany('INSERT OR REPLACE INTO outcomes VALUES (?, ?)',
+                           [(key, outcome.tobytes()) for key, outcome in zip(keys, outcomes)])
+      self._db.commit()
+
+  def put(self, key, outcome):
+    """
+    Stores the outcome of an episode
+    :param key: Key
+    :param outcome: Outcome, of OUTCOME_DTYPE
+    :return:
+    """
+    self.put_many([key], np.array([outcome], dtype=OUTCOME_DTYPE))
+
+  def __len__(self):
+    return len(self._lru)
+
+  def close(self):
+    """
+    Closes the database
+    :return:
+    """
+    if self._db is not None:
+      self._db.close()
+      self._db = None
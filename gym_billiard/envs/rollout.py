@@ -0,0 +1,46 @@
+from gym import spaces
+import numpy as np
+
+
+class RolloutMixin(object):
+  """
+  Adds rollout to an env. The env must define:
+  - _advance(action): applies the action and gives (reward, done, info), without reading the observation;
+  - _write_obs(out): writes the flat observation in out;
+  - _load_obs(flat): sets the state of the env to the given flat observation.
+  """
+  def _flat_obs_dim(self):
+    """
+    Gives the size of the flat observation written by _write_obs
+    :return: size
+    """
+    if isinstance(self.observation_space, spaces.Tuple):
+      return sum(space.shape[0] for space in self.observation_space.spaces)
+    return self.observation_space.shape[0]
+
+  def rollout(self, actions):
+    """
+    Runs an open-loop sequence of actions from the current state, without building the observation and the info of
+    every step. The episode is stopped at its end, so the rows after the termination step are left as they are: the
+    observations keep the last one, the rewards are 0 and the dones True.
+    The observations are flat, as in _write_obs.
+    :param actions: Arm motor commands. Array of shape (T, 2)
+    :return: observations (T+1, obs_dim), with the current one in the first row, rewards (T,), dones (T,),
+    number of steps performed, info of the last step
+    """
+    actions = np.asarray(actions)
+    observations = np.empty((len(actions) + 1, self._flat_obs_dim()))
+    rewards = np.zeros(len(actions))
+    dones = np.ones(len(actions), dtype=bool)
+    self._write_obs(observations[0])
+    info = {}
+    t = 0
+    for t, action in enumerate(actions, 1):
+      rewards[t - 1], dones[t - 1], info = self._advance(action)
+      self._write_obs(observations[t])
+      if dones[t - 1]:
+        break
+    observations[t + 1:] = observations[t]
+    ## The state is set from the last observation, without reading the simulator again
+    self._load_obs(observations[t])
+    return observations, rewards, dones, t, info
@@ -0,0 +1,272 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from gym import spaces
+import numpy as np
+from gym_billiard.envs.billiard_env import BilliardEnv
+from gym_billiard.envs.billiard_hard_env import BilliardHardEnv
+from gym_billiard.envs.curling import Curling
+from gym_billiard.envs.billiard_crowd_env import BilliardCrowdEnv
+import logging
+logger = logging.getLogger(__name__)
+
+## Environments that can be run by the workers
+ENV_CLASSES = {'Billiard-v0': BilliardEnv,
+               'BilliardHard-v0': BilliardHardEnv,
+               'Curling-v0': Curling,
+               'BilliardCrowd-v0': BilliardCrowdEnv}
+
+## Commands sent to the workers. They are sent as raw bytes, so nothing is pickled while stepping.
+_STEP = b's'
+_RESET = b'r'
+_CLOSE = b'c'
+_OK = b'k'
+
+
+def _flatten_obs(obs):
+  """
+  Flattens the observation of an env in a 1D array. Needed for BilliardHardEnv, whose observation is a tuple of arrays.
+  :param obs: Observation
+  :return: flat observation
+  """
+  if isinstance(obs, tuple):
+    return np.concatenate(obs)
+  return np.asarray(obs)
+
+
+def _buffers_layout(num_envs, obs_dim):
+  """
+  Defines how the shared memory block is divided between the buffers.
+  :param num_envs: Number of envs
+  :param obs_dim: Size of the flat observation
+  :return: list of (name, shape, dtype, offset), total size in bytes
+  """
+  layout = []
+  offset = 0
+  for name, shape, dtype in [('actions', (num_envs, 2), np.float64),
+                             ('rewards', (num_envs,), np.float64),
+                             ('obs', (num_envs, obs_dim), np.float32),
+                             ('terminal_obs', (num_envs, obs_dim), np.float32),
+                             ('rew_area', (num_envs,), np.int32),
+                             ('dones', (num_envs,), np.bool_)]:
+    layout.append((name, shape, dtype, offset))
+    offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+  return layout, offset
+
+
+def _map_buffers(shm, layout):
+  """
+  Creates the numpy views on the shared memory block
+  :param shm: SharedMemory block
+  :param layout: Buffers layout as given by _buffers_layout
+  :return: dict of arrays
+  """
+  return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset) for name, shape, dtype, offset in layout}
+
+
+def _worker(remote, parent_remote, env_class, env_kwargs, shm_name, layout, env_idx, seeds):
+  """
+  Worker process. Steps its slice of envs and writes the results in the shared buffers.
+  :param remote: Worker end of the pipe
+  :param parent_remote: Main process end of the pipe. Closed in the worker
+  :param env_class: Class of the env
+  :param env_kwargs: Arguments of the env constructor
+  :param shm_name: Name of the shared memory block
+  :param layout: Buffers layout
+  :param env_idx: Indexes of the envs handled by this worker
+  :param seeds: Seeds of the envs handled by this worker
+  :return:
+  """
+  parent_remote.close()
+  shm = shared_memory.SharedMemory(name=shm_name)
+  buffers = _map_buffers(shm, layout)
+  actions, obs, terminal_obs = buffers['actions'], buffers['obs'], buffers['terminal_obs']
+  rewards, dones, rew_area = buffers['rewards'], buffers['dones'], buffers['rew_area']
+  envs = [env_class(seed=seed, **env_kwargs) for seed in seeds]
+  try:
+    while True:
+      cmd = remote.recv_bytes()
+      if cmd == _CLOSE:
+        break
+      ## An error in an env is sent back, but the worker keeps serving its envs, that can be reset
+      try:
+        if cmd == _STEP:
+          for idx, env in zip(env_idx, envs):
+            ob, reward, done, info = env.step(actions[idx])
+            rewards[idx] = reward
+            dones[idx] = done
+            if done:
+              terminal_obs[idx] = _flatten_obs(ob)
+              rew_area[idx] = info.get('rew_area', -1) if info is not None else -1
+              ob = env.reset()
+            obs[idx] = _flatten_obs(ob)
+        elif cmd == _RESET:
+          for idx, env in zip(env_idx, envs):
+            obs[idx] = _flatten_obs(env.reset())
+      except Exception as e:
+        remote.send_bytes(b'e' + str(e).encode())
+        continue
+      remote.send_bytes(_OK)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    for env in envs:
+      env.close()
+    del actions, obs, terminal_obs, rewards, dones, rew_area, buffers
+    shm.close()
+
+
+class SubprocVecEnv(object):
+  """
+  Vectorized env that runs the tables in a pool of subprocesses.
+  Each worker steps its own slice of envs and writes observations, rewards and dones straight in a shared memory block.
+  The only thing sent through the pipes at every step is a one byte command, so nothing gets pickled while stepping.
+
+  Works with Billiard-v0, BilliardHard-v0 and Curling-v0. The observations are flattened, so they have shape
+  (num_envs, 6) for Billiard-v0 and Curling-v0, and (num_envs, 8) for BilliardHard-v0.
+
+  Finished envs are reset in the workers. Their last observation is stored in info['terminal_observation'].
+
+  NB: The returned arrays are views on the shared buffers and are overwritten at every step. Copy them if you need to keep them.
+  """
+  def __init__(self, env_id='Billiard-v0', num_envs=4, num_workers=None, seed=None, max_steps=500, solver_tier='default',
+               start_method=None):
+    """ Constructor
+    :param env_id: Id of the env to run. One of ENV_CLASSES
+    :param num_envs: Total number of envs
+    :param num_workers: Number of subprocesses. If None, it is min(num_envs, cpu_count)
+    :param seed: Random seed. The env i is seeded with seed + i
+    :param max_steps: the maximum number of steps each episode lasts
+    :param solver_tier: fidelity of the physics solver. One of parameters.SOLVER_TIERS
+    :param start_method: multiprocessing start method. If None, the platform default is used
+    :return:
+    """
+    assert env_id in ENV_CLASSES, 'Env {} not supported. Available: {}'.format(env_id, list(ENV_CLASSES))
+    if num_workers is None:
+      num_workers = min(num_envs, mp.cpu_count())
+    assert 0 < num_workers <= num_envs, 'num_workers must be in [1, num_envs]. Given: {}'.format(num_workers)
+
+    self.env_id = env_id
+    self.num_envs = num_envs
+    self.num_workers = num_workers
+    self.closed = False
+
+    ## Instantiate an env in the main process to get the spaces and observation size
+    env_class = ENV_CLASSES[env_id]
+    env_kwargs = {'max_steps': max_steps, 'solver_tier': solver_tier}
+    env = env_class(**env_kwargs)
+    self.single_action_space = env.action_space
+    obs_dim = _flatten_obs(env.reset()).shape[0]
+    self.single_observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(obs_dim,), dtype=np.float32)
+    env.close()
+
+    layout, size = _buffers_layout(num_envs, obs_dim)
+    self._shm = shared_memory.SharedMemory(create=True, size=size)
+    self._buffers = _map_buffers(self._shm, layout)
+    self.actions = self._buffers['actions']
+    self.obs = self._buffers['obs']
+    self.terminal_obs = self._buffers['terminal_obs']
+    self.rewards = self._buffers['rewards']
+    self.dones = self._buffers['dones']
+    self.rew_area = self._buffers['rew_area']
+
+    ctx = mp.get_context(start_method)
+    self.remotes, self.processes = [], []
+    for env_idx in np.array_split(np.arange(num_envs), num_workers):
+      seeds = [None if seed is None else seed + int(idx) for idx in env_idx]
+      remote, work_remote = ctx.Pipe()
+      process = ctx.Process(target=_worker,
+                            args=(work_remote, remote, env_class, env_kwargs, self._shm.name, layout, env_idx, seeds),
+                            daemon=True)
+      process.start()
+      work_remote.close()
+      self.remotes.append(remote)
+      self.processes.append(process)
+
+  def _send(self, cmd):
+    """
+    Sends the command to all the workers
+    :param cmd: Command
+    :return:
+    """
+    for remote in self.remotes:
+      remote.send_bytes(cmd)
+
+  def _wait(self):
+    """
+    Waits for all the workers to finish the last command. If some env raised an error, it is raised here once all the
+    workers answered, so the envs are still usable: reset them to go on.
+    :return:
+    """
+    errors = []
+    for remote in self.remotes:
+      msg = remote.recv_bytes()
+      if msg != _OK:
+        errors.append(msg[1:].decode())
+    if errors:
+      raise RuntimeError('Error in the workers: {}'.format(errors))
+
+  def reset(self):
+    """
+    Resets all the envs
+    :return: Initial observations. Array of shape (num_envs, obs_dim)
+    """
+    self._send(_RESET)
+    self._wait()
+    return self.obs
+
+  def step_async(self, actions):
+    """
+    Sends the actions to the workers without waiting for the results
+    :param actions: Arm motor commands. Array of shape (num_envs, 2)
+    :return:
+    """
+    self.actions[:] = actions
+    self._send(_STEP)
+
+  def step_wait(self):
+    """
+    Waits for the workers to complete the step
+    :return: obs, rewards, dones, infos
+    """
+    self._wait()
+    infos = [{} for _ in range(self.num_envs)]
+    for idx in np.flatnonzero(self.dones):
+      infos[idx]['terminal_observation'] = self.terminal_obs[idx].copy()
+      if self.rew_area[idx] >= 0:
+        infos[idx]['rew_area'] = int(self.rew_area[idx])
+    return self.obs, self.rewards, self.dones, infos
+
+  def step(self, actions):
+    """
+    Performs a step on all the envs.
+    :param actions: Arm motor commands. Array of shape (num_envs, 2)
+    :return: obs, rewards, dones, infos
+    """
+    self.step_async(actions)
+    return self.step_wait()
+
+  def close(self):
+    """
+    Stops the workers and releases the shared memory
+    :return:
+    """
+    if self.closed:
+      return
+    for remote in self.remotes:
+      try:
+        remote.send_bytes(_CLOSE)
+      except (BrokenPipeError, EOFError):
+        pass
+    for process in self.processes:
+      process.join()
+    for remote in self.remotes:
+      remote.close()
+    self.actions = self.obs = self.terminal_obs = self.rewards = self.dones = self.rew_area = None
+    self._buffers = None
+    self._shm.close()
+    self._shm.unlink()
+    self.closed = True
+
+  def __del__(self):
+    if not getattr(self, 'closed', True):
+      self.close()
@@ -0,0 +1,9 @@
+import numpy as np
+
+def flat_obs(obs):
+  """
+  Gives an observation as a single flat array. The observations of BilliardHardEnv are tuples of arrays
+  :param obs: Observation
+  :return: flat array
+  """
+  return np.concatenate(obs) if isinstance(obs, tuple) else np.array(obs)
@@ -0,0 +1,28 @@
+from gym_billiard.envs import BilliardEnv, BatchEvaluator
+import numpy as np
+
+def _still(obs):
+  return [0., 0.]
+
+def test_batch_evaluator_matches_env():
+  rng = np.random.RandomState(0)
+  population = rng.uniform(-1, 1, (6, 80, 2))
+  population[:, 20:] = 0
+  env = BilliardEnv(max_steps=80)
+  with BatchEvaluator('Billiard-v0', num_workers=2, max_steps=80) as evaluator:
+    outcomes = evaluator.evaluate(population)
+    ## The workers are reused by the following batches
+    assert np.array_equal(evaluator.evaluate(population[::-1]), outcomes[::-1])
+    controller_outcomes = evaluator.evaluate([_still, _still])
+  assert outcomes.shape == (6,)
+  for actions, outcome in zip(population, outcomes):
+    env.reset()
+    total_reward = 0
+    for steps, action in enumerate(actions, 1):
+      obs, reward, done, info = env.step(action)
+      total_reward += reward
+      if done:
+        break
+    assert np.array_equal(outcome['ball_pose'], obs[:2]) and outcome['steps'] == steps
+    assert outcome['reward'] == total_reward and outcome['rew_area'] == info.get('rew_area', -1)
+  assert np.all(controller_outcomes['steps'] == 80) and np.allclose(controller_outcomes['ball_pose'], [-0.5, 0.2])
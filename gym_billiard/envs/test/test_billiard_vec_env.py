@@ -0,0 +1,79 @@
+from gym_billiard.envs import BilliardEnv, BilliardVecEnv
+import numpy as np
+import pytest
+
+def test_vec_env_matches_single_env():
+  vec_env = BilliardVecEnv(num_envs=3, max_steps=50)
+  envs = [BilliardEnv(max_steps=50) for _ in range(3)]
+  vec_obs = vec_env.reset()
+  for idx, env in enumerate(envs):
+    assert np.allclose(vec_obs[idx], env.reset()), 'Wrong initial observation for table {}'.format(idx)
+
+  rng = np.random.RandomState(0)
+  for t in range(20):
+    actions = rng.uniform(-1, 1, size=(3, 2))
+    vec_obs, rewards, dones, infos = vec_env.step(actions)
+    for idx, env in enumerate(envs):
+      obs, reward, done, info = env.step(actions[idx])
+      assert np.allclose(vec_obs[idx], obs.astype(np.float32)), 'Table {} diverged at step {}'.format(idx, t)
+      assert rewards[idx] == reward and dones[idx] == done
+
+def test_vec_env_auto_reset():
+  vec_env = BilliardVecEnv(num_envs=2, max_steps=5)
+  init_obs = vec_env.reset().copy()
+  for t in range(5):
+    obs, rewards, dones, infos = vec_env.step(np.ones((2, 2)))
+  assert np.all(dones), 'Episodes not terminated at max steps'
+  assert np.allclose(obs, init_obs), 'Tables not reset after the end of the episode'
+  assert 'terminal_observation' in infos[0]
+  assert np.all(vec_env.steps == 0)
+
+  ## The infos of the ended episodes are replaced at the next step, the others are reused
+  ended = infos[0]
+  _, _, _, next_infos = vec_env.step(np.ones((2, 2)))
+  assert next_infos is infos and next_infos[0] is not ended and next_infos[0] == {}
+  info = next_infos[1]
+  assert vec_env.step(np.ones((2, 2)))[3][1] is info
+
+def test_vec_env_numpy_backend():
+  box2d_env = BilliardVecEnv(num_envs=3, seed=1, max_steps=50)
+  numpy_env = BilliardVecEnv(num_envs=3, seed=1, max_steps=50, backend='numpy')
+  assert np.allclose(box2d_env.reset(), numpy_env.reset())
+  rng = np.random.RandomState(0)
+  for t in range(50):
+    actions = rng.uniform(-1, 1, size=(3, 2))
+    box2d_obs, _, box2d_dones, _ = box2d_env.step(actions)
+    numpy_obs, _, numpy_dones, _ = numpy_env.step(actions)
+    assert np.allclose(box2d_obs, numpy_obs, atol=5e-2), 'Backends diverged at step {}'.format(t)
+    assert np.all(box2d_dones == numpy_dones)
+  with pytest.raises(AssertionError):
+    numpy_env.render()
+
+def test_render_batch():
+  env = BilliardVecEnv(num_envs=3, seed=0)
+  env.reset()
+  env.params.SHOW_ARM_IN_ARRAY = True
+  for _ in range(20):
+    env.step(env.np_random.uniform(-1, 1, (3, 2)))
+  out = np.zeros((3, 64, 48, 3), dtype=np.uint8)
+  images = env.render(size=(48, 64), out=out)
+  assert images is out
+  for k, sim in enumerate(env.sims):
+    single = env.renderers[((48, 64), False, np.dtype(np.uint8))].render(physics_eng=sim)
+    assert np.array_equal(images[k], single), 'Wrong image for table {}'.format(k)
+  assert env.render(grayscale=True).shape == (3, 300, 300)
+
+def test_shared_world_matches_box2d():
+  envs = [BilliardVecEnv(num_envs=5, seed=0, backend=backend) for backend in ('box2d', 'box2d_shared')]
+  for env in envs:
+    env.params.RANDOM_BALL_INIT_POSE = True
+    env.params.SHOW_ARM_IN_ARRAY = True
+  assert np.allclose(envs[0].reset(), envs[1].reset(), atol=1e-5)
+  rng = np.random.RandomState(0)
+  for t in range(150):
+    actions = rng.uniform(-1, 1, (5, 2))
+    obs, rewards, dones, _ = envs[0].step(actions)
+    shared_obs, shared_rewards, shared_dones, _ = envs[1].step(actions)
+    assert np.allclose(obs, shared_obs, atol=1e-3), 'Different observations at step {}'.format(t)
+    assert np.array_equal(dones, shared_dones) and np.array_equal(rewards, shared_rewards)
+  assert np.mean(envs[0].render() != envs[1].render()) < 1e-2
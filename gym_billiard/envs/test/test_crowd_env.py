@@ -0,0 +1,70 @@
+from gym_billiard.envs import BilliardCrowdEnv
+import numpy as np
+import pytest
+
+def test_crowd_env():
+  env = BilliardCrowdEnv(num_balls=40, ball_radius=.08, max_steps=100)
+  obs = env.reset()
+  assert obs.shape == (84,) and env.observation_space.shape == (84,)
+  sim = env.physics_eng
+  state = sim.balls_state()
+  for ball, (x, y, x_vel, y_vel) in zip(sim.balls, state):
+    assert np.allclose([x, y], ball.position + sim.wt_transform) and np.allclose([x_vel, y_vel], ball.linearVelocity)
+  assert np.allclose(obs[:80].reshape(40, 2), state[:, :2])
+
+  ## Send the ball closest to the upper right hole in it
+  idx = np.argmin(np.linalg.norm(state[:, :2] - sim.holes_pose[1], axis=1))
+  direction = sim.holes_pose[1] - state[idx, :2]
+  sim.balls[idx].linearVelocity = tuple(4 * direction / np.linalg.norm(direction))
+  total_reward = 0
+  for _ in range(100):
+    obs, reward, done, info = env.step([0., 0.])
+    total_reward += reward
+    if reward:
+      assert idx in info['potted']
+    if done:
+      break
+  assert env.potted[idx] and total_reward == np.sum(env.potted) and not sim.balls[idx].active
+  assert env.render('rgb_array', size=(64, 64)).shape == (64, 64, 3)
+
+  env.reset()
+  observations, rewards, dones, steps, info = env.rollout(np.zeros((10, 2)))
+  assert observations.shape == (11, 84) and steps == 10 and not np.any(env.potted)
+
+def test_crowd_env_too_many_balls():
+  with pytest.raises(ValueError):
+    BilliardCrowdEnv(num_balls=500)
+
+def test_crowd_env_randomized_radius():
+  env = BilliardCrowdEnv(num_balls=40, ball_radius=.1, seed=0)
+  env.params.RANDOM_BALL_INIT_POSE = True
+  env.params.DOMAIN_RANDOMIZATION = {'BALL_RADIUS': (.12, .13), 'HOLE_RADIUS': (.5, .6)}
+  for _ in range(3):
+    obs = env.reset()
+    radius, hole_radius = env.physical_params['BALL_RADIUS'], env.physical_params['HOLE_RADIUS']
+    poses = obs[:80].reshape(40, 2)
+    dist = np.linalg.norm(poses[:, None] - poses[None], axis=-1)
+    assert np.all(dist[np.triu_indices(40, 1)] > 2 * radius), 'Balls spawned overlapping'
+    assert np.all(np.linalg.norm(poses[:, None] - env.physics_eng.holes_pose, axis=-1) > hole_radius + radius)
+
+  ## Ranges the table cannot hold are rejected
+  env.params.DOMAIN_RANDOMIZATION = {'BALL_RADIUS': (.2, .21)}
+  with pytest.raises(ValueError):
+    env.reset()
+
+def test_crowd_env_fast_forward_after_potting():
+  env = BilliardCrowdEnv(num_balls=20, ball_radius=.08, max_steps=1000, fast_forward=True)
+  state = env.reset()[:40].reshape(20, 2)
+  sim = env.physics_eng
+  idx = np.argmin(np.linalg.norm(state - sim.holes_pose[1], axis=1))
+  direction = sim.holes_pose[1] - state[idx]
+  sim.balls[idx].linearVelocity = tuple(4 * direction / np.linalg.norm(direction))
+  sim_steps = []
+  sim_step = sim.step
+  sim.step = lambda: sim_steps.append(sim_step())
+  for _ in range(1000):
+    _, _, done, _ = env.step([0., 0.])
+    if done:
+      break
+  assert env.potted[idx] and not sim.balls[idx].active
+  assert env.steps >= 1000 and len(sim_steps) < 1000, 'The episode has not been fast forwarded'
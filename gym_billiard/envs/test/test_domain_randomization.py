@@ -0,0 +1,58 @@
+from gym_billiard.envs import BilliardEnv, BilliardVecEnv
+import numpy as np
+import pytest
+
+RANGES = {'BALL_FRICTION': (.2, .5), 'BALL_ELASTICITY': (.3, .6), 'BALL_DAMPING': (.2, .8), 'BALL_RADIUS': (.1, .12),
+          'LINK_FRICTION': (.1, .3), 'HOLE_RADIUS': (.2, .3)}
+
+def _applied(sim):
+  ball, link = sim.balls[0], sim.arm['link1']
+  return {'BALL_FRICTION': ball.fixtures[0].friction, 'BALL_ELASTICITY': ball.fixtures[0].restitution,
+          'BALL_DAMPING': ball.linearDamping, 'BALL_RADIUS': ball.fixtures[0].shape.radius,
+          'LINK_FRICTION': link.fixtures[0].friction, 'HOLE_RADIUS': sim.holes_radius[0]}
+
+def test_env_randomization():
+  env = BilliardEnv(seed=0)
+  env.params.DOMAIN_RANDOMIZATION = RANGES
+  ball = env.physics_eng.balls[0]
+  samples = []
+  for _ in range(3):
+    env.reset()
+    assert env.physics_eng.balls[0] is ball, 'The world has been rebuilt'
+    applied = _applied(env.physics_eng)
+    for name, (low, high) in RANGES.items():
+      assert low - 1e-6 <= applied[name] <= high + 1e-6 and np.isclose(applied[name], env.physical_params[name])
+    assert env.goalRadius[0] == env.physical_params['HOLE_RADIUS']
+    samples.append(env.physical_params)
+  assert samples[0] != samples[1]
+
+  ## Without ranges, the nominal values are restored
+  env.params.DOMAIN_RANDOMIZATION = {}
+  env.reset()
+  applied = _applied(env.physics_eng)
+  for name in RANGES:
+    assert np.isclose(applied[name], getattr(env.params, name))
+
+def test_vec_env_randomization():
+  env = BilliardVecEnv(num_envs=3, seed=0, max_steps=5)
+  env.params.DOMAIN_RANDOMIZATION = RANGES
+  env.reset()
+  for t in range(5):
+    _, _, dones, infos = env.step(np.zeros((3, 2)))
+    for sim, info in zip(env.sims, infos):
+      if not dones.any():
+        applied = _applied(sim)
+        assert all(np.isclose(applied[name], value) for name, value in info['physical_params'].items())
+  assert dones.all(), 'Episodes should end at max_steps'
+  for idx, info in enumerate(infos):
+    assert info['physical_params'] is not env.physical_params[idx], 'Reset tables must sample new params'
+    assert np.allclose(env.tables_goal_radius[idx], env.physical_params[idx]['HOLE_RADIUS'])
+  assert len({params['BALL_FRICTION'] for params in env.physical_params}) == 3
+  assert env.goalRadius.shape == (2,) and np.all(env.goalRadius == env.params.HOLE_RADIUS)
+  assert env.render(size=(60, 60)).shape == (3, 60, 60, 3)
+
+def test_vec_env_randomization_backend():
+  env = BilliardVecEnv(num_envs=2, seed=0, backend='numpy')
+  env.params.DOMAIN_RANDOMIZATION = RANGES
+  with pytest.raises(AssertionError):
+    env.reset()
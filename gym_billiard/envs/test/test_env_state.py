@@ -0,0 +1,47 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+from gym_billiard.envs.test.helpers import flat_obs
+import numpy as np
+
+def test_restore_state_is_exact():
+  rng = np.random.RandomState(0)
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    env = env_class(seed=1, max_steps=300)
+    env.reset()
+    for t in range(60):
+      env.step(rng.uniform(-1, 1, 2))
+    state = env.clone_state(sync=True)
+    actions = rng.uniform(-1, 1, (100, 2))
+    trajectory = [(flat_obs(env.step(action)[0]), env.steps) for action in actions]
+
+    env.restore_state(state)
+    assert np.array_equal(env.clone_state(), state), '{}: wrong restored state'.format(env_class.__name__)
+    for t, action in enumerate(actions):
+      obs = flat_obs(env.step(action)[0])
+      assert np.array_equal(obs, trajectory[t][0]), '{}: restored trajectory diverged at step {}'.format(env_class.__name__, t)
+      assert env.steps == trajectory[t][1]
+
+def test_clone_state_does_not_change_the_env():
+  rng = np.random.RandomState(0)
+  actions = rng.uniform(-1, 1, (160, 2))
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    trajectories = []
+    for clone in [False, True]:
+      env = env_class(seed=1, max_steps=300)
+      env.reset()
+      trajectory = []
+      for t, action in enumerate(actions):
+        if clone and t == 60:
+          env.clone_state()
+        trajectory.append(flat_obs(env.step(action)[0]))
+      trajectories.append(trajectory)
+    assert np.array_equal(trajectories[0], trajectories[1]), '{}: clone_state changed the episode'.format(env_class.__name__)
+
+def test_restore_hard_env_flags():
+  env = BilliardHardEnv(seed=1)
+  env.reset()
+  env.ball1_in_hole = True
+  env.steps = 42
+  state = env.clone_state()
+  env.reset()
+  env.restore_state(state)
+  assert env.ball1_in_hole and not env.ball0_in_hole and env.steps == 42
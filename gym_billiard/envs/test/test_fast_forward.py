@@ -0,0 +1,28 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+from gym_billiard.envs.test.helpers import flat_obs
+import numpy as np
+
+def _run(env, actions):
+  total_reward = 0
+  for action in actions:
+    obs, reward, done, info = env.step(action)
+    total_reward += reward
+    if done:
+      return flat_obs(obs), total_reward, info, env.steps
+
+def test_fast_forward_gives_same_outcome():
+  actions = [[0.5, 1.]] * 20 + [[0., 0.]] * 480
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    env = env_class(max_steps=500)
+    fast_env = env_class(max_steps=500, fast_forward=True)
+    env.reset()
+    fast_env.reset()
+    sim_steps = []
+    sim_step = fast_env.physics_eng.step
+    fast_env.physics_eng.step = lambda: sim_steps.append(sim_step())
+
+    obs, reward, info, steps = _run(env, actions)
+    fast_obs, fast_reward, fast_info, fast_steps = _run(fast_env, actions)
+    assert np.array_equal(obs, fast_obs), '{}: wrong final observation'.format(env_class.__name__)
+    assert reward == fast_reward and info == fast_info and steps == fast_steps
+    assert len(sim_steps) < 500, '{}: the episode has not been fast forwarded'.format(env_class.__name__)
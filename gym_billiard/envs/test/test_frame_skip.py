@@ -0,0 +1,33 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+from gym_billiard.envs.test.helpers import flat_obs
+import numpy as np
+
+def test_frame_skip_matches_repeated_steps():
+  rng = np.random.RandomState(0)
+  actions = rng.uniform(-1, 1, (20, 2))
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    env = env_class(max_steps=60)
+    skip_env = env_class(max_steps=60, frame_skip=4)
+    env.reset()
+    skip_env.reset()
+    for action in actions:
+      total_reward = 0
+      for _ in range(4):
+        obs, reward, done, info = env.step(action)
+        total_reward += reward
+        if done:
+          break
+      skip_obs, skip_reward, skip_done, skip_info = skip_env.step(action)
+      assert np.array_equal(flat_obs(obs), flat_obs(skip_obs)), '{}: wrong observation'.format(env_class.__name__)
+      assert total_reward == skip_reward and done == skip_done and env.steps == skip_env.steps
+      if done:
+        break
+    assert done, '{}: episode not terminated'.format(env_class.__name__)
+
+def test_frame_skip_stops_early():
+  env = BilliardEnv(max_steps=10, frame_skip=4)
+  env.reset()
+  for _ in range(2):
+    obs, reward, done, info = env.step([0, 0])
+  obs, reward, done, info = env.step([0, 0])
+  assert done and env.steps == 10, 'Episode not stopped at max steps'
@@ -0,0 +1,26 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling, BilliardCrowdEnv
+from gym_billiard.envs.test.helpers import flat_obs
+import numpy as np
+
+def test_obs_buffer():
+  rng = np.random.RandomState(0)
+  actions = rng.uniform(-1, 1, (30, 2))
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling, BilliardCrowdEnv]:
+    env = env_class()
+    buffer_env = env_class(obs_buffer=True)
+    buffer = buffer_env.obs_buffer
+    assert buffer.dtype == np.float32
+    assert np.array_equal(flat_obs(buffer_env.reset()), flat_obs(env.reset()).astype(np.float32))
+    for action in actions:
+      obs = env.step(action)[0]
+      buffer_obs = buffer_env.step(action)[0]
+      if isinstance(buffer_obs, tuple):
+        assert all(np.shares_memory(view, buffer) for view in buffer_obs)
+      else:
+        assert buffer_obs is buffer
+      assert np.array_equal(buffer, flat_obs(obs).astype(np.float32)), '{}: wrong observation'.format(env_class.__name__)
+
+  ## Buffer given by the caller
+  out = np.zeros(6, dtype=np.float32)
+  env = BilliardEnv(obs_buffer=out)
+  assert env.reset() is out and np.allclose(out[:2], [-0.5, 0.2])
@@ -0,0 +1,35 @@
+from gym_billiard.envs import BatchEvaluator, OutcomeCache
+import numpy as np
+
+def test_outcome_cache(tmp_path):
+  rng = np.random.RandomState(0)
+  population = rng.uniform(-1, 1, (4, 40, 2))
+  path = str(tmp_path / 'outcomes.sqlite')
+  with BatchEvaluator('Billiard-v0', num_workers=0, max_steps=40) as evaluator:
+    expected = evaluator.evaluate(population)
+
+  cache = OutcomeCache(maxsize=2, path=path)
+  with BatchEvaluator('Billiard-v0', num_workers=0, max_steps=40, cache=cache) as evaluator:
+    assert np.array_equal(evaluator.evaluate(population), expected)
+    assert cache.misses == 4 and len(cache) == 2
+    ## The outcomes evicted from the LRU are read from the database
+    assert np.array_equal(evaluator.evaluate(population), expected)
+    assert cache.hits == 4
+  cache.close()
+
+  ## A cache on the same database, as in another process, finds the outcomes without simulating
+  cache = OutcomeCache(path=path)
+  with BatchEvaluator('Billiard-v0', num_workers=0, max_steps=40, cache=cache) as evaluator:
+    assert np.array_equal(evaluator.evaluate(population[:2]), expected[:2]) and cache.hits == 2
+  ## Different env arguments give different keys
+  with BatchEvaluator('Billiard-v0', num_workers=0, max_steps=30, cache=cache) as evaluator:
+    evaluator.evaluate(population[:1])
+    assert cache.misses == 1
+  cache.close()
+
+def test_context_depends_on_versions(monkeypatch):
+  from gym_billiard.envs import outcome_cache
+  from gym_billiard.utils import parameters
+  context = outcome_cache.episode_context('Billiard-v0', parameters.Params(), {}, np.zeros(6))
+  monkeypatch.setattr(outcome_cache, 'VERSIONS', (('Box2D', '0'), ('gym_billiard', '0')))
+  assert outcome_cache.episode_context('Billiard-v0', parameters.Params(), {}, np.zeros(6)) != context
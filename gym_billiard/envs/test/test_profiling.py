@@ -0,0 +1,32 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv
+import numpy as np
+
+def test_profiling_stats():
+  env = BilliardHardEnv(frame_skip=2)
+  env.reset()
+  env.step([0.5, 0.5])
+  assert env.stats() == {} and env.physics_eng.stats() == {}
+
+  env.enable_profiling()
+  env.reset()
+  for _ in range(5):
+    env.step([0.5, 0.5])
+  env.render('rgb_array', size=(64, 64))
+  stats = env.stats()
+  assert stats['step']['calls'] == 5 and stats['world_step']['calls'] == 10
+  assert stats['reward_function']['calls'] == 10 and stats['contacts']['calls'] == 10
+  assert stats['reset']['calls'] == 1 and stats['sim_reset']['calls'] == 1 and stats['render']['calls'] == 1
+  assert stats['step']['total'] >= stats['world_step']['total'] > 0
+  assert env.physics_eng.stats() == stats
+
+  env.enable_profiling(False)
+  env.step([0.5, 0.5])
+  assert env.stats() == {}
+
+def test_profiling_rollout():
+  env = BilliardEnv()
+  env.enable_profiling()
+  env.reset()
+  env.rollout(np.zeros((7, 2)))
+  stats = env.stats()
+  assert stats['world_step']['calls'] == 7 and stats['get_obs']['calls'] == 9 and 'step' not in stats
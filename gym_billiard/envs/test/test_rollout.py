@@ -0,0 +1,29 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+from gym_billiard.envs.test.helpers import flat_obs
+import numpy as np
+
+def test_rollout_matches_step():
+  rng = np.random.RandomState(0)
+  actions = rng.uniform(-1, 1, (80, 2))
+  actions[20:] = 0
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    env = env_class(max_steps=60)
+    obs = [flat_obs(env.reset())]
+    rewards, dones = [], []
+    for action in actions:
+      ob, reward, done, info = env.step(action)
+      obs.append(flat_obs(ob))
+      rewards.append(reward)
+      dones.append(done)
+      if done:
+        break
+
+    rollout_env = env_class(max_steps=60)
+    rollout_env.reset()
+    observations, rollout_rewards, rollout_dones, end, rollout_info = rollout_env.rollout(actions)
+    assert observations.shape == (len(actions) + 1, len(obs[0]))
+    assert end == len(rewards) and rollout_info == info
+    assert np.array_equal(observations[:end + 1], np.array(obs))
+    assert np.array_equal(rollout_rewards[:end], rewards) and np.array_equal(rollout_dones[:end], dones)
+    assert np.all(observations[end + 1:] == observations[end]) and np.all(rollout_dones[end:])
+    assert np.array_equal(flat_obs(rollout_env.state), obs[-1])
@@ -0,0 +1,9 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+from gym_billiard.utils import parameters
+
+def test_solver_tier_reaches_sim():
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    for tier, (vel_iter, pos_iter) in parameters.SOLVER_TIERS.items():
+      env = env_class(solver_tier=tier)
+      assert env.physics_eng.vel_iter == vel_iter and env.physics_eng.pos_iter == pos_iter, \
+        '{}: wrong iterations for tier {}'.format(env_class.__name__, tier)
@@ -0,0 +1,45 @@
+from gym_billiard.envs import BilliardHardEnv, SubprocVecEnv
+import numpy as np
+import pytest
+
+def test_subproc_vec_env_matches_single_env():
+  vec_env = SubprocVecEnv('BilliardHard-v0', num_envs=3, num_workers=2, max_steps=30)
+  envs = [BilliardHardEnv(max_steps=30) for _ in range(3)]
+  try:
+    vec_obs = vec_env.reset()
+    assert vec_obs.shape == (3, 8)
+    for idx, env in enumerate(envs):
+      assert np.allclose(vec_obs[idx], np.concatenate(env.reset()))
+
+    rng = np.random.RandomState(0)
+    for t in range(30):
+      actions = rng.uniform(-1, 1, size=(3, 2))
+      vec_obs, rewards, dones, infos = vec_env.step(actions)
+      for idx, env in enumerate(envs):
+        obs, reward, done, info = env.step(actions[idx])
+        assert rewards[idx] == reward and dones[idx] == done
+        if done:
+          assert np.allclose(infos[idx]['terminal_observation'], np.concatenate(obs).astype(np.float32))
+        else:
+          assert np.allclose(vec_obs[idx], np.concatenate(obs).astype(np.float32)), 'Env {} diverged at step {}'.format(idx, t)
+    assert np.all(dones), 'Episodes not terminated at max steps'
+  finally:
+    vec_env.close()
+
+def test_worker_survives_env_error(monkeypatch):
+  from gym_billiard.envs import BilliardEnv
+  step = BilliardEnv.step
+  def failing_step(self, action):
+    if action[0] > 5:
+      raise ValueError('Ball out of map')
+    return step(self, action)
+  ## The workers are forked, so they get the patched step
+  monkeypatch.setattr(BilliardEnv, 'step', failing_step)
+  vec_env = SubprocVecEnv('Billiard-v0', num_envs=2, num_workers=1, start_method='fork')
+  vec_env.reset()
+  with pytest.raises(RuntimeError, match='Ball out of map'):
+    vec_env.step(np.array([[10., 0.], [0., 0.]]))
+  obs = vec_env.reset()
+  obs, _, _, _ = vec_env.step(np.zeros((2, 2)))
+  assert obs.shape == (2, 6)
+  vec_env.close()
@@ -0,0 +1,649 @@
+import numpy as np
+from gym_billiard.utils import parameters, physics
+
+## Box2D constants. They are used so that the integration follows the one of PhysicsSim as close as possible
+POLYGON_RADIUS = 0.01 # b2_polygonRadius: skin around polygons
+LINEAR_SLOP = 0.005 # b2_linearSlop: allowed penetration
+BAUMGARTE = 0.2 # b2_baumgarte: fraction of the penetration resolved at every position iteration
+MAX_LINEAR_CORRECTION = 0.2 # b2_maxLinearCorrection
+VELOCITY_THRESHOLD = 1. # b2_velocityThreshold: collisions slower than this are inelastic
+LINEAR_SLEEP_TOLERANCE = 0.01 # b2_linearSleepTolerance
+ANGULAR_SLEEP_TOLERANCE = 2. / 180. * np.pi # b2_angularSleepTolerance
+TIME_TO_SLEEP = .5 # b2_timeToSleep
+TOI_BAUMGARTE = .75 # b2_toiBaugarte
+TOI_POSITION_ITERATIONS = 20 # Position iterations used by Box2D to solve a time of impact
+## The walls are created without setting their fixture properties, so they have Box2D default ones
+WALL_RESTITUTION = 0.
+WALL_FRICTION = .2
+
+## Balls damping and densities, as set in PhysicsSim._create_balls and PhysicsSim._create_robotarm
+BALL_DAMPING = 1.
+BALL_DENSITY = .5
+LINKS_DENSITY = np.array([5., 1.])
+## Joint limits, as set in PhysicsSim._create_robotarm
+JOINTS_LOWER = np.array([-.4 * np.pi, -.9 * np.pi])
+JOINTS_UPPER = np.array([.4 * np.pi, .9 * np.pi])
+## Number of Gauss-Seidel passes over the contacts. A ball touches at most a couple of objects, so few are enough
+CONTACT_ITERATIONS = 4
+
+
+class _BallView(object):
+  """
+  Gives access to the state of a ball with the same attributes of a Box2D body.
+  Values are arrays with a leading table dimension, unless the sim has a single table.
+  """
+  def __init__(self, sim, idx):
+    self._sim = sim
+    self._idx = idx
+
+  @property
+  def position(self):
+    return self._sim._select(self._sim.ball_pos[:, self._idx])
+
+  @position.setter
+  def position(self, value):
+    self._sim.ball_pos[:, self._idx] = value
+
+  @property
+  def linearVelocity(self):
+    return self._sim._select(self._sim.ball_vel[:, self._idx])
+
+  @linearVelocity.setter
+  def linearVelocity(self, value):
+    self._sim.ball_vel[:, self._idx] = value
+    self._sim.ball_sleep_time[:, self._idx] = 0
+
+  @property
+  def angularVelocity(self):
+    return self._sim._select(self._sim.ball_ang_vel[:, self._idx])
+
+  @angularVelocity.setter
+  def angularVelocity(self, value):
+    self._sim.ball_ang_vel[:, self._idx] = value
+    self._sim.ball_sleep_time[:, self._idx] = 0
+
+
+class _LinkView(object):
+  """
+  Gives access to the state of an arm link with the same attributes of a Box2D body.
+  """
+  def __init__(self, sim, idx):
+    self._sim = sim
+    self._idx = idx
+
+  @property
+  def position(self):
+    centers, _, _, _ = self._sim._links_pose()
+    return self._sim._select(centers[:, self._idx])
+
+  @property
+  def angle(self):
+    return self._sim._select(self._sim.link_angle[:, self._idx])
+
+  @property
+  def angularVelocity(self):
+    speed = self._sim.joint_speed[:, 0] if self._idx == 0 else self._sim.joint_speed.sum(axis=1)
+    return self._sim._select(speed)
+
+
+class _JointView(object):
+  """
+  Gives access to the state of an arm joint with the same attributes of a Box2D revolute joint.
+  """
+  def __init__(self, sim, idx):
+    self._sim = sim
+    self._idx = idx
+
+  @property
+  def angle(self):
+    return self._sim._select(self._sim._joints_angle()[:, self._idx] - self._sim.joint_ref[:, self._idx])
+
+  @property
+  def speed(self):
+    return self._sim._select(self._sim.joint_speed[:, self._idx])
+
+  @property
+  def motorSpeed(self):
+    return self._sim._select(self._sim.motor_speed[:, self._idx])
+
+  @motorSpeed.setter
+  def motorSpeed(self, value):
+    self._sim.motor_speed[:, self._idx] = value
+
+
+class NumpyPhysicsSim(object):
+  """
+  Batched physics simulator written in NumPy. It integrates num_tables independent tables at once.
+  It exposes the same interface of PhysicsSim (reset, move_joint, step, balls, arm), and follows the same reference
+  frames, so that it can be used in place of it for the tables with few balls (Billiard-v0 and Curling-v0).
+
+  The state of all the tables is kept in arrays with a leading table dimension:
+  ball_pos, ball_vel -> (num_tables, num_balls, 2) in world RF
+  ball_ang_vel -> (num_tables, num_balls)
+  link_angle -> (num_tables, 2) absolute angle of link0 and link1
+  motor_speed, joint_speed -> (num_tables, 2)
+  The views in balls and arm return these values for all the tables, or for the only table if num_tables is 1.
+
+  The model follows the one of Box2D for this scene:
+  - the joint motors are strong enough to always reach the commanded speed, so the arm is kinematic and stops only
+    at the joint limits;
+  - balls are damped as in Box2D, and bounce on walls, links and other balls with the same mixed restitution and
+    friction, the same restitution threshold and the same skin and position correction of the Box2D solver.
+  - balls hit by the arm are solved with the time of impact of Box2D, where the link acts as a free body.
+  Not modelled: collisions of the links with the walls, the arm being slowed down by the balls, and the displacement
+  of the arm caused by the time of impact. In these cases the trajectories diverge from the Box2D ones.
+
+  Tolerance against PhysicsSim with the default Params (checked in test_numpy_physics.py):
+  - joint angles and speeds: within 5e-3 rad for the whole episode;
+  - ball bouncing on the walls: within 1e-2 over 300 steps;
+  - ball hit by the arm: within 5e-2 over 300 steps, as long as the ball is not pushed against a wall.
+  """
+  def __init__(self, num_tables=1, balls_pose=[[0, 0]], arm_position=None, params=None):
+    """
+    Constructor
+    :param num_tables: Number of tables simulated in parallel
+    :param balls_pose: Initial ball poses. Is a list of the ball poses [ball0, ball1, ...] shared by all the tables
+    :param arm_position: Initial arm position
+    :param params: Parameters
+    """
+    if params is None:
+      self.params = parameters.Params()
+    else:
+      self.params = params
+
+    self.num_tables = num_tables
+    self.num_balls = len(balls_pose)
+    self.dt = self.params.TIME_STEP
+    self.pos_iter = self.params.POS_ITER
+
+    self._create_table()
+    self._create_holes()
+
+    ## State arrays
+    self.ball_pos = np.zeros((num_tables, self.num_balls, 2))
+    self.ball_vel = np.zeros((num_tables, self.num_balls, 2))
+    self.ball_ang_vel = np.zeros((num_tables, self.num_balls))
+    self.ball_sleep_time = np.zeros((num_tables, self.num_balls))
+    self.link_angle = np.zeros((num_tables, 2))
+    self.joint_ref = np.zeros((num_tables, 2))
+    self.motor_speed = np.zeros((num_tables, 2))
+    self.joint_speed = np.zeros((num_tables, 2))
+
+    ## Views with the same interface of PhysicsSim
+    self.balls = [_BallView(self, idx) for idx in range(self.num_balls)]
+    self.arm = {'link0': _LinkView(self, 0), 'link1': _LinkView(self, 1),
+                'jointW0': _JointView(self, 0), 'joint01': _JointView(self, 1)}
+    self._joints_idx = {'jointW0': 0, 'joint01': 1}
+
+    self.reset(balls_pose, arm_position)
+
+  def _create_table(self):
+    """
+    Defines the walls of the table as half planes: a point p is inside the table if n.p >= d for all the walls
+    :return:
+    """
+    ## Walls in world RF: left, upper, right, bottom
+    self.walls_normal = np.array([[1., 0.], [0., -1.], [-1., 0.], [0., 1.]])
+    self.walls_offset = np.array([self.params.WALL_THICKNESS / 2,
+                                  -(self.params.TABLE_SIZE[1] - self.params.WALL_THICKNESS / 2),
+                                  -(self.params.TABLE_SIZE[0] - self.params.WALL_THICKNESS / 2),
+                                  self.params.WALL_THICKNESS / 2])
+
+    ## world RF -> table RF
+    self.wt_transform = -self.params.TABLE_CENTER
+    ## table RF -> world RF
+    self.tw_transform = self.params.TABLE_CENTER
+    ## Position of jointW0 in world RF
+    self.arm_base = np.array([self.params.TABLE_CENTER[0], 0.])
+
+    ## Restitution and friction of the contacts of the balls with walls and links, mixed as Box2D does
+    wall_restitution = max(self.params.BALL_ELASTICITY, WALL_RESTITUTION)
+    wall_friction = np.sqrt(self.params.BALL_FRICTION * WALL_FRICTION)
+    link_restitution = max(self.params.BALL_ELASTICITY, self.params.LINK_ELASTICITY)
+    link_friction = np.sqrt(self.params.BALL_FRICTION * self.params.LINK_FRICTION)
+    self.restitution = np.array([wall_restitution] * 4 + [link_restitution] * 2)
+    self.friction = np.array([wall_friction] * 4 + [link_friction] * 2)
+
+    ## Masses, with the densities used in PhysicsSim
+    self.ball_mass = BALL_DENSITY * np.pi * self.params.BALL_RADIUS ** 2
+    links_size = np.array([[2 * self.params.LINK_THICKNESS, self.params.LINK_0_LENGTH],
+                           [2 * self.params.LINK_THICKNESS, self.params.LINK_1_LENGTH]])
+    self.links_mass = LINKS_DENSITY * links_size[:, 0] * links_size[:, 1]
+    self.links_inertia = self.links_mass * np.sum(links_size ** 2, axis=1) / 12.
+
+  def _create_holes(self):
+    """
+    Defines the holes in table RF. This ones are not simulated, but just defined as a list of dicts.
+    :return:
+    """
+    # Holes in simulation. Represented as list of dicts. Same as PhysicsSim._create_holes
+    self.holes = [{'pose': pose, 'radius': self.params.HOLE_RADIUS} for pose in physics.holes_pose(self.params)]
+    self.holes_pose = np.array([hole['pose'] for hole in self.holes])
+    self.holes_radius = np.array([hole['radius'] for hole in self.holes])
+
+  def _select(self, value):
+    """
+    Returns the value of the only table if there is a single one, so that the views behave like Box2D bodies.
+    :param value: Array with leading table dimension
+    :return:
+    """
+    if self.num_tables == 1:
+      return value[0]
+    return value
+
+  def _joints_angle(self):
+    """
+    Computes the joints angles from the links angles. jointW0 is the angle of link0, joint01 the one of link1 wrt link0.
+    :return: joints angles. Shape (num_tables, 2)
+    """
+    return np.stack([self.link_angle[:, 0], self.link_angle[:, 1] - self.link_angle[:, 0]], axis=1)
+
+  def joints_state(self, out=None):
+    """
+    Reads angle and speed of the joints of all the tables, as physics.MultiTableSim.joints_state
+    :param out: Array of shape (num_tables, 4) to fill. If None, a new one is allocated
+    :return: Array of shape (num_tables, 4), composed as [joint0_angle, joint1_angle, joint0_speed, joint1_speed]
+    """
+    if out is None:
+      out = np.empty((self.num_tables, 4))
+    out[:, :2] = self._joints_angle() - self.joint_ref
+    out[:, 2:] = self.joint_speed
+    return out
+
+  def _links_pose(self, link_angle=None):
+    """
+    Computes the links poses from the links angles
+    :param link_angle: Links angles (n, 2). If None the current ones are used
+    :return: links centers (n, 2, 2), joint01 center (n, 2), cos and sin of the links angles (n, 2)
+    """
+    if link_angle is None:
+      link_angle = self.link_angle
+    cos = np.cos(link_angle)
+    sin = np.sin(link_angle)
+    ## The links are vertical when their angle is zero
+    link0_dir = np.stack([-sin[:, 0], cos[:, 0]], axis=1)
+    link1_dir = np.stack([-sin[:, 1], cos[:, 1]], axis=1)
+    joint01 = self.arm_base + link0_dir * self.params.LINK_0_LENGTH
+    centers = np.stack([self.arm_base + link0_dir * self.params.LINK_0_LENGTH / 2,
+                        joint01 + link1_dir * (self.params.LINK_1_LENGTH / 2 - .1)], axis=1)
+    return centers, joint01, cos, sin
+
+  def reset(self, balls_pose, arm_position, tables=None):
+    """
+    Reset the tables to the given arm and balls poses
+    :param balls_pose: Balls poses in table RF. Either shared by all the tables (num_balls, 2) or one per table (n, num_balls, 2)
+    :param arm_position: Joints angles. Either None, shared by all the tables (2,) or one per table (n, 2)
+    :param tables: Indexes of the tables to reset. If None all the tables are reset
+    :return:
+    """
+    if tables is None:
+      tables = slice(None)
+    balls_pose = np.asarray(balls_pose, dtype=np.float64)
+    assert balls_pose.shape[-2:] == (self.num_balls, 2), 'Wrong balls poses shape: {}'.format(balls_pose.shape)
+
+    self.ball_pos[tables] = balls_pose + self.tw_transform
+    self.ball_vel[tables] = 0
+    self.ball_ang_vel[tables] = 0
+    self.ball_sleep_time[tables] = 0
+
+    if arm_position is None:
+      arm_position = np.zeros(2)
+    arm_position = np.asarray(arm_position, dtype=np.float64)
+    ## The angle of link1 is absolute, as in PhysicsSim._calculate_arm_pose
+    self.link_angle[tables] = arm_position
+    ## The joints measure their angles from the initial pose, as Box2D joints do with their reference angle
+    self.joint_ref[tables] = np.stack([arm_position[..., 0], arm_position[..., 1] - arm_position[..., 0]], axis=-1)
+    self.motor_speed[tables] = 0
+    self.joint_speed[tables] = 0
+
+  def move_joint(self, joint, value):
+    """
+    Move the given joint of the given value
+    :param joint: Joint to move
+    :param value: Speed or torque to add to the joint. Either a scalar or one value per table
+    :return:
+    """
+    idx = self._joints_idx[joint]
+    if self.params.TORQUE_CONTROL:
+      speed = self.motor_speed[:, idx] + value * self.dt
+    else:
+      speed = value
+
+    # Limit max joint speed
+    self.motor_speed[:, idx] = np.clip(speed, -1, 1)
+
+
+  def _obstacles_contact(self, pos, centers, cos, sin):
+    """
+    Computes separation, normal and contact point of the balls wrt the obstacles: the 4 walls and the 2 links.
+    The separation is the distance between the surfaces, skin included. The normal points from the obstacle to the ball.
+    :param pos: Balls positions (n, num_balls, 2)
+    :param centers: Links centers (n, 2, 2)
+    :param cos: cos of the links angles (n, 2)
+    :param sin: sin of the links angles (n, 2)
+    :return: separation (6, n, num_balls), normal (6, n, num_balls, 2), point (6, n, num_balls, 2)
+    The contact point is halfway between the surfaces, as in Box2D.
+    """
+    radius = self.params.BALL_RADIUS + POLYGON_RADIUS
+    separations, normals, points = [], [], []
+
+    ## Walls
+    for normal, offset in zip(self.walls_normal, self.walls_offset):
+      distance = pos @ normal - offset
+      separations.append(distance - radius)
+      normals.append(np.broadcast_to(normal, pos.shape))
+
+    ## Links
+    half_width = self.params.LINK_THICKNESS
+    for idx, half_length in enumerate([self.params.LINK_0_LENGTH / 2, self.params.LINK_1_LENGTH / 2]):
+      c = cos[:, idx, None]
+      s = sin[:, idx, None]
+      d = pos - centers[:, None, idx]
+      ## Ball center in link RF
+      lx = c * d[..., 0] + s * d[..., 1]
+      ly = -s * d[..., 0] + c * d[..., 1]
+      qx = np.clip(lx, -half_width, half_width)
+      qy = np.clip(ly, -half_length, half_length)
+      dx = lx - qx
+      dy = ly - qy
+      dist = np.sqrt(dx * dx + dy * dy)
+      outside = dist > 1e-12
+      safe_dist = np.where(outside, dist, 1.)
+
+      ## If the center is inside the link, the normal is the one of the closest face
+      pen_x = half_width - np.abs(lx)
+      pen_y = half_length - np.abs(ly)
+      x_face = pen_x < pen_y
+      sign_x = np.where(lx >= 0, 1., -1.)
+      sign_y = np.where(ly >= 0, 1., -1.)
+      nx = np.where(outside, dx / safe_dist, np.where(x_face, sign_x, 0.))
+      ny = np.where(outside, dy / safe_dist, np.where(x_face, 0., sign_y))
+
+      ## Back to world RF
+      separations.append(np.where(outside, dist, -np.minimum(pen_x, pen_y)) - radius)
+      normals.append(np.stack([c * nx - s * ny, s * nx + c * ny], axis=-1))
+    separations = np.stack(separations)
+    normals = np.stack(normals)
+    points = pos - (self.params.BALL_RADIUS + separations / 2.)[..., None] * normals
+    return separations, normals, points
+
+  def _obstacles_velocity(self, point, joint01, links_ang_vel):
+    """
+    Computes the velocity of the obstacles at the contact points. Walls are static, links rotate around their joints.
+    :param point: Contact points (6, n, 2)
+    :param joint01: joint01 center (n, 2)
+    :param links_ang_vel: Angular velocity of the links (n, 2)
+    :return: velocities (6, n, 2)
+    """
+    velocity = np.zeros(point.shape)
+    arm0 = point[4] - self.arm_base
+    velocity[4] = links_ang_vel[:, 0, None] * np.stack([-arm0[:, 1], arm0[:, 0]], axis=-1)
+    arm0 = joint01 - self.arm_base
+    arm1 = point[5] - joint01
+    velocity[5] = links_ang_vel[:, 0, None] * np.stack([-arm0[:, 1], arm0[:, 0]], axis=-1) + \
+                  links_ang_vel[:, 1, None] * np.stack([-arm1[:, 1], arm1[:, 0]], axis=-1)
+    return velocity
+
+  def _ball_pair_contact(self, pos, i, j):
+    """
+    Computes separation and normal between two balls. The normal points from ball j to ball i.
+    :param pos: Balls positions (num_tables, num_balls, 2)
+    :param i: first ball
+    :param j: second ball
+    :return: separation, normal
+    """
+    d = pos[:, i] - pos[:, j]
+    dist = np.sqrt(np.sum(d * d, axis=-1))
+    normal = d / np.maximum(dist, 1e-12)[:, None]
+    return dist - 2 * self.params.BALL_RADIUS, normal
+
+  def _solve_contacts(self, v, w, active, separation, normal, obj_vel, restitution, friction, obj_mass=None):
+    """
+    Solves the velocity constraints between a ball and the obstacles it touches.
+    Impulses are accumulated and clamped as in the Box2D sequential impulses solver.
+    :param v: Ball velocity (n, 2). Modified in place
+    :param w: Ball angular velocity (n,). Modified in place
+    :param active: Contacts mask (k, n)
+    :param separation: Contacts separations (k, n)
+    :param normal: Contacts normals (k, n, 2)
+    :param obj_vel: Obstacles velocities at the contact points (k, n, 2)
+    :param restitution: Contacts restitution, broadcastable to (k, n)
+    :param friction: Contacts friction, broadcastable to (k, n)
+    :param obj_mass: If None the obstacles are static or kinematic. Otherwise they are free bodies, described by
+    (inverse mass (k, n), inverse inertia (k, n), contact point wrt the obstacle center (k, n, 2)), scaled by the ball mass
+    :return:
+    """
+    r = self.params.BALL_RADIUS
+    ## Box2D puts the contact point halfway between the surfaces. This is its distance from the ball center
+    lever = r + separation / 2.
+    tangent = np.stack([-normal[..., 1], normal[..., 0]], axis=-1)
+    ## Effective masses, per unit mass of the ball. The inertia of a disc is m r^2 / 2
+    normal_mass = np.ones(active.shape)
+    tangent_mass = 1. + 2. * lever * lever / (r * r)
+    if obj_mass is not None:
+      obj_vel = obj_vel.copy()
+      inv_mass, inv_inertia, obj_arm = obj_mass
+      arm_n = obj_arm[..., 0] * normal[..., 1] - obj_arm[..., 1] * normal[..., 0]
+      arm_t = obj_arm[..., 0] * tangent[..., 1] - obj_arm[..., 1] * tangent[..., 0]
+      normal_mass = normal_mass + inv_mass + inv_inertia * arm_n * arm_n
+      tangent_mass = tangent_mass + inv_mass + inv_inertia * arm_t * arm_t
+      obj_perp = np.stack([-obj_arm[..., 1], obj_arm[..., 0]], axis=-1)
+    ## Restitution is applied only to collisions faster than the threshold
+    vn = np.sum((v - obj_vel) * normal, axis=-1)
+    bias = np.where(vn < -VELOCITY_THRESHOLD, -restitution * vn, 0.)
+    friction = np.broadcast_to(friction, active.shape)
+    normal_impulse = np.zeros(active.shape)
+    tangent_impulse = np.zeros(active.shape)
+    obstacles = [k for k in range(len(active)) if np.any(active[k])]
+
+    for _ in range(CONTACT_ITERATIONS):
+      for k in obstacles:
+        ## Friction. Impulses are per unit mass of the ball
+        vt = np.sum((v - obj_vel[k]) * tangent[k], axis=-1) - w * lever[k]
+        max_friction = friction[k] * normal_impulse[k]
+        new_impulse = np.where(active[k], np.clip(tangent_impulse[k] - vt / tangent_mass[k], -max_friction, max_friction), 0.)
+        impulse = new_impulse - tangent_impulse[k]
+        tangent_impulse[k] = new_impulse
+        v += impulse[:, None] * tangent[k]
+        w -= 2. * impulse * lever[k] / (r * r)
+        if obj_mass is not None:
+          obj_vel[k] -= impulse[:, None] * (inv_mass[k, :, None] * tangent[k] + (inv_inertia[k] * arm_t[k])[:, None] * obj_perp[k])
+
+        ## Normal
+        vn = np.sum((v - obj_vel[k]) * normal[k], axis=-1)
+        new_impulse = np.where(active[k], np.maximum(normal_impulse[k] + (bias[k] - vn) / normal_mass[k], 0.), 0.)
+        impulse = new_impulse - normal_impulse[k]
+        normal_impulse[k] = new_impulse
+        v += impulse[:, None] * normal[k]
+        if obj_mass is not None:
+          obj_vel[k] -= impulse[:, None] * (inv_mass[k, :, None] * normal[k] + (inv_inertia[k] * arm_n[k])[:, None] * obj_perp[k])
+
+  def _solve_pair_contact(self, i, j, active, separation, normal):
+    """
+    Solves the velocity constraint between two balls
+    :param i: first ball
+    :param j: second ball
+    :param active: Contact mask (num_tables,)
+    :param separation: Contact separation (num_tables,)
+    :param normal: Contact normal (num_tables, 2)
+    :return:
+    """
+    r = self.params.BALL_RADIUS
+    lever = r + separation / 2.
+    tangent_mass = 2. + 4. * lever * lever / (r * r)
+    vi, vj = self.ball_vel[:, i], self.ball_vel[:, j]
+    wi, wj = self.ball_ang_vel[:, i], self.ball_ang_vel[:, j]
+    tangent = np.stack([-normal[:, 1], normal[:, 0]], axis=-1)
+    vn = np.sum((vi - vj) * normal, axis=-1)
+    bias = np.where(vn < -VELOCITY_THRESHOLD, -self.params.BALL_ELASTICITY * vn, 0.)
+    normal_impulse = np.zeros(self.num_tables)
+    tangent_impulse = np.zeros(self.num_tables)
+
+    for _ in range(CONTACT_ITERATIONS):
+      ## Friction. Both balls have the same mass
+      vt = np.sum((vi - vj) * tangent, axis=-1) - (wi + wj) * lever
+      max_friction = self.params.BALL_FRICTION * normal_impulse
+      new_impulse = np.where(active, np.clip(tangent_impulse - vt / tangent_mass, -max_friction, max_friction), 0.)
+      impulse = new_impulse - tangent_impulse
+      tangent_impulse = new_impulse
+      vi += impulse[:, None] * tangent
+      vj -= impulse[:, None] * tangent
+      wi -= 2. * impulse * lever / (r * r)
+      wj -= 2. * impulse * lever / (r * r)
+
+      ## Normal
+      vn = np.sum((vi - vj) * normal, axis=-1)
+      new_impulse = np.where(active, np.maximum(normal_impulse + (bias - vn) / 2., 0.), 0.)
+      impulse = new_impulse - normal_impulse
+      normal_impulse = new_impulse
+      vi += impulse[:, None] * normal
+      vj -= impulse[:, None] * normal
+
+  def step(self):
+    """
+    Performs a simulator step on all the tables
+    :return:
+    """
+    dt = self.dt
+    start_pos = self.ball_pos.copy()
+    start_angle = self.link_angle.copy()
+
+    ## Contacts are found with the poses at the beginning of the step, as Box2D does
+    centers, joint01, cos, sin = self._links_pose()
+    separation, normal, point = self._obstacles_contact(start_pos, centers, cos, sin)
+    active = separation < 0
+    pairs = [(i, j) for i in range(self.num_balls) for j in range(i + 1, self.num_balls)]
+    pair_contacts = [self._ball_pair_contact(start_pos, i, j) for i, j in pairs]
+
+    ## Arm. The motors always reach the commanded speed, unless the joint is at its limit and pushing against it
+    joints_angle = self._joints_angle()
+    speed = self.motor_speed.copy()
+    speed[(joints_angle <= JOINTS_LOWER) & (speed < 0)] = 0
+    speed[(joints_angle >= JOINTS_UPPER) & (speed > 0)] = 0
+    self.joint_speed = speed
+    links_ang_vel = np.stack([speed[:, 0], speed[:, 0] + speed[:, 1]], axis=1)
+
+    ## Balls damping
+    damping = min(max(1. - dt * BALL_DAMPING, 0.), 1.)
+    self.ball_vel *= damping
+    self.ball_ang_vel *= damping
+
+    ## Velocity solver
+    for ball in range(self.num_balls):
+      if np.any(active[:, :, ball]):
+        obj_vel = self._obstacles_velocity(point[:, :, ball], joint01, links_ang_vel)
+        self._solve_contacts(self.ball_vel[:, ball], self.ball_ang_vel[:, ball], active[:, :, ball],
+                             separation[:, :, ball], normal[:, :, ball], obj_vel, self.restitution[:, None], self.friction[:, None])
+    for (i, j), (pair_separation, pair_normal) in zip(pairs, pair_contacts):
+      if np.any(pair_separation < 0):
+        self._solve_pair_contact(i, j, pair_separation < 0, pair_separation, pair_normal)
+
+    ## Integrate positions
+    self.ball_pos += dt * self.ball_vel
+    self.link_angle += dt * links_ang_vel
+
+    ## Position solver. Only the contacts found at the beginning of the step are corrected
+    self._solve_positions(active, pairs, [pair_separation < 0 for pair_separation, _ in pair_contacts])
+
+    ## Sleeping balls are stopped
+    still = (np.sum(self.ball_vel * self.ball_vel, axis=-1) < LINEAR_SLEEP_TOLERANCE ** 2) & \
+            (np.abs(self.ball_ang_vel) < ANGULAR_SLEEP_TOLERANCE)
+    self.ball_sleep_time = np.where(still, self.ball_sleep_time + dt, 0.)
+    asleep = self.ball_sleep_time >= TIME_TO_SLEEP
+    self.ball_vel[asleep] = 0
+    self.ball_ang_vel[asleep] = 0
+
+    ## Continuous collision, as the balls are bullets
+    self._solve_toi(start_pos, start_angle, separation, links_ang_vel)
+
+  def _solve_positions(self, active, pairs, pairs_active):
+    """
+    Pushes the balls out of the obstacles they penetrate, as the Box2D position solver does
+    :param active: Obstacles contacts found at the beginning of the step (6, num_tables, num_balls)
+    :param pairs: Balls pairs
+    :param pairs_active: Balls pairs contacts found at the beginning of the step
+    :return:
+    """
+    if not (np.any(active) or any(np.any(pair_active) for pair_active in pairs_active)):
+      return
+
+    centers, _, cos, sin = self._links_pose()
+    for _ in range(self.pos_iter):
+      separation, normal, _ = self._obstacles_contact(self.ball_pos, centers, cos, sin)
+      separation = np.where(active, separation, 0.)
+      min_separation = np.min(separation)
+      correction = np.clip(BAUMGARTE * (separation + LINEAR_SLOP), -MAX_LINEAR_CORRECTION, 0.)
+      self.ball_pos -= np.sum(correction[..., None] * normal, axis=0)
+      for pair_active, (i, j) in zip(pairs_active, pairs):
+        pair_separation, pair_normal = self._ball_pair_contact(self.ball_pos, i, j)
+        pair_separation = np.where(pair_active, pair_separation, 0.)
+        min_separation = min(min_separation, np.min(pair_separation))
+        correction = np.clip(BAUMGARTE * (pair_separation + LINEAR_SLOP), -MAX_LINEAR_CORRECTION, 0.)
+        self.ball_pos[:, i] -= correction[:, None] * pair_normal / 2.
+        self.ball_pos[:, j] += correction[:, None] * pair_normal / 2.
+      if min_separation >= -3. * LINEAR_SLOP:
+        break
+
+  def _solve_toi(self, start_pos, start_angle, start_separation, links_ang_vel):
+    """
+    Emulates the Box2D continuous collision of bullets against walls and links.
+    If during the step a ball got closer to an obstacle than the TOI target, the ball is moved back to the time of
+    impact, the collision is solved and the ball is moved for the rest of the step with the new velocity.
+    Only the first impact of each ball is handled, and collisions between balls are not considered.
+    :param start_pos: Balls positions at the beginning of the step
+    :param start_angle: Links angles at the beginning of the step
+    :param start_separation: Separations from the obstacles at the beginning of the step
+    :param links_ang_vel: Angular velocity of the links
+    :return:
+    """
+    target = -3. * LINEAR_SLOP
+    tolerance = .25 * LINEAR_SLOP
+    centers, _, cos, sin = self._links_pose()
+    end_separation, _, _ = self._obstacles_contact(self.ball_pos, centers, cos, sin)
+    crossing = (start_separation >= target + tolerance) & (end_separation < target)
+    if not np.any(crossing):
+      return
+
+    ## Time of impact as fraction of the step
+    alpha = np.where(crossing, (start_separation - target) / np.where(crossing, start_separation - end_separation, 1.), np.inf)
+    obstacle = np.argmin(alpha, axis=0)
+    alpha = np.min(alpha, axis=0)
+    for ball in range(self.num_balls):
+      tables = np.flatnonzero(np.isfinite(alpha[:, ball]))
+      if len(tables) == 0:
+        continue
+      a = alpha[tables, ball, None]
+      k = obstacle[tables, ball]
+      rows = np.arange(len(tables))
+
+      ## Move ball and links back to the time of impact
+      pos = start_pos[tables, ball] + a * (self.ball_pos[tables, ball] - start_pos[tables, ball])
+      angle = start_angle[tables] + a * (self.link_angle[tables] - start_angle[tables])
+      centers, joint01, cos, sin = self._links_pose(angle)
+
+      ## TOI position solver
+      for _ in range(TOI_POSITION_ITERATIONS):
+        separation, normal, _ = self._obstacles_contact(pos[:, None], centers, cos, sin)
+        separation, normal = separation[k, rows, 0], normal[k, rows, 0]
+        correction = np.clip(TOI_BAUMGARTE * (separation + LINEAR_SLOP), -MAX_LINEAR_CORRECTION, 0.)
+        pos -= correction[:, None] * normal
+        if np.min(separation) >= -1.5 * LINEAR_SLOP:
+          break
+
+      ## Collision. The TOI sub-step in Box2D does not include the joints, so the links collide as free bodies
+      separation, normal, point = self._obstacles_contact(pos[:, None], centers, cos, sin)
+      obj_vel = self._obstacles_velocity(point[:, :, 0], joint01, links_ang_vel[tables])
+      is_link = k >= 4
+      link = np.where(is_link, k - 4, 0)
+      obj_arm = point[k, rows, 0] - centers[rows, link]
+      inv_mass = np.where(is_link, self.ball_mass / self.links_mass[link], 0.)
+      inv_inertia = np.where(is_link, self.ball_mass / self.links_inertia[link], 0.)
+      v = self.ball_vel[tables, ball]
+      w = self.ball_ang_vel[tables, ball]
+      self._solve_contacts(v, w, np.ones((1, len(tables)), dtype=bool), separation[k, rows, 0][None],
+                           normal[k, rows, 0][None], obj_vel[k, rows][None],
+                           self.restitution[k][None], self.friction[k][None],
+                           obj_mass=(inv_mass[None], inv_inertia[None], obj_arm[None]))
+      self.ball_vel[tables, ball] = v
+      self.ball_ang_vel[tables, ball] = w
+      self.ball_pos[tables, ball] = pos + (1. - a) * self.dt * v
@@ -1,4 +1,32 @@
 import numpy as np
+
+## Solver fidelity tiers: (VEL_ITER, POS_ITER) of the Box2D solver.
+# fast: close to the Box2D defaults. Cheap, good enough for training
+# default: the values the envs have always used
+# reference: used to measure the accuracy of the other tiers
+SOLVER_TIERS = {'fast': (8, 3),
+                'default': (100, 100),
+                'reference': (500, 500)}
+
+## Physical parameters that can be randomized at every episode, through Params.DOMAIN_RANDOMIZATION.
+# They are applied in place to the bodies of the simulation, see PhysicsSim.set_physical_params
+RANDOMIZABLE_PARAMS = ('BALL_FRICTION', 'BALL_ELASTICITY', 'BALL_DAMPING', 'BALL_RADIUS', 'LINK_FRICTION', 'HOLE_RADIUS')
+
+
+def sample_physical_params(ranges, np_random):
+  """
+  Samples the physical parameters of an episode, uniformly in the given ranges
+  :param ranges: dict {param name: (low, high)}, with names in RANDOMIZABLE_PARAMS
+  :param np_random: Random generator
+  :return: dict {param name: value}
+  """
+  values = {}
+  for name in sorted(ranges):
+    assert name in RANDOMIZABLE_PARAMS, 'Param {} cannot be randomized. Available: {}'.format(name, RANDOMIZABLE_PARAMS)
+    low, high = ranges[name]
+    values[name] = float(np_random.uniform(low=low, high=high))
+  return values
+
 # Params class
 class Params(object):
   """
@@ -23,13 +51,15 @@ class Params(object):
     self.BALL_RADIUS = .15
     self.BALL_ELASTICITY = .7
     self.BALL_FRICTION = .9
+    self.BALL_DAMPING = 1. # Both linear and angular
 
     self.WALL_THICKNESS = .1
     self.WALL_ELASTICITY = .95
     self.WALL_FRICTION = .9
 
-    self.VEL_ITER = 100
-    self.POS_ITER = 100
+    self.HOLE_RADIUS = .4
+
+    self.VEL_ITER, self.POS_ITER = SOLVER_TIERS['default']
 
   # Graphic params
     self.PPM = int(min(self.DISPLAY_SIZE)/max(self.TABLE_SIZE))
@@ -43,5 +73,8 @@ class Params(object):
 
     self.RANDOM_ARM_INIT_POSE = False
     self.RANDOM_BALL_INIT_POSE = False
+    ## {param name: (low, high)}. At every reset the params are sampled in these ranges. See RANDOMIZABLE_PARAMS
+    self.DOMAIN_RANDOMIZATION = {}
 
     self.SHOW_ARM_IN_ARRAY = True
+    self.NUMPY_RENDER = False # If True, rgb_array images are drawn with rendering.ArrayRenderer instead of pygame
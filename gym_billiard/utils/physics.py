@@ -1,13 +1,63 @@
 import Box2D as b2
+import operator
 import os
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-import pygame
 import numpy as np
-from gym_billiard.utils import parameters
+from gym_billiard.utils import parameters, profiling
 
+## pygame is imported only when something is drawn with it. See enable_drawing
+pygame = None
+
+
+## Kinds of bodies, stored in userData['kind'] together with the index of the body among the ones of its kind
+BALL = 0
+LINK = 1
+WALL = 2
+
+## Types of contact events
+ARM_BALL = 0   # a: ball index, b: link index
+BALL_BALL = 1  # a, b: ball indexes, a < b
+BALL_WALL = 2  # a: ball index, b: wall index in PhysicsSim.walls
+
+EVENT_DTYPE = np.dtype([('type', np.int8), ('a', np.int32), ('b', np.int32)])
+
+
+def box2d_accessor(cls, method, attribute, setter=False):
+  """
+  Gives a function reading (or writing) an attribute of a Box2D object. When the SWIG wrapper exposes the C++ method,
+  it is called directly, skipping the property layer of the Python proxies that dominates the cost of reading many
+  bodies. Otherwise the public property is used, so builds with different wrappers keep working.
+  :param cls: Box2D class
+  :param method: Name of the C++ method, e.g. GetPosition
+  :param attribute: Name of the public property, e.g. position
+  :param setter: if True, the function sets the attribute
+  :return: function(obj), or function(obj, value) if setter
+  """
+  fast = getattr(cls, '_{}__{}'.format(cls.__name__, method), None)
+  if fast is not None:
+    return fast
+  if setter:
+    return lambda obj, value: setattr(obj, attribute, value)
+  return operator.attrgetter(attribute)
+
+## Accessors used by the bulk reads
+get_position = box2d_accessor(b2.b2Body, 'GetPosition', 'position')
+get_linear_velocity = box2d_accessor(b2.b2Body, 'GetLinearVelocity', 'linearVelocity')
+get_joint_angle = box2d_accessor(b2.b2RevoluteJoint, 'GetJointAngle', 'angle')
+get_joint_speed = box2d_accessor(b2.b2RevoluteJoint, 'GetJointSpeed', 'speed')
+get_motor_speed = box2d_accessor(b2.b2RevoluteJoint, 'GetMotorSpeed', 'motorSpeed')
+set_motor_speed = box2d_accessor(b2.b2RevoluteJoint, 'SetMotorSpeed', 'motorSpeed', setter=True)
 
 # TODO implement checks on balls spawning positions (not in holes or on arm or overlapped'
 
+def holes_pose(params):
+  """
+  Gives the poses of the holes of a table, in the two upper corners
+  :param params: Params of the table
+  :return: Array of shape (num_holes, 2) in table RF
+  """
+  return np.array([[-params.TABLE_SIZE[0] / 2, params.TABLE_SIZE[1] / 2],
+                   [params.TABLE_SIZE[0] / 2, params.TABLE_SIZE[1] / 2]])
+
 def draw_polygon(polygon, body, screen, params, color):
   """
   Function used to extend polygon shape with drawing function
@@ -22,8 +72,6 @@ def draw_polygon(polygon, body, screen, params, color):
   vertices = [(v[0], params.DISPLAY_SIZE[1] - v[1]) for v in vertices]
   pygame.draw.polygon(screen, color, vertices)
 
-b2.b2.polygonShape.draw = draw_polygon
-
 def my_draw_circle(circle, body, screen, params, color):
   """
   Function used to extend circle shape with drawing function
@@ -41,26 +89,74 @@ def my_draw_circle(circle, body, screen, params, color):
                      [int(x) for x in position],
                      int(circle.radius * params.PPM))
 
-b2.b2.circleShape.draw = my_draw_circle
+def enable_drawing():
+  """
+  Imports pygame and extends the Box2D shapes with the drawing functions.
+  It is called by the envs at the first pygame rendering, so that processes that never render do not pay for pygame.
+  :return: pygame module
+  """
+  global pygame
+  if pygame is None:
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+    import pygame as pg
+    pygame = pg
+    b2.b2.polygonShape.draw = draw_polygon
+    b2.b2.circleShape.draw = my_draw_circle
+  return pygame
+
+class ContactListener(b2.b2ContactListener):
+  """
+  Forwards the begin and end of the contacts to the simulator of the table they belong to. Box2D calls it only when a
+  contact starts or stops touching, so the cost is proportional to the number of events and not to the number of contacts.
+  """
+  def __init__(self, sims):
+    """
+    Constructor
+    :param sims: list of the PhysicsSim in the world, indexed by userData['table'] of their bodies
+    """
+    super().__init__()
+    self.sims = sims
+
+  def BeginContact(self, contact):
+    self.sims[contact.fixtureA.body.userData['table']]._on_contact(contact, 1)
+
+  def EndContact(self, contact):
+    self.sims[contact.fixtureA.body.userData['table']]._on_contact(contact, -1)
 
 class PhysicsSim(object):
   """
   Physics simulator
   """
-  def __init__(self, balls_pose=[[0, 0]], arm_position=None, params=None):
+  def __init__(self, balls_pose=[[0, 0]], arm_position=None, params=None, world=None, offset=(0, 0), table=0):
     """
     Constructor
     :param balls_pose: Initial ball poses. Is a list of the ball poses [ball0, ball1, ...]
     :param arm_position: Initial arm position
     :param params: Parameters
+    :param world: Box2D world in which the table is created. If None, the simulator has its own world. If given, the
+    world is stepped by its owner, see MultiTableSim
+    :param offset: Position of the table in the world, with respect to the one it has in its own world
+    :param table: Index of the table in the world, stored in the userData of its bodies
     """
     if params is None:
       self.params = parameters.Params()
     else:
       self.params = params
 
+    ## Profiler shared with the env. If None, nothing is timed
+    self.profiler = None
+
+    ## Contacts that started touching during the last step, as (type, a, b) records
+    self.events = []
+
     ## Physic simulator
-    self.world = b2.b2World(gravity=(0, 0), doSleep=True)
+    self.offset = np.array(offset, dtype=np.float64)
+    self.table = table
+    if world is None:
+      self.world = b2.b2World(gravity=(0, 0), doSleep=True)
+      self.world.contactListener = ContactListener([self])
+    else:
+      self.world = world
     self.dt = self.params.TIME_STEP
     self.vel_iter = self.params.VEL_ITER
     self.pos_iter = self.params.POS_ITER
@@ -69,37 +165,44 @@ class PhysicsSim(object):
     self._create_robotarm(arm_position)
     self._create_holes()
 
+    ## Physical params currently applied to the bodies. They can differ from the ones in params, see set_physical_params
+    self.physical_params = {name: getattr(self.params, name) for name in parameters.RANDOMIZABLE_PARAMS}
+
   def _create_table(self):
     """
     Creates the walls of the table
     :return:
     """
     ## Walls in world RF
-    left_wall_body = self.world.CreateStaticBody(position=(0, self.params.TABLE_CENTER[1]),
+    left_wall_body = self.world.CreateStaticBody(position=self.offset + (0, self.params.TABLE_CENTER[1]),
                                                  userData={'name': 'left wall'},
                                                  shapes=b2.b2PolygonShape(box=(self.params.WALL_THICKNESS/2,
                                                                                self.params.TABLE_SIZE[1]/2)))
 
-    right_wall_body = self.world.CreateStaticBody(position=(self.params.TABLE_SIZE[0], self.params.TABLE_CENTER[1]),
+    right_wall_body = self.world.CreateStaticBody(position=self.offset + (self.params.TABLE_SIZE[0], self.params.TABLE_CENTER[1]),
                                                   userData={'name': 'right wall'},
                                                   shapes=b2.b2PolygonShape(box=(self.params.WALL_THICKNESS/2,
                                                                                 self.params.TABLE_SIZE[1] / 2)))
 
-    upper_wall_body = self.world.CreateStaticBody(position=(self.params.TABLE_CENTER[0], self.params.TABLE_SIZE[1]),
+    upper_wall_body = self.world.CreateStaticBody(position=self.offset + (self.params.TABLE_CENTER[0], self.params.TABLE_SIZE[1]),
                                                   userData={'name': 'upper wall'},
                                                   shapes=b2.b2PolygonShape(box=(self.params.TABLE_SIZE[0] / 2,
                                                                                 self.params.WALL_THICKNESS/2)))
-    bottom_wall_body = self.world.CreateStaticBody(position=(self.params.TABLE_CENTER[0], 0),
+    bottom_wall_body = self.world.CreateStaticBody(position=self.offset + (self.params.TABLE_CENTER[0], 0),
                                                    userData={'name': 'bottom wall'},
                                                    shapes=b2.b2PolygonShape(box=(self.params.TABLE_SIZE[0] / 2,
                                                                                  self.params.WALL_THICKNESS/2)))
 
     self.walls = [left_wall_body, upper_wall_body, right_wall_body, bottom_wall_body]
+    for idx, wall in enumerate(self.walls):
+      wall.userData['kind'] = WALL
+      wall.userData['index'] = idx
+      wall.userData['table'] = self.table
 
     ## world RF -> table RF
-    self.wt_transform = -self.params.TABLE_CENTER
+    self.wt_transform = -self.params.TABLE_CENTER - self.offset
     ## table RF -> world RF
-    self.tw_transform = self.params.TABLE_CENTER
+    self.tw_transform = self.params.TABLE_CENTER + self.offset
 
   def _create_balls(self, balls_pose):
     """
@@ -109,15 +212,18 @@ class PhysicsSim(object):
     """
     ## List of balls in simulation
     self.balls = []
+    ## Number of links touching each ball. A list, given that it is read one ball at a time
+    self.arm_contacts = [0] * len(balls_pose)
 
     for idx, pose in enumerate(balls_pose):
       pose = pose + self.tw_transform ## move balls in world RF
       ball = self.world.CreateDynamicBody(position=pose,
                                           bullet=True,
                                           allowSleep=True,
-                                          userData={'name': 'ball{}'.format(idx)},
-                                          linearDamping=1,
-                                          angularDamping=1,
+                                          userData={'name': 'ball{}'.format(idx), 'kind': BALL, 'index': idx,
+                                                    'table': self.table},
+                                          linearDamping=self.params.BALL_DAMPING,
+                                          angularDamping=self.params.BALL_DAMPING,
                                           fixtures=b2.b2FixtureDef(shape=b2.b2CircleShape(radius=self.params.BALL_RADIUS),
                                                                    density=.5,
                                                                    friction=self.params.BALL_FRICTION,
@@ -162,6 +268,8 @@ class PhysicsSim(object):
       pose['link0_angle'] = arm_position[0]
       pose['link1_angle'] = arm_position[1]  # Have to also center the angle
 
+    for key in ['link0_center', 'link1_center', 'joint01_center']:
+      pose[key] = pose[key] + self.offset
     return pose
 
   def _create_robotarm(self, arm_position=None):
@@ -175,7 +283,7 @@ class PhysicsSim(object):
                                          angle=arm_pose['link0_angle'],
                                          bullet=True,
                                          allowSleep=True,
-                                         userData={'name': 'link0'},
+                                         userData={'name': 'link0', 'kind': LINK, 'index': 0, 'table': self.table},
                                          fixtures=b2.b2FixtureDef(
                                            shape=b2.b2PolygonShape(box=(self.params.LINK_THICKNESS,
                                                                         self.params.LINK_0_LENGTH/2)),
@@ -188,7 +296,7 @@ class PhysicsSim(object):
                                          angle=arm_pose['link1_angle'],
                                          bullet=True,
                                          allowSleep=True,
-                                         userData={'name': 'link1'},
+                                         userData={'name': 'link1', 'kind': LINK, 'index': 1, 'table': self.table},
                                          fixtures=b2.b2FixtureDef(
                                            shape=b2.b2PolygonShape(box=(self.params.LINK_THICKNESS,
                                                                         self.params.LINK_1_LENGTH / 2)),
@@ -196,6 +304,18 @@ class PhysicsSim(object):
                                            friction=self.params.LINK_FRICTION,
                                            restitution=self.params.LINK_ELASTICITY))
 
+    ## Arm definition with links and joints
+    self.arm = {'link0': link0, 'link1': link1}
+    self._create_joints(arm_pose)
+
+  def _create_joints(self, arm_pose):
+    """
+    Creates the joints of the arm. The joints angles are measured from the pose the arm has when they are created.
+    :param arm_pose: Arm pose as given by _calculate_arm_pose
+    :return:
+    """
+    link0 = self.arm['link0']
+    link1 = self.arm['link1']
     jointW0 = self.world.CreateRevoluteJoint(bodyA=self.walls[3],
                                              bodyB=link0,
                                              anchor=self.walls[3].worldCenter,
@@ -216,8 +336,8 @@ class PhysicsSim(object):
                                              motorSpeed=0.0,
                                              enableMotor=True)
 
-    ## Arm definition with links and joints
-    self.arm = {'link0': link0, 'link1': link1, 'joint01': joint01, 'jointW0': jointW0}
+    self.arm['joint01'] = joint01
+    self.arm['jointW0'] = jointW0
 
   def _create_holes(self):
     """
@@ -225,24 +345,242 @@ class PhysicsSim(object):
     :return:
     """
     # Holes in simulation. Represented as list of dicts.
-    self.holes = [{'pose': np.array([-self.params.TABLE_SIZE[0] / 2, self.params.TABLE_SIZE[1] / 2]), 'radius': .4},
-                  {'pose': np.array([self.params.TABLE_SIZE[0] / 2, self.params.TABLE_SIZE[1] / 2]), 'radius': .4}]
+    self.holes = [{'pose': pose, 'radius': self.params.HOLE_RADIUS} for pose in holes_pose(self.params)]
+    ## Same holes packed in arrays, for the vectorized checks
+    self.holes_pose = np.array([hole['pose'] for hole in self.holes])
+    self.holes_radius = np.array([hole['radius'] for hole in self.holes])
+
+  def holes_reached(self, balls_pose):
+    """
+    Checks which hole every ball is in, with a single vectorized call
+    :param balls_pose: Balls poses in table RF. Array of shape (n_balls, 2)
+    :return: index of the first hole containing each ball, -1 if none. Array of shape (n_balls,)
+    """
+    diff = np.asarray(balls_pose)[:, None, :] - self.holes_pose
+    diff *= diff
+    in_hole = np.sqrt(diff[..., 0] + diff[..., 1]) <= self.holes_radius
+    holes = np.full(len(in_hole), -1)
+    if in_hole.any():
+      inside = in_hole.any(axis=1)
+      holes[inside] = in_hole[inside].argmax(axis=1)
+    return holes
+
+  def _on_contact(self, contact, change):
+    """
+    Records a contact event. Called by the ContactListener during world.Step, and when contacts are destroyed
+    :param contact: Box2D contact
+    :param change: 1 if the contact started touching, -1 if it stopped
+    :return:
+    """
+    data_a = contact.fixtureA.body.userData
+    data_b = contact.fixtureB.body.userData
+    if data_a['kind'] > data_b['kind']:
+      data_a, data_b = data_b, data_a
+    if data_a['kind'] != BALL:
+      return
+    if data_b['kind'] == LINK:
+      self.arm_contacts[data_a['index']] += change
+      event = (ARM_BALL, data_a['index'], data_b['index'])
+    elif data_b['kind'] == BALL:
+      event = (BALL_BALL, min(data_a['index'], data_b['index']), max(data_a['index'], data_b['index']))
+    else:
+      event = (BALL_WALL, data_a['index'], data_b['index'])
+    if change > 0:
+      self.events.append(event)
+
+  def set_physical_params(self, values):
+    """
+    Changes the physical params of the existing bodies in place, without rebuilding the world. The values are kept by
+    this simulator only, so tables sharing the same Params can have different ones.
+    Contacts mix friction and elasticity when they are created, and the broadphase is updated with the new ball radius
+    when the bodies are moved, so call it before reset.
+    :param values: dict {param name: value}, with names in parameters.RANDOMIZABLE_PARAMS
+    :return:
+    """
+    for name, value in values.items():
+      assert name in self.physical_params, 'Unknown physical param: {}'.format(name)
+      self.physical_params[name] = value
+      if name == 'BALL_FRICTION':
+        for ball in self.balls:
+          for fixture in ball.fixtures:
+            fixture.friction = value
+      elif name == 'BALL_ELASTICITY':
+        for ball in self.balls:
+          for fixture in ball.fixtures:
+            fixture.restitution = value
+      elif name == 'BALL_DAMPING':
+        for ball in self.balls:
+          ball.linearDamping = value
+          ball.angularDamping = value
+      elif name == 'BALL_RADIUS':
+        for ball in self.balls:
+          for fixture in ball.fixtures:
+            fixture.shape.radius = value
+          ## Same density, so the mass follows the radius
+          ball.ResetMassData()
+      elif name == 'LINK_FRICTION':
+        for link in [self.arm['link0'], self.arm['link1']]:
+          for fixture in link.fixtures:
+            fixture.friction = value
+      elif name == 'HOLE_RADIUS':
+        for hole in self.holes:
+          hole['radius'] = value
+        self.holes_radius[:] = value
+
+  def randomize_physical_params(self, ranges, np_random):
+    """
+    Samples the physical params in the given ranges and applies them with set_physical_params. The params that are not
+    sampled go back to their value in params.
+    :param ranges: dict {param name: (low, high)}, as param DOMAIN_RANDOMIZATION
+    :param np_random: Random generator
+    :return: dict {param name: value} of the sampled params
+    """
+    values = {name: getattr(self.params, name) for name, value in self.physical_params.items()
+              if name not in ranges and value != getattr(self.params, name)}
+    if not ranges and not values:
+      return {}
+    sampled = parameters.sample_physical_params(ranges, np_random)
+    values.update(sampled)
+    self.set_physical_params(values)
+    return sampled
+
+  def balls_state(self, out=None):
+    """
+    Reads position and velocity of all the balls in a single pass.
+    The bodies are read with the accessors given by box2d_accessor.
+    :param out: Array of shape (n_balls, 4) to fill. If None, a new one is allocated
+    :return: Array of shape (n_balls, 4), composed as [x, y, x_vel, y_vel] with the positions in table RF
+    """
+    if out is None:
+      out = np.empty((len(self.balls), 4))
+    out[:] = [(p.x, p.y, v.x, v.y) for p, v in ((get_position(ball), get_linear_velocity(ball)) for ball in self.balls)]
+    out[:, :2] += self.wt_transform
+    return out
 
+  def step_events(self):
+    """
+    Gives the contacts that started touching during the last step
+    :return: Array of EVENT_DTYPE
+    """
+    return np.array(self.events, dtype=EVENT_DTYPE)
+
+  @profiling.timed('sim_reset')
   def reset(self, balls_pose, arm_position):
     """
-    Reset the world to the given arm and balls poses
+    Reset the world to the given arm and balls poses.
+    If the number of balls does not change, the bodies are moved in place instead of being rebuilt. Only the joints are
+    recreated, so that their reference angles and accumulated impulses are the same of a new world.
+    :param balls_pose:
+    :param arm_position:
+    :return:
+    """
+    if len(balls_pose) != len(self.balls):
+      self._rebuild(balls_pose, arm_position)
+      return
+
+    for ball, pose in zip(self.balls, balls_pose):
+      self._reset_body(ball, pose + self.tw_transform, 0) ## move balls in world RF
+
+    arm_pose = self._calculate_arm_pose(arm_position)
+    self._reset_body(self.arm['link0'], arm_pose['link0_center'], arm_pose['link0_angle'])
+    self._reset_body(self.arm['link1'], arm_pose['link1_center'], arm_pose['link1_angle'])
+    self.world.DestroyJoint(self.arm['jointW0'])
+    self.world.DestroyJoint(self.arm['joint01'])
+    self._create_joints(arm_pose)
+
+    ## Contacts between the moved bodies are created now, as it happens for new fixtures
+    self.world.contactManager.FindNewContacts()
+
+  def _reset_body(self, body, position, angle):
+    """
+    Moves a body to the given pose and stops it.
+    :param body: Body to reset
+    :param position: Position in world RF
+    :param angle: Angle
+    :return:
+    """
+    ## Deactivating the body destroys its contacts, so no stale impulse is used to warm start the solver
+    body.active = False
+    body.transform = (position, angle)
+    body.active = True
+    ## Putting the body to sleep clears velocities, forces and sleep time
+    body.awake = False
+    body.awake = True
+
+  def get_state(self):
+    """
+    Returns the state of the simulation as a flat array. It is composed of:
+    - for each ball, link0 and link1: [x, y, angle, x_vel, y_vel, angular_vel, awake] in world RF;
+    - for jointW0 and joint01: [reference_angle, lower_limit, upper_limit, motor_speed].
+    :return: state array of shape (7 * (num_balls + 2) + 8,)
+    """
+    state = []
+    for body in self.balls + [self.arm['link0'], self.arm['link1']]:
+      position = body.position
+      velocity = body.linearVelocity
+      state.extend([position[0], position[1], body.angle, velocity[0], velocity[1], body.angularVelocity, body.awake])
+    for joint in [self.arm['jointW0'], self.arm['joint01']]:
+      lower, upper = joint.limits
+      state.extend([joint.GetReferenceAngle(), lower, upper, joint.motorSpeed])
+    return np.array(state, dtype=np.float64)
+
+  def set_state(self, state):
+    """
+    Sets the simulation to the given state, as returned by get_state.
+    The contacts and the joints are recreated, so the impulses cached by Box2D to warm start the solver are cleared.
+    Restoring the same state always gives the same trajectory, but it can slightly differ from the one the original
+    world would have followed.
+    :param state: State array
+    :return:
+    """
+    bodies = self.balls + [self.arm['link0'], self.arm['link1']]
+    assert len(state) == 7 * len(bodies) + 8, 'Wrong state size. Expected {} - Given {}'.format(7 * len(bodies) + 8, len(state))
+    body_states = np.reshape(state[:7 * len(bodies)], (len(bodies), 7))
+    for body, (x, y, angle, x_vel, y_vel, angular_vel, awake) in zip(bodies, body_states):
+      self._reset_body(body, (x, y), angle)
+      body.linearVelocity = (x_vel, y_vel)
+      body.angularVelocity = angular_vel
+
+    ## The joints are recreated with the reference angles and limits they had when the state was saved
+    joints = [self.arm['jointW0'], self.arm['joint01']]
+    joints_kwargs = []
+    for joint, (reference, lower, upper, motor_speed) in zip(joints, np.reshape(state[7 * len(bodies):], (2, 4))):
+      joints_kwargs.append(dict(bodyA=joint.bodyA,
+                                bodyB=joint.bodyB,
+                                localAnchorA=joint.GetLocalAnchorA(),
+                                localAnchorB=joint.GetLocalAnchorB(),
+                                referenceAngle=reference,
+                                lowerAngle=lower,
+                                upperAngle=upper,
+                                enableLimit=True,
+                                maxMotorTorque=joint.GetMaxMotorTorque(),
+                                motorSpeed=motor_speed,
+                                enableMotor=True))
+    for joint in joints:
+      self.world.DestroyJoint(joint)
+    self.arm['jointW0'] = self.world.CreateRevoluteJoint(**joints_kwargs[0])
+    self.arm['joint01'] = self.world.CreateRevoluteJoint(**joints_kwargs[1])
+
+    self.world.contactManager.FindNewContacts()
+    ## Creating contacts and joints wakes the bodies up, so the sleeping ones are put back to sleep at the end
+    for body, awake in zip(bodies, body_states[:, 6]):
+      body.awake = bool(awake)
+
+  def _rebuild(self, balls_pose, arm_position):
+    """
+    Destroys all the dynamic bodies and creates them again at the given poses.
     :param balls_pose:
     :param arm_position:
     :return:
     """
-    ## Destroy all the bodies
-    for body in self.world.bodies:
-      if body.type is b2.b2.dynamicBody:
-        self.world.DestroyBody(body)
+    ## Destroy all the dynamic bodies of the table
+    for body in self.balls + [self.arm['link0'], self.arm['link1']]:
+      self.world.DestroyBody(body)
 
-    ## Recreate the balls and the arm
+    ## Recreate the balls and the arm, with the physical params of the old ones
     self._create_balls(balls_pose)
     self._create_robotarm(arm_position)
+    self.set_physical_params(self.physical_params)
 
   def move_joint(self, joint, value):
     """
@@ -258,16 +596,157 @@ class PhysicsSim(object):
       speed = value
 
     # Limit max joint speed
-    self.arm[joint].motorSpeed = np.float(np.sign(speed)*min(1, np.abs(speed)))
+    speed = float(np.sign(speed) * min(1, abs(speed)))
+    ## Setting the motor speed wakes the arm up, so it is set only when it changes. This way the arm can fall asleep
+    if speed != self.arm[joint].motorSpeed:
+      self.arm[joint].motorSpeed = speed
+
+  def is_static(self):
+    """
+    Checks if the world will not change anymore: all the dynamic bodies are asleep and the joint motors are still.
+    Inactive bodies, like the balls taken out of the table, are not simulated, so they can stay awake forever.
+    :return: True if the world is static
+    """
+    for body in self.balls + [self.arm['link0'], self.arm['link1']]:
+      if body.awake and body.active:
+        return False
+    return self.arm['jointW0'].motorSpeed == 0 and self.arm['joint01'].motorSpeed == 0
 
+  @profiling.timed('world_step')
   def step(self):
     """
-    Performs a simulator step
+    Performs a simulator step. In a world shared by many tables, it steps all of them: use MultiTableSim.step instead
     :return:
     """
+    self.events.clear()
     self.world.Step(self.dt, self.vel_iter, self.pos_iter)
     self.world.ClearForces()
 
+  def stats(self):
+    """
+    Gives the timings collected by the profiler
+    :return: dict {phase: {'calls', 'total', 'mean'}}. Empty if profiling is disabled
+    """
+    return {} if self.profiler is None else self.profiler.stats()
+
+class MultiTableSim(object):
+  """
+  Many independent tables simulated in a single Box2D world.
+  Every table is a PhysicsSim created in the shared world, laid out on a grid with a gap between the tables, so bodies
+  of different tables never touch and the broadphase never pairs them. A single world.Step advances all the tables,
+  saving the per world overhead and the Python call per table of stepping one PhysicsSim at a time.
+
+  The bodies of a table are as far apart as in its own world, so each table evolves like a PhysicsSim of its own, up to
+  the single precision rounding of the offset positions.
+  """
+  def __init__(self, num_tables, balls_pose=[[0, 0]], arm_position=None, params=None, gap=1.):
+    """
+    Constructor
+    :param num_tables: Number of tables
+    :param balls_pose: Initial ball poses of every table
+    :param arm_position: Initial arm position of every table
+    :param params: Parameters, shared by all the tables
+    :param gap: Distance between the walls of neighbouring tables, in meters
+    """
+    assert num_tables > 0, 'num_tables must be positive. Given: {}'.format(num_tables)
+    if params is None:
+      params = parameters.Params()
+    self.params = params
+    self.profiler = None
+    self.num_tables = num_tables
+    self.dt = params.TIME_STEP
+    self.vel_iter = params.VEL_ITER
+    self.pos_iter = params.POS_ITER
+
+    self.world = b2.b2World(gravity=(0, 0), doSleep=True)
+    self.tables = []
+    self.world.contactListener = ContactListener(self.tables)
+    ## Tables on a square grid, centered on the origin to keep the coordinates small
+    cols = int(np.ceil(np.sqrt(num_tables)))
+    pitch = params.TABLE_SIZE + params.WALL_THICKNESS + gap
+    for idx in range(num_tables):
+      offset = (np.array([idx % cols, idx // cols]) - (cols - 1) / 2.) * pitch
+      self.tables.append(PhysicsSim(balls_pose, arm_position, params, world=self.world, offset=offset, table=idx))
+
+  def move_joints(self, actions):
+    """
+    Passes the motor commands to all the tables. Same as calling PhysicsSim.move_joint on every joint, with the speeds
+    computed at once for all the tables
+    :param actions: Array of shape (num_tables, 2) with the commands of jointW0 and joint01
+    :return:
+    """
+    joints = [joint for table in self.tables for joint in (table.arm['jointW0'], table.arm['joint01'])]
+    current = [get_motor_speed(joint) for joint in joints]
+    speeds = np.asarray(actions, dtype=np.float64).ravel()
+    if self.params.TORQUE_CONTROL:
+      speeds = np.array(current) + speeds * self.dt
+    # Limit max joint speed
+    speeds = np.clip(speeds, -1, 1).tolist()
+    ## As in move_joint, the speed is set only when it changes, so that the arm can fall asleep
+    for joint, speed, old in zip(joints, speeds, current):
+      if speed != old:
+        set_motor_speed(joint, speed)
+
+  @profiling.timed('world_step')
+  def step(self):
+    """
+    Performs a simulator step on all the tables
+    :return:
+    """
+    for table in self.tables:
+      table.events.clear()
+    self.world.Step(self.dt, self.vel_iter, self.pos_iter)
+    self.world.ClearForces()
+
+  def balls_state(self, out=None):
+    """
+    Reads position and velocity of the balls of all the tables in a single pass
+    :param out: Array of shape (num_tables, n_balls, 4) to fill. If None, a new one is allocated
+    :return: Array of shape (num_tables, n_balls, 4), composed as [x, y, x_vel, y_vel] with the positions in table RF
+    """
+    if out is None:
+      out = np.empty((self.num_tables, len(self.tables[0].balls), 4))
+    out.reshape(-1, 4)[:] = [(p.x, p.y, v.x, v.y) for p, v in ((get_position(ball), get_linear_velocity(ball))
+                                                                     for table in self.tables for ball in table.balls)]
+    out[..., :2] += np.array([table.wt_transform for table in self.tables])[:, None, :]
+    return out
+
+  def joints_state(self, out=None):
+    """
+    Reads angle and speed of the joints of all the tables in a single pass
+    :param out: Array of shape (num_tables, 4) to fill. If None, a new one is allocated
+    :return: Array of shape (num_tables, 4), composed as [joint0_angle, joint1_angle, joint0_speed, joint1_speed]
+    """
+    if out is None:
+      out = np.empty((self.num_tables, 4))
+    out[:] = [(get_joint_angle(joint0), get_joint_angle(joint1), get_joint_speed(joint0), get_joint_speed(joint1))
+              for joint0, joint1 in ((table.arm['jointW0'], table.arm['joint01']) for table in self.tables)]
+    return out
+
+  def holes_reached(self, balls_pose):
+    """
+    Checks which hole every ball of every table is in, each table with its own hole radius
+    :param balls_pose: Balls poses in table RF. Array of shape (num_tables, n_balls, 2)
+    :return: index of the first hole containing each ball, -1 if none. Array of shape (num_tables, n_balls)
+    """
+    ## The holes are in the same place in table RF, but their radius can change with the table
+    holes_radius = np.array([table.holes_radius for table in self.tables])
+    diff = np.asarray(balls_pose)[:, :, None, :] - self.tables[0].holes_pose
+    diff *= diff
+    in_hole = np.sqrt(diff[..., 0] + diff[..., 1]) <= holes_radius[:, None, :]
+    holes = np.full(in_hole.shape[:2], -1)
+    if in_hole.any():
+      inside = in_hole.any(axis=2)
+      holes[inside] = in_hole[inside].argmax(axis=1)
+    return holes
+
+  def stats(self):
+    """
+    Gives the timings collected by the profiler
+    :return: dict {phase: {'calls', 'total', 'mean'}}. Empty if profiling is disabled
+    """
+    return {} if self.profiler is None else self.profiler.stats()
+
 if __name__ == "__main__":
   phys = PhysicsSim(balls_pose=[[0, 0], [1, 1]])
   print(phys.arm['link0'])
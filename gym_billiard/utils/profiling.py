@@ -0,0 +1,92 @@
+import functools
+import timeit
+import logging
+logger = logging.getLogger(__name__)
+
+
+class _Phase(object):
+  """
+  Context manager timing a phase
+  """
+  __slots__ = ('profiler', 'name', 'start')
+
+  def __init__(self, profiler, name):
+    self.profiler = profiler
+    self.name = name
+
+  def __enter__(self):
+    self.profiler.active.add(self.name)
+    self.start = timeit.default_timer()
+    return self
+
+  def __exit__(self, *args):
+    self.profiler.add(self.name, timeit.default_timer() - self.start)
+    self.profiler.active.discard(self.name)
+    return False
+
+
+class Profiler(object):
+  """
+  Collects the cumulative time and the number of calls of the phases of the simulation.
+  A single profiler is shared by an env and its PhysicsSim, so their phases end up in the same stats.
+  """
+  def __init__(self):
+    """
+    Constructor
+    """
+    self.times = {}
+    self.calls = {}
+    ## Phases being timed. A phase nested in itself is counted only once
+    self.active = set()
+
+  def phase(self, name):
+    """
+    Times a phase
+    :param name: Name of the phase
+    :return: context manager timing the code it wraps
+    """
+    return _Phase(self, name)
+
+  def add(self, name, elapsed):
+    """
+    Records a call of a phase
+    :param name: Name of the phase
+    :param elapsed: Duration of the call in seconds
+    :return:
+    """
+    self.times[name] = self.times.get(name, 0.) + elapsed
+    self.calls[name] = self.calls.get(name, 0) + 1
+
+  def reset(self):
+    """
+    Clears the collected stats
+    :return:
+    """
+    self.times.clear()
+    self.calls.clear()
+
+  def stats(self):
+    """
+    Gives the collected stats
+    :return: dict {phase: {'calls': number of calls, 'total': cumulative time in seconds, 'mean': mean time in seconds}}
+    """
+    return {name: {'calls': self.calls[name], 'total': self.times[name], 'mean': self.times[name] / self.calls[name]}
+            for name in self.times}
+
+
+def timed(name):
+  """
+  Decorator timing a method in the profiler of its object, if it has one.
+  When profiling is disabled (self.profiler is None) the only overhead is a function call.
+  :param name: Name of the phase
+  :return: decorator
+  """
+  def decorator(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+      if self.profiler is None or name in self.profiler.active:
+        return method(self, *args, **kwargs)
+      with self.profiler.phase(name):
+        return method(self, *args, **kwargs)
+    return wrapper
+  return decorator
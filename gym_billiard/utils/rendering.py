@@ -0,0 +1,309 @@
+import numpy as np
+import Box2D as b2
+
+
+def circle_mask(radius):
+  """
+  Rasterizes a filled circle with the same midpoint algorithm used by pygame.draw.circle.
+  :param radius: Radius in pixels
+  :return: mask of shape (2 * radius, 2 * radius). Its top left corner is at (center_y - radius, center_x - radius)
+  """
+  mask = np.zeros((2 * radius, 2 * radius), dtype=bool)
+  ## Coordinates are relative to the top left corner of the mask
+  x0 = y0 = radius
+  f = 1 - radius
+  ddf_x = 0
+  ddf_y = -2 * radius
+  x = 0
+  y = radius
+  while x < y:
+    if f >= 0:
+      y -= 1
+      ddf_y += 2
+      f += ddf_y
+    x += 1
+    ddf_x += 2
+    f += ddf_x + 1
+    if f >= 0:
+      mask[y0 + y - 1, x0 - x:x0 + x] = True
+      mask[y0 - y, x0 - x:x0 + x] = True
+    mask[y0 + x - 1, x0 - y:x0 + y] = True
+    mask[y0 - x, x0 - y:x0 + y] = True
+  return mask
+
+
+def polygon_mask(xs, ys):
+  """
+  Rasterizes a filled polygon with the same scanline rules used by pygame.draw.polygon.
+  :param xs: x coordinates of the vertices in pixels. Truncated to int as pygame does
+  :param ys: y coordinates of the vertices in pixels. Truncated to int as pygame does
+  :return: (top, left, mask) with mask covering the bounding box of the polygon
+  """
+  xs = [int(x) for x in xs]
+  ys = [int(y) for y in ys]
+  min_x, max_x = min(xs), max(xs)
+  min_y, max_y = min(ys), max(ys)
+  cols = np.arange(min_x, max_x + 1)
+  if min_y == max_y:
+    return min_y, min_x, np.ones((1, len(cols)), dtype=bool)
+
+  ## Intersections of every row with every edge. The lower end of an edge is included only on the last row
+  rows = np.arange(min_y, max_y + 1)
+  x_intersect = np.full((len(rows), len(xs)), np.iinfo(np.int64).max)
+  horizontal = []
+  for idx in range(len(xs)):
+    x1, y1, x2, y2 = xs[idx - 1], ys[idx - 1], xs[idx], ys[idx]
+    if y1 == y2:
+      if min_y < y1 < max_y:
+        horizontal.append((y1, min(x1, x2), max(x1, x2)))
+      continue
+    if y1 > y2:
+      x1, y1, x2, y2 = x2, y2, x1, y1
+    x_intersect[y1 - min_y:y2 - min_y, idx] = np.trunc((rows[y1 - min_y:y2 - min_y] - y1) * (x2 - x1) / (y2 - y1) + x1)
+    if y2 == max_y:
+      x_intersect[-1, idx] = x2
+  x_intersect.sort(axis=1)
+
+  ## Spans between consecutive pairs of intersections
+  mask = (cols >= x_intersect[:, 0:1]) & (cols <= x_intersect[:, 1:2])
+  for k in range(2, len(xs) - 1, 2):
+    mask |= (cols >= x_intersect[:, k:k + 1]) & (cols <= x_intersect[:, k + 1:k + 2])
+
+  ## Horizontal edges between the first and last row
+  for y, start, end in horizontal:
+    mask[y - min_y, start - min_x:end - min_x + 1] = True
+  return min_y, min_x, mask
+
+
+def ellipse_mask(radius_x, radius_y):
+  """
+  Rasterizes a filled axis aligned ellipse. Used for the circles when the image is scaled differently along x and y.
+  If the two radii are equal, it is the same as circle_mask.
+  :param radius_x: Radius along x in pixels
+  :param radius_y: Radius along y in pixels
+  :return: mask of shape (2 * radius_y, 2 * radius_x). Its top left corner is at (center_y - radius_y, center_x - radius_x)
+  """
+  if radius_x == radius_y:
+    return circle_mask(radius_x)
+  ## Pixels whose center is inside the ellipse
+  y = (np.arange(2 * radius_y) + .5 - radius_y) / max(radius_y, 1)
+  x = (np.arange(2 * radius_x) + .5 - radius_x) / max(radius_x, 1)
+  return y[:, None] ** 2 + x[None, :] ** 2 <= 1.
+
+
+def to_grayscale(color):
+  """
+  Converts an RGB color to luminance, with the ITU-R 601 weights
+  :param color: RGB color
+  :return: gray level
+  """
+  return int(round(.299 * color[0] + .587 * color[1] + .114 * color[2]))
+
+
+class ArrayRenderer(object):
+  """
+  Renders the table in a numpy array without pygame. At the default size, the result is pixel-identical to the
+  rgb_array rendering of the envs, that draws the same shapes with pygame.
+
+  The image can be rasterized straight at a different resolution, in grayscale and as float32 in [0, 1]. The shapes are
+  scaled before being rasterized, so no full size image is ever drawn.
+
+  Holes and static bodies (the walls) are rasterized only once in a background image. At each frame the background is
+  copied in the output image and the dynamic bodies are drawn on it, in the same order of world.bodies.
+  Tables with the same geometry can share a renderer: render_batch draws all of them in a single (n, height, width, 3)
+  array.
+  """
+  def __init__(self, physics_eng, params, holes, body_color, background_color=(0, 0, 0), size=None, grayscale=False,
+               dtype=np.uint8):
+    """
+    Constructor
+    :param physics_eng: Physics simulator
+    :param params: Parameters
+    :param holes: list of (pose, radius) of the holes in table RF
+    :param body_color: function that gives the color of a body given its name, or None if the body is not drawn
+    :param background_color: Background color
+    :param size: (width, height) of the image in pixels. If None, it is params.DISPLAY_SIZE
+    :param grayscale: if True the image has shape (height, width), otherwise (height, width, 3)
+    :param dtype: either np.uint8, with values in [0, 255], or np.float32, with values in [0, 1]
+    """
+    self.physics_eng = physics_eng
+    self.params = params
+    self.body_color = body_color
+    if size is None:
+      size = params.DISPLAY_SIZE
+    self.dtype = np.dtype(dtype)
+    assert self.dtype in (np.uint8, np.float32), 'dtype must be either uint8 or float32. Given: {}'.format(dtype)
+    self.grayscale = grayscale
+    self.width, self.height = int(size[0]), int(size[1])
+    self.shape = (self.height, self.width) if grayscale else (self.height, self.width, 3)
+    ## Pixels per meter along each axis
+    self.ppm_x = params.PPM * self.width / params.DISPLAY_SIZE[0]
+    self.ppm_y = params.PPM * self.height / params.DISPLAY_SIZE[1]
+    self._ppm = np.array([self.ppm_x, self.ppm_y], dtype=np.float32)
+    self._colors = {}
+    self._circles = {}
+    ## Masks of the last drawn polygons. When the arm is still, its masks are reused
+    self._polygons = {}
+    self.background_color = background_color
+    self.background = np.empty(self.shape, dtype=self.dtype)
+    self._draw_static(self.background, holes, physics_eng)
+
+  def _color(self, color):
+    """
+    Converts a color in the format of the image. Colors are cached, given that there are only a few of them
+    :param color: RGB(A) color in [0, 255]
+    :return: color as array of dtype
+    """
+    key = tuple(color[:3])
+    if key not in self._colors:
+      value = [to_grayscale(key)] if self.grayscale else list(key)
+      value = np.array(value, dtype=np.float64)
+      if self.dtype == np.float32:
+        value /= 255.
+      self._colors[key] = value.astype(self.dtype)
+    return self._colors[key]
+
+  def _draw_static(self, image, holes, physics_eng):
+    """
+    Rasterizes background, holes and static bodies (the walls)
+    :param image: Image to draw on
+    :param holes: list of (pose, radius) of the holes in table RF
+    :param physics_eng: Physics simulator
+    :return:
+    """
+    image[:] = self._color(self.background_color)
+    for pose, radius in holes:
+      ## Same transform used by the envs to draw the holes. The table is drawn at the origin even if it is offset
+      pose = -pose + physics_eng.tw_transform - physics_eng.offset
+      self._stamp(image, self._circle_mask(pose[0] * self.params.PPM, pose[1] * self.params.PPM, radius),
+                  self._color((255, 0, 0)))
+
+    ## The walls are drawn right after the holes, as the static bodies come first in world.bodies
+    for body in physics_eng.walls:
+      color = self.body_color(body.userData['name'])
+      if color is None:
+        continue
+      for fixture in body.fixtures:
+        self._stamp(image, self._shape_mask(fixture.shape, body, physics_eng.offset), self._color(color))
+
+  def _circle_mask(self, x, y, radius):
+    """
+    Rasterizes a circle
+    :param x: x of the center in pixels of the default display
+    :param y: y of the center in pixels of the default display
+    :param radius: radius in meters
+    :return: (top, left, mask)
+    """
+    x = int(x * self.width / self.params.DISPLAY_SIZE[0])
+    y = int(y * self.height / self.params.DISPLAY_SIZE[1])
+    radius_x, radius_y = int(radius * self.ppm_x), int(radius * self.ppm_y)
+    if (radius_x, radius_y) not in self._circles:
+      self._circles[(radius_x, radius_y)] = ellipse_mask(radius_x, radius_y)
+    return y - radius_y, x - radius_x, self._circles[(radius_x, radius_y)]
+
+  def _shape_mask(self, shape, body, offset):
+    """
+    Rasterizes a shape of a body. The vertices are computed in single precision, as Box2D does for pygame.
+    :param shape: Box2D shape
+    :param body: Box2D body
+    :param offset: Offset of the table in the world, removed from the position of the body
+    :return: (top, left, mask)
+    """
+    transform = body.transform
+    c = np.float32(transform.q.c)
+    s = np.float32(transform.q.s)
+    p = (np.array(transform.position) - offset).astype(np.float32)
+    if isinstance(shape, b2.b2CircleShape):
+      center = p * np.float32(self.params.PPM)
+      return self._circle_mask(center[0], self.params.DISPLAY_SIZE[1] - center[1], shape.radius)
+
+    vertices = np.array(shape.vertices, dtype=np.float32)
+    xs = (c * vertices[:, 0] - s * vertices[:, 1] + p[0]) * self._ppm[0]
+    ys = self.height - ((s * vertices[:, 0] + c * vertices[:, 1] + p[1]) * self._ppm[1]).astype(np.float64)
+    key = tuple(np.trunc(xs).astype(np.int64)) + tuple(np.trunc(ys).astype(np.int64))
+    if key not in self._polygons:
+      if len(self._polygons) >= 64:
+        self._polygons.clear()
+      self._polygons[key] = polygon_mask(xs.astype(np.float64), ys)
+    return self._polygons[key]
+
+  def _stamp(self, image, mask, color):
+    """
+    Colors the pixels of the mask, clipping it to the image
+    :param image: Image to draw on
+    :param mask: (top, left, mask)
+    :param color: color, as given by _color
+    :return:
+    """
+    top, left, mask = mask
+    height, width = image.shape[:2]
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + mask.shape[0], height), min(left + mask.shape[1], width)
+    if y1 <= y0 or x1 <= x0:
+      return
+    mask = mask[y0 - top:y1 - top, x0 - left:x1 - left]
+    if image.ndim == 2:
+      image[y0:y1, x0:x1][mask] = color[0]
+      return
+    ## Each pixel is seen as a single element, so that the color is copied at once instead of broadcasting it
+    pixels = image.view('V{}'.format(image.shape[2] * image.itemsize)).reshape(image.shape[:2])
+    pixels[y0:y1, x0:x1][mask] = color.view(pixels.dtype)[0]
+
+  def _draw_bodies(self, image, physics_eng):
+    """
+    Draws the dynamic bodies of a simulation on an image that already contains the background
+    :param image: Image to draw on
+    :param physics_eng: Physics simulator. Must have the same table and holes of the one given to the constructor, but
+    it can be offset in a different world
+    :return:
+    """
+    ## Only the bodies of the table, in case the world is shared with other tables
+    for body in physics_eng.balls + [physics_eng.arm['link0'], physics_eng.arm['link1']]:
+      color = self.body_color(body.userData['name'])
+      if color is None:
+        continue
+      for fixture in body.fixtures:
+        self._stamp(image, self._shape_mask(fixture.shape, body, physics_eng.offset), self._color(color))
+
+  def render(self, out=None, physics_eng=None):
+    """
+    Draws the current state of the simulation
+    :param out: array in which the image is drawn. Must have the shape and dtype of the image. If None, a new one is allocated
+    :param physics_eng: Simulation to draw. If None, it is the one given to the constructor. Any other simulation with
+    the same table and holes can be drawn, reusing the same background
+    :return: image of shape (height, width, 3), or (height, width) if grayscale
+    """
+    if out is None:
+      out = self.background.copy()
+    else:
+      assert out.shape == self.shape and out.dtype == self.dtype, \
+        'out must have shape {} and dtype {}. Given: {} {}'.format(self.shape, self.dtype, out.shape, out.dtype)
+      np.copyto(out, self.background)
+    self._draw_bodies(out, self.physics_eng if physics_eng is None else physics_eng)
+    return out
+
+  def render_batch(self, physics_engs, out=None, holes=None):
+    """
+    Draws many simulations sharing the same table and holes in a single array. The background is rasterized only once
+    and broadcast to all the images.
+    :param physics_engs: list of physics simulators
+    :param out: array in which the images are drawn, of shape (len(physics_engs),) + image shape and dtype of the image.
+    If None, a new one is allocated
+    :param holes: if the tables have different holes, list with the (pose, radius) of the holes of every table. Their
+    static layer is drawn for each image instead of copying the background
+    :return: images of shape (n, height, width, 3), or (n, height, width) if grayscale
+    """
+    shape = (len(physics_engs),) + self.shape
+    if out is None:
+      out = np.empty(shape, dtype=self.dtype)
+    else:
+      assert out.shape == shape and out.dtype == self.dtype, \
+        'out must have shape {} and dtype {}. Given: {} {}'.format(shape, self.dtype, out.shape, out.dtype)
+    if holes is None:
+      out[:] = self.background
+    else:
+      for image, physics_eng, table_holes in zip(out, physics_engs, holes):
+        self._draw_static(image, table_holes, physics_eng)
+    for image, physics_eng in zip(out, physics_engs):
+      self._draw_bodies(image, physics_eng)
+    return out
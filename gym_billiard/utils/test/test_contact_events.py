@@ -0,0 +1,33 @@
+from gym_billiard.utils import physics
+import numpy as np
+
+def _arm_touching(sim, idx):
+  return any('link' in c.other.userData['name'] and c.contact.touching for c in sim.balls[idx].contacts)
+
+def test_contact_events():
+  rng = np.random.RandomState(0)
+  sim = physics.PhysicsSim(balls_pose=[[0., -0.6], [0.5, -0.5]])
+  sim.reset([[0., -0.6], [0.5, -0.5]], [0., 0.])
+  sim.balls[1].linearVelocity = (4., 0.)
+  events = []
+  for t in range(200):
+    sim.move_joint('jointW0', rng.uniform(-1, 1))
+    sim.move_joint('joint01', rng.uniform(-1, 1))
+    sim.step()
+    events.append(sim.step_events())
+    for idx in range(2):
+      assert (sim.arm_contacts[idx] > 0) == _arm_touching(sim, idx), 'Wrong arm contacts at step {}'.format(t)
+  events = np.concatenate(events)
+  assert events.dtype == physics.EVENT_DTYPE
+  assert physics.ARM_BALL in events['type'] and physics.BALL_WALL in events['type']
+  walls = events[events['type'] == physics.BALL_WALL]
+  assert 2 in walls['b'][walls['a'] == 1], 'Ball 1 did not hit the right wall'
+
+def test_holes_reached():
+  sim = physics.PhysicsSim()
+  poses = np.random.RandomState(0).uniform(-1.5, 1.5, (500, 2))
+  expected = []
+  for pose in poses:
+    reached = [idx for idx, hole in enumerate(sim.holes) if np.linalg.norm(pose - hole['pose']) <= hole['radius']]
+    expected.append(reached[0] if reached else -1)
+  assert np.array_equal(sim.holes_reached(poses), expected)
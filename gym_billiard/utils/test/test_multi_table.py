@@ -0,0 +1,38 @@
+from gym_billiard.utils import physics
+import numpy as np
+
+def test_tables_are_independent():
+  multi = physics.MultiTableSim(4, balls_pose=[[-1., 0.5], [0.5, -0.5]])
+  single = physics.PhysicsSim(balls_pose=[[-1., 0.5], [0.5, -0.5]])
+  ## Only table 2 moves, and must follow the single table
+  multi.tables[2].balls[1].linearVelocity = (4., 0.)
+  single.balls[1].linearVelocity = (4., 0.)
+  actions = np.zeros((4, 2))
+  rng = np.random.RandomState(0)
+  for t in range(100):
+    actions[2] = rng.uniform(-1, 1, 2)
+    multi.move_joints(actions)
+    single.move_joint('jointW0', actions[2, 0])
+    single.move_joint('joint01', actions[2, 1])
+    multi.step()
+    single.step()
+    assert multi.tables[2].events == single.events, 'Different contacts at step {}'.format(t)
+    for idx in [0, 1, 3]:
+      assert not multi.tables[idx].events
+  balls = multi.balls_state()
+  assert np.allclose(balls[2], single.balls_state(), atol=1e-3)
+  assert np.allclose(balls[0, :, :2], [[-1., 0.5], [0.5, -0.5]], atol=1e-6)
+  joints = multi.joints_state()
+  assert np.allclose(joints[2], [single.arm['jointW0'].angle, single.arm['joint01'].angle,
+                                 single.arm['jointW0'].speed, single.arm['joint01'].speed], atol=1e-3)
+  assert np.array_equal(multi.holes_reached(balls[..., :2])[2], single.holes_reached(single.balls_state()[:, :2]))
+
+def test_holes_reached_per_table():
+  multi = physics.MultiTableSim(2)
+  multi.tables[1].set_physical_params({'HOLE_RADIUS': .1})
+  ## .28 from the first hole: inside the default hole, outside the small one
+  pose = multi.tables[0].holes_pose[0] + [.2, -.2]
+  balls = np.tile(pose, (2, 1, 1))
+  assert np.array_equal(multi.holes_reached(balls), [[0], [-1]])
+  for idx, table in enumerate(multi.tables):
+    assert np.array_equal(multi.holes_reached(balls)[idx], table.holes_reached(balls[idx]))
@@ -0,0 +1,56 @@
+from gym_billiard.utils import parameters, physics, numpy_physics
+import numpy as np
+
+def _run(ball_pose, ball_vel, actions, arm_position=None):
+  box2d_sim = physics.PhysicsSim(balls_pose=[ball_pose], arm_position=arm_position)
+  numpy_sim = numpy_physics.NumpyPhysicsSim(balls_pose=[ball_pose], arm_position=arm_position)
+  box2d_sim.balls[0].linearVelocity = ball_vel
+  numpy_sim.balls[0].linearVelocity = ball_vel
+  ball_err, joint_err = 0, 0
+  for action in actions:
+    for sim in (box2d_sim, numpy_sim):
+      sim.move_joint('jointW0', action[0])
+      sim.move_joint('joint01', action[1])
+      sim.step()
+    ball_err = max(ball_err, np.max(np.abs(np.array(box2d_sim.balls[0].position) - numpy_sim.balls[0].position)))
+    for joint in ('jointW0', 'joint01'):
+      joint_err = max(joint_err, abs(box2d_sim.arm[joint].angle - numpy_sim.arm[joint].angle),
+                      abs(box2d_sim.arm[joint].speed - numpy_sim.arm[joint].speed))
+  return ball_err, joint_err
+
+def test_arm_matches_box2d():
+  actions = np.random.RandomState(0).uniform(-1, 1, size=(300, 2))
+  ball_err, joint_err = _run([-1.2, -1.2], (0, 0), actions)
+  assert joint_err < 5e-3, 'Joints diverged from Box2D: {}'.format(joint_err)
+
+def test_wall_bounces_match_box2d():
+  for ball_vel in [(-2., 3.), (-.5, .8), (-6., 4.)]:
+    ball_err, _ = _run([-0.8, 0.5], ball_vel, np.zeros((300, 2)))
+    assert ball_err < 1e-2, 'Ball with velocity {} diverged from Box2D: {}'.format(ball_vel, ball_err)
+
+def test_arm_hit_matches_box2d():
+  actions = [(0.5, 1.) if t < 20 else (0, 0) for t in range(300)]
+  ball_err, _ = _run([-0.5, 0.2], (0, 0), actions)
+  assert ball_err < 5e-2, 'Ball hit by the arm diverged from Box2D: {}'.format(ball_err)
+
+def test_tables_are_independent():
+  sim = numpy_physics.NumpyPhysicsSim(num_tables=3, balls_pose=[[-0.5, 0.2]])
+  sim.ball_vel[1, 0] = (-2., 3.)
+  for _ in range(50):
+    sim.move_joint('jointW0', np.array([0., 1., 0.]))
+    sim.move_joint('joint01', np.array([0., 0., -1.]))
+    sim.step()
+  assert np.allclose(sim.balls[0].position[0], np.array([-0.5, 0.2]) + sim.tw_transform), 'Still table has moved'
+  assert np.allclose(sim.arm['jointW0'].angle, [0., 50 * sim.dt, 0.])
+  assert np.allclose(sim.arm['joint01'].angle, [0., 0., -50 * sim.dt])
+  joints = sim.joints_state()
+  assert np.allclose(joints[:, 0], sim.arm['jointW0'].angle) and np.allclose(joints[:, 1], sim.arm['joint01'].angle)
+  assert np.allclose(joints[:, 2], sim.arm['jointW0'].speed) and np.allclose(joints[:, 3], sim.arm['joint01'].speed)
+
+def test_holes_match_box2d():
+  params = parameters.Params()
+  params.HOLE_RADIUS = .3
+  box2d_sim = physics.PhysicsSim(params=params)
+  numpy_sim = numpy_physics.NumpyPhysicsSim(params=params)
+  assert np.array_equal(box2d_sim.holes_pose, numpy_sim.holes_pose)
+  assert np.array_equal(box2d_sim.holes_radius, numpy_sim.holes_radius)
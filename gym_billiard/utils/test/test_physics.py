@@ -0,0 +1,50 @@
+import numpy as np
+from gym_billiard.utils import physics
+
+def test_reset_in_place():
+  physics_eng = physics.PhysicsSim(balls_pose=[[0, 0]])
+  ball, link0 = physics_eng.balls[0], physics_eng.arm['link0']
+  for _ in range(30):
+    physics_eng.move_joint('jointW0', 1)
+    physics_eng.step()
+  physics_eng.reset([[-0.5, 0.2]], [0.3, -1.])
+  assert physics_eng.balls[0] is ball and physics_eng.arm['link0'] is link0, 'Bodies have been rebuilt'
+
+  ## The reset world has to evolve as a new one
+  new_eng = physics.PhysicsSim(balls_pose=[[-0.5, 0.2]], arm_position=[0.3, -1.])
+  for _ in range(50):
+    for eng in (physics_eng, new_eng):
+      eng.move_joint('jointW0', -1)
+      eng.move_joint('joint01', 1)
+      eng.step()
+  assert physics_eng.balls[0].position == new_eng.balls[0].position, 'Wrong ball pose after reset'
+  assert physics_eng.arm['jointW0'].angle == new_eng.arm['jointW0'].angle, 'Wrong jointW0 angle after reset'
+  assert physics_eng.arm['joint01'].angle == new_eng.arm['joint01'].angle, 'Wrong joint01 angle after reset'
+
+def test_box2d_accessor_fallback():
+  physics_eng = physics.PhysicsSim(balls_pose=[[0.3, -0.2]])
+  ball, joint = physics_eng.balls[0], physics_eng.arm['jointW0']
+  ## A class without the wrapped methods falls back to the public properties
+  class Wrapper(object):
+    pass
+  get_position = physics.box2d_accessor(Wrapper, 'GetPosition', 'position')
+  assert get_position(ball) == physics.get_position(ball) == ball.position
+  set_speed = physics.box2d_accessor(Wrapper, 'SetMotorSpeed', 'motorSpeed', setter=True)
+  set_speed(joint, .5)
+  assert joint.motorSpeed == .5
+
+def test_randomize_physical_params():
+  physics_eng = physics.PhysicsSim(balls_pose=[[0, 0]])
+  np_random = np.random.RandomState(0)
+  sampled = physics_eng.randomize_physical_params({'HOLE_RADIUS': (.5, .6), 'BALL_DAMPING': (.1, .2)}, np_random)
+  assert set(sampled) == {'HOLE_RADIUS', 'BALL_DAMPING'}
+  assert np.all(physics_eng.holes_radius == sampled['HOLE_RADIUS'])
+  assert np.isclose(physics_eng.balls[0].linearDamping, sampled['BALL_DAMPING'])
+
+  ## The params no longer sampled go back to their value in params
+  sampled = physics_eng.randomize_physical_params({'BALL_DAMPING': (.1, .2)}, np_random)
+  assert list(sampled) == ['BALL_DAMPING']
+  assert np.all(physics_eng.holes_radius == physics_eng.params.HOLE_RADIUS)
+  assert physics_eng.randomize_physical_params({}, np_random) == {}
+  assert physics_eng.physical_params['BALL_DAMPING'] == physics_eng.params.BALL_DAMPING
+  assert np.isclose(physics_eng.balls[0].linearDamping, physics_eng.params.BALL_DAMPING)
@@ -0,0 +1,36 @@
+from gym_billiard.envs import BilliardEnv, BilliardHardEnv, Curling
+import numpy as np
+
+def test_numpy_render_matches_pygame():
+  rng = np.random.RandomState(0)
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    for show_arm in [True, False]:
+      env = env_class(seed=0)
+      env.params.RANDOM_ARM_INIT_POSE = True
+      env.params.SHOW_ARM_IN_ARRAY = show_arm
+      env.reset()
+      for t in range(30):
+        env.step(rng.uniform(-1, 1, 2))
+        env.params.NUMPY_RENDER = False
+        pygame_image = env.render('rgb_array')
+        env.params.NUMPY_RENDER = True
+        numpy_image = env.render('rgb_array')
+        assert numpy_image.dtype == np.uint8 and numpy_image.shape == pygame_image.shape
+        assert np.array_equal(numpy_image, pygame_image), '{}: images differ at step {}'.format(env_class.__name__, t)
+
+def test_render_size_and_format():
+  for env_class in [BilliardEnv, BilliardHardEnv, Curling]:
+    env = env_class(seed=0)
+    env.reset()
+    for t in range(10):
+      env.step([.5, 1.])
+    image = env.render('rgb_array', size=(300, 300))
+    assert np.array_equal(image, env.render('rgb_array', dtype=np.float32) * 255.)
+
+    small = env.render('rgb_array', size=(64, 48), grayscale=True)
+    assert small.shape == (48, 64) and small.dtype == np.uint8
+    assert len(np.unique(small)) > 2
+
+    out = np.empty((48, 64), dtype=np.float32)
+    assert env.render('rgb_array', size=(64, 48), grayscale=True, dtype=np.float32, out=out) is out
+    assert np.allclose(out * 255., small)
@@ -0,0 +1,38 @@
+from gym_billiard.utils import utils
+import numpy as np
+import os
+import pytest
+
+def test_generate_random_states_resume(tmp_path):
+  images = utils.generate_random_states(str(tmp_path), 'states.npy', samples=6, flush_every=2)
+  assert isinstance(images, np.memmap) and images.shape == (6, 300, 300, 3)
+  assert not os.path.exists(os.path.join(str(tmp_path), 'states.npy.progress'))
+  del images
+
+  ## Simulate a run killed after 3 images
+  images = np.load(os.path.join(str(tmp_path), 'states.npy'), mmap_mode='r+')
+  images[3:] = 0
+  images.flush()
+  del images
+  with open(os.path.join(str(tmp_path), 'states.npy.progress'), 'w') as f:
+    f.write('3')
+
+  images = utils.generate_random_states(str(tmp_path), 'states.npy', samples=6, flush_every=2)
+  assert all(images[k].any() for k in range(6))
+  assert not os.path.exists(os.path.join(str(tmp_path), 'states.npy.progress'))
+
+  ## A complete dataset with a different number of samples is not returned as it is
+  del images
+  with pytest.raises(AssertionError):
+    utils.generate_random_states(str(tmp_path), 'states.npy', samples=8)
+
+def test_generate_random_states_parallel_deterministic(tmp_path):
+  serial = utils.generate_random_states_parallel(str(tmp_path), 'serial.npy', samples=10, seed=3, workers=1, shard_size=3)
+  parallel = utils.generate_random_states_parallel(str(tmp_path), 'parallel.npy', samples=10, seed=3, workers=3, shard_size=3)
+  assert serial.shape == (10, 300, 300, 3)
+  assert np.array_equal(serial, parallel)
+  assert not np.array_equal(serial[0], serial[3])
+  assert not os.path.exists(os.path.join(str(tmp_path), 'parallel.npy.shards'))
+
+  other = utils.generate_random_states_parallel(str(tmp_path), 'other.npy', samples=10, seed=4, workers=2, shard_size=3)
+  assert not np.array_equal(serial, other)
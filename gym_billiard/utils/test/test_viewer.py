@@ -0,0 +1,30 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import time
+import numpy as np
+from gym_billiard.envs.billiard_env import BilliardEnv
+from gym_billiard.utils import parameters
+
+def test_async_viewer():
+  env = BilliardEnv(seed=0)
+  env.params.DOMAIN_RANDOMIZATION = {'HOLE_RADIUS': (.3, .5)}
+  env.reset()
+  env.render('human_async')
+  viewer = env.viewer
+  for _ in range(200):
+    env.step(env.action_space.sample())
+    assert env.render('human_async') is None
+  seq = viewer.snapshot[0]
+  assert seq == 201, 'Every push must replace the snapshot'
+  state = np.array(viewer.snapshot[1:]).reshape(-1, 4)
+  assert np.allclose(state[0, :2], env.physics_eng.balls[0].position)
+  assert viewer.physical_params[list(parameters.RANDOMIZABLE_PARAMS).index('HOLE_RADIUS')] == \
+         env.physical_params['HOLE_RADIUS']
+
+  deadline = time.time() + 10
+  while viewer.frames.value == 0 and time.time() < deadline:
+    time.sleep(.05)
+  assert viewer.frames.value > 0, 'The viewer did not draw any frame'
+  env.close()
+  assert env.viewer is None and not viewer.alive
+  assert viewer.process.exitcode == 0
@@ -4,30 +4,164 @@
 import numpy as np
 import gym
 import os
+import multiprocessing as mp
+from gym_billiard.utils import parameters
+from gym_billiard.envs import BilliardEnv
 
-def generate_random_states(filepath, filename, samples=50000):
+def _read_progress(progress_file):
+  """
+  Reads how many images have already been written in the dataset
+  :param progress_file: Path of the progress file
+  :return: number of images written
+  """
+  with open(progress_file, "r") as f:
+    return int(f.read().strip())
+
+def _write_progress(progress_file, done):
+  """
+  Saves how many images have been written in the dataset. The file is replaced atomically, so a run killed while writing
+  it leaves the previous value.
+  :param progress_file: Path of the progress file
+  :param done: number of images written
+  :return:
+  """
+  with open(progress_file + ".tmp", "w") as f:
+    f.write(str(done))
+  os.replace(progress_file + ".tmp", progress_file)
+
+def generate_random_states(filepath, filename, samples=50000, resume=True, flush_every=1000):
   """
   This function generates random images of possible environment states.
+  The images are rendered straight into a .npy file opened as a memory map, so the memory used does not depend on the
+  number of samples. Every flush_every images the file is flushed and the progress is saved in filename + '.progress'.
+  If the run is killed, calling the function again resumes from the last saved image. The progress file is removed once
+  the dataset is complete.
   :param filepath: Path were to save the images
   :param filename: Name of the images collection
   :param samples: Number of images to generate
-  :return:
+  :param resume: if True, an incomplete dataset with the same name is completed. Otherwise it is overwritten
+  :param flush_every: Number of images after which the file is flushed and the progress saved
+  :return: the images, as a read only memory map of shape (samples, height, width, 3)
   """
   assert os.path.exists(filepath), "Path {} does not exist.".format(filepath)
+  path = os.path.join(filepath, filename)
+  progress_file = path + ".progress"
 
-  images = []
   env = gym.make("Billiard-v0")
   env.params.RANDOM_BALL_INIT_POSE = True
+  shape = (samples, env.params.DISPLAY_SIZE[1], env.params.DISPLAY_SIZE[0], 3)
+
+  start = 0
+  if resume and os.path.exists(path):
+    images = np.lib.format.open_memmap(path, mode="r+")
+    assert images.shape == shape and images.dtype == np.uint8, \
+      "Existing dataset has shape {} {}. Expected {} uint8".format(images.shape, images.dtype, shape)
+    if not os.path.exists(progress_file):
+      print("Dataset already complete.")
+      del images
+      env.close()
+      return np.load(path, mmap_mode="r")
+    start = _read_progress(progress_file)
+    print("Resuming from {}".format(start))
+  else:
+    images = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape)
+    _write_progress(progress_file, 0)
+
   print("Generating...")
-  for k in range(samples):
+  for k in range(start, samples):
     if k%100 == 0 and k>0:
       print("Done {}".format(k))
     env.reset()
-    images.append(env.render("rgb_array"))
+    env.render("rgb_array", out=images[k])
+    if (k + 1) % flush_every == 0:
+      images.flush()
+      _write_progress(progress_file, k + 1)
+  images.flush()
+  del images
+  os.remove(progress_file)
+  env.close()
   print("Done.")
-  print("Saving...")
-  images = np.stack(images)
-  with open(os.path.join(filepath, filename), "wb") as f:
-    np.save(f, images)
+  return np.load(path, mmap_mode="r")
+
+
+def _generate_shard(args):
+  """
+  Renders the images of a shard in its region of the dataset file. Run by the workers of generate_random_states_parallel.
+  :param args: (path, shard index, first image, last image, seed of the shard)
+  :return: shard index
+  """
+  path, shard, start, stop, seed = args
+  env = BilliardEnv(seed=seed)
+  env.params.RANDOM_BALL_INIT_POSE = True
+  images = np.load(path, mmap_mode="r+")
+  for k in range(start, stop):
+    env.reset()
+    env.render("rgb_array", out=images[k])
+  images.flush()
+  del images
+  env.close()
+  return shard
+
+def generate_random_states_parallel(filepath, filename, samples=50000, seed=0, workers=None, shard_size=1000,
+                                    resume=True, start_method=None):
+  """
+  Parallel version of generate_random_states.
+  The samples are split in shards of shard_size images. Each shard has its own env, seeded with a seed derived from the
+  master seed through np.random.SeedSequence, and writes its own region of the output file. The shards do not depend
+  on how they are distributed among the workers, so the dataset is bit-identical for a given seed, samples and
+  shard_size, whatever the number of workers.
+  Completed shards are listed in filename + '.shards'. If the run is killed, calling the function again renders only
+  the missing shards. The list is removed once the dataset is complete.
+  :param filepath: Path were to save the images
+  :param filename: Name of the images collection
+  :param samples: Number of images to generate
+  :param seed: Master seed
+  :param workers: Number of processes. If None, it is the number of cpus
+  :param shard_size: Number of images per shard
+  :param resume: if True, an incomplete dataset with the same name is completed. Otherwise it is overwritten
+  :param start_method: multiprocessing start method. If None, the platform default is used
+  :return: the images, as a read only memory map of shape (samples, height, width, 3)
+  """
+  assert os.path.exists(filepath), "Path {} does not exist.".format(filepath)
+  path = os.path.join(filepath, filename)
+  shards_file = path + ".shards"
+
+  params = parameters.Params()
+  shape = (samples, params.DISPLAY_SIZE[1], params.DISPLAY_SIZE[0], 3)
+  num_shards = int(np.ceil(samples / shard_size))
+  seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(num_shards)]
+
+  done = set()
+  if resume and os.path.exists(path):
+    images = np.load(path, mmap_mode="r")
+    assert images.shape == shape and images.dtype == np.uint8, \
+      "Existing dataset has shape {} {}. Expected {} uint8".format(images.shape, images.dtype, shape)
+    if not os.path.exists(shards_file):
+      print("Dataset already complete.")
+      return images
+    del images
+    with open(shards_file, "r") as f:
+      done = {int(line) for line in f if line.strip()}
+    print("Resuming. Done {} shards out of {}".format(len(done), num_shards))
+  else:
+    images = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape)
+    del images
+    open(shards_file, "w").close()
+
+  tasks = [(path, shard, shard * shard_size, min((shard + 1) * shard_size, samples), seeds[shard])
+           for shard in range(num_shards) if shard not in done]
+  if workers is None:
+    workers = mp.cpu_count()
+  workers = max(1, min(workers, len(tasks)))
+
+  print("Generating...")
+  with mp.get_context(start_method).Pool(workers) as pool, open(shards_file, "a") as f:
+    for shard in pool.imap_unordered(_generate_shard, tasks):
+      ## The shard is marked as done only after its images have been flushed
+      f.write("{}\n".format(shard))
+      f.flush()
+      done.add(shard)
+      print("Done {} shards out of {}".format(len(done), num_shards))
+  os.remove(shards_file)
   print("Done.")
-  return images
+  return np.load(path, mmap_mode="r")
@@ -0,0 +1,150 @@
+import multiprocessing as mp
+import numpy as np
+import Box2D as b2
+from gym_billiard.utils import parameters
+
+
+def _dynamic_bodies(physics_eng):
+  """
+  Gives the dynamic bodies of the simulation, in the order of world.bodies
+  :param physics_eng: PhysicsSim
+  :return: list of bodies
+  """
+  return [body for body in physics_eng.world.bodies if body.type is b2.b2.dynamicBody]
+
+
+def _viewer_loop(env_class, env_kwargs, params, snapshot, physical_params, stop, frames, fps):
+  """
+  Viewer process. Draws the last snapshot at its own frame rate, skipping the ones received in the meantime.
+  :param env_class: Class of the env, used to draw
+  :param env_kwargs: Arguments of the env constructor
+  :param params: Params of the shown env
+  :param snapshot: Shared array: [sequence number, then (x, y, angle, active) of every dynamic body]
+  :param physical_params: Shared array with the physical params of the snapshot, in the order of
+  parameters.RANDOMIZABLE_PARAMS. It is guarded by the lock of snapshot
+  :param stop: Event that stops the viewer
+  :param frames: Shared counter of the drawn frames
+  :param fps: Frame rate of the viewer
+  :return:
+  """
+  env = env_class(**env_kwargs)
+  ## The simulator shares the params object of the env, so it is updated in place
+  vars(env.params).update(vars(params))
+  env.params.TARGET_FPS = fps
+  env.params.DOMAIN_RANDOMIZATION = {}
+  env.reset()
+  bodies = _dynamic_bodies(env.physics_eng)
+  pygame = None
+  last_seq = -1
+  last_values = None
+  try:
+    while not stop.is_set():
+      with snapshot.get_lock():
+        seq = snapshot[0]
+        state = np.array(snapshot[1:]).reshape(-1, 4) if seq != last_seq else None
+        values = tuple(physical_params)
+      if state is not None:
+        last_seq = seq
+        if values != last_values:
+          ## Zero width ranges apply the values through the same path of the resets of the env, that also updates what
+          ## depends on them, like the holes drawn
+          env.params.DOMAIN_RANDOMIZATION = {name: (value, value)
+                                             for name, value in zip(parameters.RANDOMIZABLE_PARAMS, values)}
+          env._randomize_physics()
+          last_values = values
+        for body, (x, y, angle, active) in zip(bodies, state):
+          if body.active != bool(active):
+            body.active = bool(active)
+          body.transform = ((x, y), angle)
+      ## render waits for the next frame of the viewer clock
+      env.render(mode='human')
+      with frames.get_lock():
+        frames.value += 1
+      if pygame is None:
+        from gym_billiard.utils import physics
+        pygame = physics.enable_drawing()
+      if any(event.type == pygame.QUIT for event in pygame.event.get()):
+        break
+  except KeyboardInterrupt:
+    pass
+  finally:
+    env.close()
+
+
+class AsyncViewer(object):
+  """
+  Shows an env on screen from a separate process, so that the simulation is not slowed down by the drawing.
+
+  The viewer process owns a copy of the env, built with the same params, used only to draw. At every push, the poses of
+  the dynamic bodies and the physical params of the episode are written in shared arrays, overwriting the previous
+  snapshot: the channel holds only the latest value, so push never blocks for longer than the copy. The viewer draws at
+  its own frame rate the last snapshot received, dropping the others when the simulation is faster.
+  """
+  def __init__(self, env, fps=None, start_method=None):
+    """ Constructor
+    :param env: Env to show. Its class is instantiated in the viewer process with the arguments given by
+    env._viewer_kwargs, if defined
+    :param fps: Frame rate of the viewer. If None, it is params.TARGET_FPS
+    :param start_method: multiprocessing start method. If None, the platform default is used
+    :return:
+    """
+    self.env = env
+    ## The bodies are moved in place at every reset, so they are collected once
+    self._bodies = _dynamic_bodies(env.physics_eng)
+    num_bodies = len(self._bodies)
+    self._buffer = np.zeros((num_bodies, 4))
+    env_kwargs = env._viewer_kwargs() if hasattr(env, '_viewer_kwargs') else {}
+    fps = env.params.TARGET_FPS if fps is None else fps
+
+    ctx = mp.get_context(start_method)
+    self.snapshot = ctx.Array('d', 1 + 4 * num_bodies)
+    self.physical_params = ctx.Array('d', len(parameters.RANDOMIZABLE_PARAMS), lock=self.snapshot.get_lock())
+    self.frames = ctx.Value('l', 0)
+    self._stop = ctx.Event()
+    self.process = ctx.Process(target=_viewer_loop,
+                               args=(type(env), env_kwargs, env.params, self.snapshot, self.physical_params,
+                                     self._stop, self.frames, fps),
+                               daemon=True)
+    self.process.start()
+    self.closed = False
+
+  def push(self):
+    """
+    Sends the current state of the env to the viewer, replacing the one not drawn yet, if any
+    :return:
+    """
+    if self.closed:
+      return
+    buffer = self._buffer
+    for idx, body in enumerate(self._bodies):
+      x, y = body.position
+      buffer[idx] = (x, y, body.angle, body.active)
+    physical_params = self.env.physics_eng.physical_params
+    with self.snapshot.get_lock():
+      self.snapshot[1:] = buffer.ravel()
+      self.physical_params[:] = [physical_params[name] for name in parameters.RANDOMIZABLE_PARAMS]
+      self.snapshot[0] += 1
+
+  @property
+  def alive(self):
+    """
+    True if the viewer window is still open
+    """
+    return not self.closed and self.process.is_alive()
+
+  def close(self):
+    """
+    Stops the viewer process
+    :return:
+    """
+    if self.closed:
+      return
+    self._stop.set()
+    self.process.join(timeout=5)
+    if self.process.is_alive():
+      self.process.terminate()
+    self.closed = True
+
+  def __del__(self):
+    if not getattr(self, 'closed', True):
+      self.close()
@@ -4,7 +4,7 @@
 from setuptools import setup
 
 setup(name='gym_billiard',
-      version='1',
+      version='1', # Keep in sync with gym_billiard.__version__
       install_requires=['gym', 'numpy', 'box2d-py', 'pygame'],
       author="Giuseppe Paolo",
       author_email="giuseppe.paolo93@gmail.com",